@@ -1,13 +1,25 @@
 """Agent TTS API endpoints"""
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import Response
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from .conditional import etag_matches
 from ..services.tts_service import TTSService
+from ..services.tts_cache import TTSCache
+from ..services.audio_codec import OPUS_SAMPLE_RATES, SUPPORTED_SAMPLE_RATES, wav_stream_header
 from ..services.agent_script import get_agent_segment, get_timing_windows, AGENT_SCRIPT
 from ..config import get_settings
 from typing import Optional
 
 router = APIRouter(prefix="/agent", tags=["agent"])
 
+# Supported output formats -> media type ("pcm" is raw 16-bit little-endian mono)
+MEDIA_TYPES = {
+    "mp3": "audio/mpeg",
+    "wav": "audio/wav",
+    "opus": "audio/ogg; codecs=opus",
+    "flac": "audio/flac",
+    "pcm": "audio/pcm",
+}
+
 # Initialize TTS service
 settings = get_settings()
 tts_service: Optional[TTSService] = None
@@ -24,11 +36,26 @@ def get_tts_service() -> TTSService:
         tts_service = TTSService(
             api_key=settings.fish_audio_api_key,
             model=settings.fish_audio_model,
-            reference_id=settings.fish_audio_reference_id if settings.fish_audio_reference_id else None
+            reference_id=settings.fish_audio_reference_id if settings.fish_audio_reference_id else None,
+            cache=TTSCache(settings.tts_cache_dir),
+            canonical_sample_rate=settings.tts_canonical_sample_rate,
         )
     return tts_service
 
 
+def script_texts() -> list[str]:
+    """Every text the agent can speak (script segments plus the out-of-range fallback)"""
+    return [segment["text"] for segment in AGENT_SCRIPT] + [get_agent_segment(-1)["text"]]
+
+
+async def prerender_agent_audio():
+    """Render the agent script into the TTS cache and drop renderings of old script/voice settings"""
+    tts = get_tts_service()
+    removed = tts.prune_cache(script_texts(), MEDIA_TYPES)
+    rendered = await tts.prerender(script_texts(), settings.tts_prerender_formats)
+    print(f"✓ [Agent TTS] Script pre-rendered ({rendered} new, {removed} stale removed)")
+
+
 @router.get("/script")
 async def get_script():
     """Get the full agent script with timing"""
@@ -39,51 +66,81 @@ async def get_script():
 
 
 @router.get("/audio/{segment_index}")
-async def get_agent_audio(segment_index: int, format: str = "mp3"):
+async def get_agent_audio(
+    request: Request,
+    segment_index: int,
+    format: str = "mp3",
+    sample_rate: Optional[int] = None,
+):
     """
-    Generate and return agent audio for a specific script segment.
+    Return agent audio for a specific script segment.
+    
+    Audio is served from the pre-rendered TTS cache (rendered on first use if
+    missing). Each text is synthesized once; other formats and sample rates are
+    transcoded from its canonical PCM. On a cold cache, PCM/WAV and MP3 at the
+    canonical rate are relayed as Fish Audio synthesizes them instead; a relayed
+    MP3 is that text's only synthesis and its canonical PCM is decoded from it.
+    The ETag is the content address, so If-None-Match gets a 304; a relayed WAV
+    carries an unknown-length header, so its ETag is weak.
     
     Args:
         segment_index: Index of the script segment (0-based)
-        format: Audio format (mp3, wav, opus, flac)
+        format: Audio format (mp3, wav, opus, flac, pcm)
+        sample_rate: Output sample rate in Hz, e.g. 8000 for telephony (default: canonical rate)
     """
-    print(f"[Agent TTS] Request for segment {segment_index}")
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    if sample_rate is not None and sample_rate not in SUPPORTED_SAMPLE_RATES:
+        raise HTTPException(status_code=400, detail=f"Unsupported sample rate: {sample_rate}")
+    if format == "opus" and sample_rate is not None and sample_rate not in OPUS_SAMPLE_RATES:
+        raise HTTPException(status_code=400, detail=f"Opus supports sample rates {list(OPUS_SAMPLE_RATES)}")
     
     # Get the segment
     segment = get_agent_segment(segment_index)
-    print(f"[Agent TTS] Segment text: {segment['text'][:50]}...")
     
-    # Generate TTS
     try:
         tts = get_tts_service()
-        print(f"[Agent TTS] Calling Fish Audio API...")
+        key = tts.cache_key(segment["text"], format, sample_rate)
+        etag = f'"{key}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": "public, max-age=3600",  # Cache for 1 hour
+        }
         
-        audio_bytes = await tts.generate_speech(
-            text=segment["text"],
-            format=format,
-            sample_rate=16000,
-            speed=1.0
-        )
+        # Conditional GET - the client already has exactly this rendering
+        if etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=304, headers=headers)
         
-        print(f"[Agent TTS] Generated {len(audio_bytes)} bytes of audio")
+        headers["Content-Disposition"] = f'inline; filename="agent_{segment_index}.{format}"'
         
-        # Determine media type
-        media_types = {
-            "mp3": "audio/mpeg",
-            "wav": "audio/wav",
-            "opus": "audio/opus",
-            "flac": "audio/flac"
-        }
-        media_type = media_types.get(format, "audio/mpeg")
+        path = tts.cache.get(key, format)
+        source = tts.relay_source(segment["text"], format, sample_rate) if path is None else None
+        if source is not None:
+            # Nothing rendered yet: relay Fish Audio's PCM (for pcm/wav) or MP3 as it is synthesized
+            # (joining an identical synthesis already in flight); the cache fills behind it.
+            # Waiting for the first chunk here turns upstream failures into a 500 instead of a cut-off 200.
+            chunks = tts.stream_shared(segment["text"], source)
+            first_chunk = await chunks.__anext__()
         
-        return Response(
-            content=audio_bytes,
-            media_type=media_type,
-            headers={
-                "Cache-Control": "public, max-age=3600",  # Cache for 1 hour
-                "Content-Disposition": f'inline; filename="agent_{segment_index}.{format}"'
-            }
-        )
+            async def relay():
+                if format == "wav":
+                    yield wav_stream_header(tts.canonical_sample_rate)
+                yield first_chunk
+                async for chunk in chunks:
+                    yield chunk
+        
+            if format == "wav":
+                # The streamed header has unknown sizes, unlike the cached file served later:
+                # same audio, different bytes, so the relay only gets a weak validator
+                headers["ETag"] = f"W/{etag}"
+            return StreamingResponse(relay(), media_type=MEDIA_TYPES[format], headers=headers)
+        
+        if path is None:
+            # Transcode the requested variant from cached canonical PCM, synthesizing it first if missing
+            path = await tts.get_or_render(segment["text"], format, sample_rate)
+        
+        # FileResponse streams from disk (zero-copy pathsend where the server supports it)
+        return FileResponse(path, media_type=MEDIA_TYPES[format], headers=headers)
         
     except HTTPException:
         raise
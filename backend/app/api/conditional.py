@@ -0,0 +1,24 @@
+"""Conditional request helpers shared by the API routes"""
+from typing import Optional
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Check an If-None-Match header against the current ETag (RFC 9110 §13.1.2).
+
+    The header may list several entity tags separated by commas, and any of
+    them may be weak (W/"..."): If-None-Match uses weak comparison, so only
+    the opaque tags are compared. "*" matches any current representation.
+    """
+    if not if_none_match:
+        return False
+    current = etag[2:] if etag.startswith("W/") else etag
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == current:
+            return True
+    return False
@@ -3,17 +3,19 @@ from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Optional
+import asyncio
 import numpy as np
+import torch
 from pathlib import Path
 
 from ..services.voice_embedding import get_voice_embedding
-from ..services.audio_processor import AudioProcessor
+from ..services.audio_codec import decode_upload_async
+from ..services.speech_segments import select_speech_segments
 from ..config import get_settings
 from ..dependencies import verify_token
 
 router = APIRouter(prefix="/enrollment", tags=["enrollment"])
 
-audio_processor = AudioProcessor()
 voice_embedding = get_voice_embedding()
 settings = get_settings()
 
@@ -42,47 +44,63 @@ async def create_enrollment(
     
     Expects:
     - name: Display name (e.g., "John Doe")
-    - audio: WAV file with 10+ seconds of clear speech (16kHz, mono preferred)
+    - audio: WAV, MP3 or M4A file with 10+ seconds of clear speech (any sample rate / channel count)
     - Authorization: Bearer <token>
     
     Returns enrollment status and embedding info.
     """
     try:
-        # Validate audio file
-        if not audio.filename.endswith(('.wav', '.mp3', '.m4a')):
+        # The multipart parser has already streamed the upload into a spooled temp file;
+        # it is decoded from there, never read into memory whole
+        max_bytes = settings.enrollment_max_upload_mb * 1024 * 1024
+        if audio.size is not None and audio.size > max_bytes:
             raise HTTPException(
-                status_code=400,
-                detail="Audio file must be WAV, MP3, or M4A format"
+                status_code=413,
+                detail=f"Audio file too large (max {settings.enrollment_max_upload_mb} MB)"
             )
         
-        # Read audio data
-        audio_data = await audio.read()
-        
-        # Convert to PCM chunks (assuming WAV format for now)
-        # For production, you'd want proper format detection and conversion
-        # Skip WAV header (44 bytes) if present
-        if audio_data.startswith(b'RIFF'):
-            audio_data = audio_data[44:]
-        
-        # Convert bytes to chunks
-        chunk_size = 3200  # 100ms at 16kHz
-        audio_chunks = [
-            audio_data[i:i+chunk_size] 
-            for i in range(0, len(audio_data), chunk_size)
-        ]
+        # Detect the container from its header and decode to mono 16 kHz (worker pool)
+        try:
+            samples = await decode_upload_async(
+                audio.file,
+                max_seconds=settings.enrollment_max_seconds,
+                sample_rate=settings.sample_rate,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
-        # Check minimum duration (at least 5 seconds)
-        if len(audio_chunks) < 50:
+        # Shorter than the speech requirement: reject before running speech selection
+        if len(samples) < settings.enrollment_min_speech_seconds * settings.sample_rate:
             raise HTTPException(
                 status_code=400,
-                detail="Audio too short. Need at least 5 seconds of speech."
+                detail=f"Audio too short. Need at least {settings.enrollment_min_speech_seconds:.0f} seconds of speech."
             )
         
-        # Convert to tensor
-        audio_tensor = audio_processor.concatenate_chunks(audio_chunks)
+        # Keep clean speech only, cut into fixed-length segments (best N kept)
+        segments, speech = await asyncio.to_thread(
+            select_speech_segments,
+            samples,
+            settings.sample_rate,
+            settings.enrollment_segment_seconds,
+            settings.enrollment_segment_seconds / 2,
+            settings.enrollment_max_segments,
+        )
+        if not segments or speech["speech_seconds"] < settings.enrollment_min_speech_seconds:
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"Not enough clear speech ({speech['speech_seconds']:.1f}s found, "
+                    f"need {settings.enrollment_min_speech_seconds:.0f}s). "
+                    "Record closer to the microphone, without background noise or distortion."
+                )
+            )
         
-        # Generate embedding
-        embedding = voice_embedding.compute_embedding(audio_tensor)
+        # Embed all segments in one padded batch and average them by quality
+        embedding, similarities = await asyncio.to_thread(
+            voice_embedding.compute_enrollment_embedding,
+            [torch.from_numpy(segment.samples) for segment in segments],
+            [segment.weight for segment in segments],
+        )
         
         # Save enrollment
         embeddings_dir = Path(settings.embeddings_dir)
@@ -96,7 +114,12 @@ async def create_enrollment(
             "user_id": user_id,
             "name": name,
             "embedding_dimension": len(embedding),
-            "audio_duration": len(audio_tensor) / 16000
+            "audio_duration": len(samples) / settings.sample_rate,
+            "speech": speech,
+            "segments": [
+                {**segment.quality(), "similarity": round(similarity, 4)}
+                for segment, similarity in zip(segments, similarities)
+            ]
         }
         
         import json
@@ -112,6 +135,8 @@ async def create_enrollment(
             embedding_dimension=len(embedding)
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
@@ -1,15 +1,18 @@
 """Session API endpoints"""
-from fastapi import APIRouter, HTTPException, Depends
-from ..models.schemas import SessionCreate, SessionResponse, RiskResponse, RiskStatus
+import json
+from typing import List, Literal, Optional
+
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from fastapi.responses import Response, StreamingResponse
+from .conditional import etag_matches
+from ..config import get_settings
+from ..models.schemas import SessionCreate, SessionResponse, RiskResponse, RiskStatus, BulkRiskResponse
 from ..services import get_session_manager
-from ..services.risk_engine import RiskEngine
+from ..services.audio_codec import wav_stream_header
 from ..dependencies import verify_token
 
 router = APIRouter(prefix="/sessions", tags=["sessions"])
 
-# Initialize risk engine
-risk_engine = RiskEngine()
-
 
 @router.post("", response_model=SessionResponse)
 async def create_session(user_id: str = Depends(verify_token)):
@@ -37,12 +40,58 @@ async def create_session(user_id: str = Depends(verify_token)):
     )
 
 
+@router.get("/risk", response_model=BulkRiskResponse)
+async def get_bulk_risk(
+    status: Optional[List[RiskStatus]] = Query(None, description="Only sessions in these states (repeatable)"),
+    since_version: int = Query(0, ge=0, description="Only sessions updated after this version"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=1000),
+    user_id: str = Depends(verify_token),
+):
+    """
+    Get risk for all active sessions (supervisor dashboard).
+    
+    One pass over the session table. Each item embeds the session's
+    pre-encoded risk payload, so nothing is rescored or re-serialized per
+    request. For delta polling, pass the returned version as since_version;
+    sessions that ended since then are listed in ended.
+    """
+    session_manager = get_session_manager()
+    version, rows, ended = session_manager.risk_snapshots(since_version)
+    
+    wanted = set(status) if status else None
+    matching = []
+    dropped = []
+    for session, session_version, session_status, body in rows:
+        if wanted is None or session_status in wanted:
+            matching.append((session, session_version, body))
+        elif since_version:
+            dropped.append(session.session_id)
+    
+    page = matching[offset:offset + limit]
+    next_offset = offset + limit if offset + limit < len(matching) else None
+    
+    # Assemble the JSON around the stored payloads instead of parsing and re-encoding them
+    items = b",".join(
+        b'{"session_id":%s,"user_id":%s,"version":%d,"risk":%s}' % (
+            json.dumps(session.session_id).encode(), json.dumps(session.user_id).encode(), session_version, body,
+        )
+        for session, session_version, body in page
+    )
+    head = json.dumps({
+        "version": version, "total": len(matching), "next_offset": next_offset, "dropped": dropped, "ended": ended,
+    })
+    return Response(content=head[:-1].encode() + b',"sessions":[' + items + b"]}", media_type="application/json")
+
+
 @router.get("/{session_id}/risk", response_model=RiskResponse)
-async def get_risk(session_id: str):
+async def get_risk(session_id: str, request: Request):
     """
     Get current risk assessment for session.
     
     Returns voice match score, synthetic likelihood, and overall risk status.
+    The payload is encoded once per score update; the ETag carries its version,
+    so a poll with a matching If-None-Match gets 304 Not Modified.
     """
     # Get session manager
     session_manager = get_session_manager()
@@ -52,33 +101,17 @@ async def get_risk(session_id: str):
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    # Compute risk assessment
-    mean_match, mean_fake, status, reason = risk_engine.compute_risk(
-        match_scores=session.match_scores,
-        fake_scores=session.fake_scores,
-    )
+    # Risk is assessed and encoded when results arrive; serving it is O(1)
+    version, body = session.risk.snapshot
+    headers = {
+        "ETag": f'"{session_id}-{version}"',
+        "Cache-Control": "no-cache",  # Clients may store it but must revalidate every poll
+    }
     
-    # Convert to 0-100 scale for UI
-    match_score = risk_engine.normalize_to_100(mean_match)
-    fake_score = risk_engine.normalize_to_100(mean_fake)
-    
-    # Get latest SE result
-    se_result = session.se_results[-1] if session.se_results else None
-    se_risk_score = se_result["risk_score"] if se_result else 0
-    se_risk_level = se_result["risk_level"] if se_result else "SAFE"
-    se_flagged_phrases = se_result["flagged_phrases"] if se_result else []
-    se_reason = se_result["reason"] if se_result else ""
-    
-    return RiskResponse(
-        match_score=match_score,
-        fake_score=fake_score,
-        status=status,
-        status_reason=reason,
-        se_risk_score=se_risk_score,
-        se_risk_level=se_risk_level,
-        se_flagged_phrases=se_flagged_phrases,
-        se_reason=se_reason
-    )
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @router.get("/{session_id}/status")
@@ -106,16 +139,21 @@ async def get_session_status(session_id: str):
 
 
 @router.get("/{session_id}/export-audio")
-async def export_audio(session_id: str):
+async def export_audio(
+    session_id: str,
+    request: Request,
+    source: Literal["caller", "raw"] = Query("caller", description="Caller windows only, or all audio"),
+    start: float = Query(0.0, ge=0, description="Slice start (seconds)"),
+    end: Optional[float] = Query(None, gt=0, description="Slice end (seconds, default: end of audio)"),
+):
     """
-    Export caller audio buffer to WAV file for verification.
+    Export session audio as a WAV stream for verification.
     
-    This is a debug endpoint to verify audio capture is working correctly.
+    The header is computed up front and the PCM is streamed straight from the
+    session buffer (in memory or spilled to disk), so nothing is copied to a
+    temp file. Single byte ranges (Range: bytes=a-b) are supported.
     """
-    from fastapi.responses import FileResponse
-    from ..services.audio_utils import export_audio_to_wav, get_audio_info
-    import tempfile
-    import os
+    settings = get_settings()
     
     # Get session manager
     session_manager = get_session_manager()
@@ -125,29 +163,74 @@ async def export_audio(session_id: str):
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
+    buffer = session.caller_audio if source == "caller" else session.raw_audio
+    
     # Check if there's audio to export
-    if not session.caller_audio:
-        raise HTTPException(status_code=400, detail="No caller audio captured yet")
-    
-    # Get audio info
-    info = get_audio_info(session.caller_audio)
-    print(f"Exporting audio: {info}")
-    
-    # Create temporary WAV file
-    temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.wav')
-    temp_path = temp_file.name
-    temp_file.close()
-    
-    # Export to WAV
-    export_audio_to_wav(session.caller_audio, temp_path)
-    
-    # Return file
-    return FileResponse(
-        temp_path,
-        media_type="audio/wav",
-        filename=f"caller_audio_{session_id[:8]}.wav",
-        headers={
-            "X-Audio-Duration": str(info["duration_seconds"]),
-            "X-Audio-Chunks": str(info["num_chunks"]),
-        }
-    )
+    if not buffer.num_bytes:
+        raise HTTPException(status_code=400, detail=f"No {source} audio captured yet")
+    
+    # Slice in whole samples; the length is fixed here so later appends don't change the file
+    bytes_per_second = settings.sample_rate * 2
+    pcm_start = min(max(int(start * bytes_per_second) & ~1, buffer.start_bytes), buffer.num_bytes)
+    pcm_end = buffer.num_bytes if end is None else min(int(end * bytes_per_second) & ~1, buffer.num_bytes)
+    if pcm_end <= pcm_start:
+        raise HTTPException(status_code=400, detail="Empty time slice")
+    
+    header = wav_stream_header(settings.sample_rate, pcm_end - pcm_start)
+    total = len(header) + pcm_end - pcm_start
+    headers = {
+        "Accept-Ranges": "bytes",
+        "Content-Disposition": f'attachment; filename="{source}_audio_{session_id[:8]}.wav"',
+        "X-Audio-Duration": str((pcm_end - pcm_start) / bytes_per_second),
+        "X-Audio-Chunks": str(buffer.chunk_count),
+    }
+    
+    first, last = 0, total - 1
+    status_code = 200
+    byte_range = _parse_byte_range(request.headers.get("range"), total)
+    if byte_range == "unsatisfiable":
+        raise HTTPException(status_code=416, headers={"Content-Range": f"bytes */{total}"})
+    if byte_range is not None:
+        first, last = byte_range
+        status_code = 206
+        headers["Content-Range"] = f"bytes {first}-{last}/{total}"
+    headers["Content-Length"] = str(last - first + 1)
+    
+    # Capture the PCM range now (spilled segments stay readable even if the session is evicted mid-download)
+    data_first = pcm_start + max(first - len(header), 0)
+    data_end = pcm_start + last + 1 - len(header)
+    pieces = buffer.iter_range(data_first, data_end) if data_end > data_first else iter(())
+
+    def body():
+        if first < len(header):
+            yield header[first:last + 1]
+        yield from pieces
+    
+    return StreamingResponse(body(), status_code=status_code, media_type="audio/wav", headers=headers)
+
+
+def _parse_byte_range(value: Optional[str], total: int):
+    """
+    Parse a single-range Range header against a resource of total bytes.
+    
+    Returns:
+        (first, last) inclusive, None to serve the whole resource (no header,
+        or a form we don't support such as multiple ranges), or "unsatisfiable"
+    """
+    if not value or not value.startswith("bytes=") or "," in value:
+        return None
+    first_text, _, last_text = value[6:].strip().partition("-")
+    try:
+        if not first_text:
+            # Suffix range: the last N bytes
+            length = int(last_text)
+            if length <= 0:
+                return "unsatisfiable"
+            return max(total - length, 0), total - 1
+        first = int(first_text)
+        last = int(last_text) if last_text else total - 1
+    except ValueError:
+        return None
+    if first >= total or last < first:
+        return "unsatisfiable"
+    return first, min(last, total - 1)
@@ -1,11 +1,11 @@
 """WebSocket endpoint for audio streaming"""
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, WebSocketException
-import torch
-from ..services import get_session_manager, DeepfakeDetector
+from ..services import get_session_manager, get_deepfake_detector
 from ..services.audio_processor import AudioProcessor
 from ..services.voice_embedding import get_voice_embedding
 from ..services.agent_script import get_current_window
-from ..services.social_engineering import SocialEngineeringDetector
+from ..services.social_engineering import get_social_engineering_detector
+from ..services.inflight_tracker import get_inflight_tracker
 from ..config import get_settings
 
 router = APIRouter(tags=["websocket"])
@@ -14,11 +14,14 @@ router = APIRouter(tags=["websocket"])
 audio_processor = AudioProcessor()
 voice_embedding = get_voice_embedding()
 settings = get_settings()
-deepfake_detector = DeepfakeDetector(
-    api_url=settings.aurigin_api_url,
-    api_key=settings.aurigin_api_key
-)
-se_detector = SocialEngineeringDetector()
+deepfake_detector = get_deepfake_detector()
+se_detector = get_social_engineering_detector()
+inflight = get_inflight_tracker()
+
+
+def audio_seconds(chunks: list[bytes]) -> float:
+    """Duration of 16-bit mono PCM chunks"""
+    return sum(len(chunk) for chunk in chunks) / (2 * settings.sample_rate)
 
 
 @router.websocket("/ws/audio")
@@ -40,6 +43,10 @@ async def audio_stream(websocket: WebSocket, session_id: str):
         await websocket.close(code=4004, reason="Session not found")
         return
     
+    # Reconnect (e.g. after a restart closed the previous connection): resume the call
+    if not session.active:
+        session_manager.reopen_session(session_id)
+    
     try:
         # Main audio streaming loop
         import asyncio
@@ -56,6 +63,47 @@ async def audio_stream(websocket: WebSocket, session_id: str):
         last_se_check = 0.0
         se_interval = 8.0
         se_audio_buffer = []
+        se_audio_start = session.caller_audio.duration  # Caller-audio offset (s) of the first chunk in se_audio_buffer (non-zero on reconnect)
+        
+        async def run_deepfake_check():
+            """Score the newest caller audio (up to deepfake_max_seconds) captured when the request starts"""
+            current = session_manager.get_session(session_id)
+            if not current:
+                return
+            # Only the scored window is copied onto the heap, never the whole call
+            caller = current.caller_audio
+            end = caller.num_bytes
+            start = max((end - int(settings.deepfake_max_seconds * caller.bytes_per_second)) & ~1, caller.start_bytes)
+            pcm = caller.read(start, end)
+            audio_range = (start / caller.bytes_per_second, end / caller.bytes_per_second)
+            
+            # Encode with the upload codec (off the event loop)
+            upload_bytes = await deepfake_detector.encode_for_upload(pcm, settings.sample_rate)
+            
+            # Detect deepfake (async) - None means no backend could score it
+            fake_score = await deepfake_detector.detect(upload_bytes)
+            
+            # Store fake score (unknown results are kept so risk reflects them; stale ones are dropped)
+            session_manager.append_fake_score(session_id, fake_score, audio_range)
+        
+        async def run_se_check():
+            """Analyze everything buffered since the previous social engineering request"""
+            nonlocal se_audio_buffer, se_audio_start
+            chunks, se_audio_buffer = se_audio_buffer, []
+            audio_range = (se_audio_start, se_audio_start + audio_seconds(chunks))
+            se_audio_start = audio_range[1]
+            
+            # Encode buffer with the upload codec (off the event loop); a streaming
+            # local transcriber already has the audio
+            se_upload = b''
+            if not se_detector.streaming_asr:
+                se_upload = await deepfake_detector.encode_for_upload(b''.join(chunks), settings.sample_rate)
+            
+            # Detect
+            se_result = await se_detector.detect(se_upload, session_id, audio_end=audio_range[1])
+            
+            if se_result:
+                session_manager.append_se_result(session_id, se_result, audio_range)
         
         while True:
             # Update elapsed time FIRST (before receiving audio)
@@ -96,23 +144,21 @@ async def audio_stream(websocket: WebSocket, session_id: str):
             
             # If caller is speaking, add to caller buffer
             if role == "caller":
+                chunk_start = session.caller_audio.duration  # Caller-audio offset (s) of this chunk
                 session_manager.append_caller_audio(session_id, audio_chunk)
                 se_audio_buffer.append(audio_chunk)
-                caller_duration = len(session.caller_audio) * 0.1  # Each chunk is ~0.1s
+                se_detector.feed_audio(session_id, audio_chunk, chunk_start)
+                caller_duration = session.caller_audio.duration
                 
                 # Check if we have enough audio to analyze (every 3 seconds of caller audio)
-                if audio_processor.should_analyze(
-                    session.caller_audio,
-                    settings.audio_chunk_size * 3  # 3 seconds instead of 1
-                ):
-                    # Phase 3: Voice Verification - Use ONLY last 5 seconds (50 chunks)
+                if session.caller_audio.num_bytes // 2 >= settings.audio_chunk_size * 3:  # 3 seconds instead of 1
+                    # Phase 3: Voice Verification - Use ONLY last 5 seconds
                     try:
-                        # Use only the last 5 seconds of audio for fresh comparison
-                        window_size = 50  # 50 chunks = 5 seconds at 0.1s per chunk
-                        recent_audio = session.caller_audio[-window_size:] if len(session.caller_audio) >= window_size else session.caller_audio
+                        # Use only the last 5 seconds of audio for fresh comparison (always within the in-memory horizon)
+                        recent_audio = session.caller_audio.tail(5 * settings.sample_rate * 2)
                         
                         # Convert recent audio to tensor
-                        audio_tensor = audio_processor.concatenate_chunks(recent_audio)
+                        audio_tensor = audio_processor.concatenate_chunks([recent_audio])
                         
                         # Verify against enrolled user (this is a FRESH score, not accumulated)
                         match_score = voice_embedding.verify_speaker(
@@ -122,7 +168,7 @@ async def audio_stream(websocket: WebSocket, session_id: str):
                         
                         # Store match score
                         session_manager.append_match_score(session_id, match_score)
-                        print(f"  ✅ Voice match score: {match_score:.3f} | Total scores: {len(session.match_scores)}")
+                        print(f"  ✅ Voice match score: {match_score:.3f} | Total scores: {session.risk.match_count}")
                         
                     except Exception as e:
                         pass
@@ -130,54 +176,31 @@ async def audio_stream(websocket: WebSocket, session_id: str):
                     # Phase 4: Deepfake Detection (every 5 seconds)
                     # Only run if: (1) enough time has passed AND (2) we have 20+ seconds of audio
                     time_since_last_check = session.elapsed_time - last_deepfake_check
-                    audio_duration = len(session.caller_audio) * 0.1  # Each chunk is 0.1s
+                    audio_duration = session.caller_audio.duration
                     
                     if time_since_last_check >= deepfake_interval and caller_duration >= 5.0:
-                        try:
-                            print(f"  🤖 Running deepfake detection ({caller_duration:.1f}s of audio, last check: {last_deepfake_check:.1f}s)...")
-                            # Convert ALL caller_audio to WAV format
-                            audio_tensor = audio_processor.concatenate_chunks(session.caller_audio)
-                            # Properly convert to int16 with clipping to avoid overflow
-                            audio_np = torch.clamp(audio_tensor, -1.0, 1.0).numpy()
-                            pcm_bytes = (audio_np * 32767.0).astype('int16').tobytes()
-                            wav_bytes = deepfake_detector.bytes_to_wav(pcm_bytes, settings.sample_rate)
-                            
-                            # Detect deepfake (async)
-                            fake_score = await deepfake_detector.detect(wav_bytes)
-                            
-                            # Store fake score
-                            session_manager.append_fake_score(session_id, fake_score)
-                            
-                            # Update last check time
-                            last_deepfake_check = session.elapsed_time
+                        # One request in flight per session; a newer caller window supersedes it
+                        outcome = inflight.submit(
+                            session_id,
+                            "deepfake",
+                            run_deepfake_check,
+                            window_id=window["start"],
+                            supersede=True,
+                        )
+                        print(f"  🤖 Deepfake detection {outcome} ({caller_duration:.1f}s of audio, last check: {last_deepfake_check:.1f}s)")
                             
-                        except Exception as e:
-                            pass
+                        # Update last check time
+                        last_deepfake_check = session.elapsed_time
                     
                     # Phase 5: Social Engineering Detection (every 8 seconds)
                     time_since_last_se = session.elapsed_time - last_se_check
                     se_duration = len(se_audio_buffer) * 0.1
                     
                     if time_since_last_se >= se_interval and se_duration >= 3.0:
-                        try:
-                            # Convert buffer to WAV
-                            se_tensor = audio_processor.concatenate_chunks(se_audio_buffer)
-                            se_np = torch.clamp(se_tensor, -1.0, 1.0).numpy()
-                            se_pcm = (se_np * 32767.0).astype('int16').tobytes()
-                            se_wav = deepfake_detector.bytes_to_wav(se_pcm, settings.sample_rate)
-                            
-                            # Detect
-                            se_result = await se_detector.detect(se_wav)
-                            
-                            if se_result:
-                                session_manager.append_se_result(session_id, se_result)
-                            
-                            # Clear buffer after check
-                            se_audio_buffer = []
-                            last_se_check = session.elapsed_time
-                            
-                        except Exception as e:
-                            pass
+                        # Transcript deltas must not be dropped, so SE requests coalesce (never supersede);
+                        # the buffer is taken when the request starts, so coalesced audio is merged
+                        inflight.submit(session_id, "social_engineering", run_se_check)
+                        last_se_check = session.elapsed_time
             
     except WebSocketDisconnect:
         pass
@@ -187,7 +210,9 @@ async def audio_stream(websocket: WebSocket, session_id: str):
         except:
             pass
     finally:
-        # Always close session and websocket
+        # Always close session and websocket; results for a closed session are never read
+        inflight.cancel_session(session_id)
+        se_detector.end_session(session_id)
         session_manager.close_session(session_id)
         try:
             await websocket.close()
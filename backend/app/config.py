@@ -38,6 +38,24 @@ class Settings(BaseSettings):
     undetectable_api_key: str = ""
     undetectable_user_id: str = ""
     
+    # Deepfake detection - failover between backends
+    deepfake_request_timeout: float = 30.0  # Per-backend request timeout (seconds)
+    deepfake_hedge_percentile: float = 95.0  # Fire backup once primary exceeds this latency percentile
+    deepfake_hedge_default_delay: float = 8.0  # Hedge delay until enough latency samples exist
+    deepfake_breaker_failure_threshold: int = 3  # Consecutive failures before a vendor circuit opens
+    deepfake_breaker_reset_seconds: float = 30.0  # Open circuit cool-down before a probe request
+    deepfake_max_seconds: float = 30.0  # Newest caller audio scored per check (bounds memory and upload size)
+    
+    # Vendor uploads (deepfake + social engineering)
+    upload_codec: str = "wav"  # wav | flac (lossless, ~2x smaller) | opus (lossy, ~10x smaller)
+    
+    # Deepfake detection - local CPU model (LFCC + small CNN)
+    local_detector_mode: str = "off"  # off | primary | fallback | prescreen
+    local_detector_weights_path: str = ""  # Local state_dict file, no download
+    local_detector_workers: int = 1  # Inference worker threads
+    local_prescreen_low: float = 0.1  # Pre-screen score at/below this skips the vendor (real)
+    local_prescreen_high: float = 0.9  # Pre-screen score at/above this skips the vendor (synthetic)
+    
     # Auth Supabase
     next_public_supabase_url: str = ""
     next_public_supabase_anon_key: str = ""
@@ -47,6 +65,10 @@ class Settings(BaseSettings):
     fish_audio_api_key: str = ""
     fish_audio_model: str = "fish-speech-1.5"
     fish_audio_reference_id: str = ""  # Optional: for voice cloning
+    tts_cache_dir: str = "../data/tts_cache"  # Content-addressed agent speech renderings
+    tts_prerender: bool = True  # Render the agent script at startup instead of on first request
+    tts_prerender_formats: list[str] = ["mp3"]
+    tts_canonical_sample_rate: int = 44100  # Agent speech is synthesized once as PCM at this rate
 
     # OpenAI (for Whisper transcription)
     openai_api_key: str = ""
@@ -54,9 +76,53 @@ class Settings(BaseSettings):
     # Google Gemini (for social engineering analysis)
     gemini_api_key: str = ""
     
+    # Social engineering pipeline limits
+    se_max_concurrency: int = 8  # Concurrent ASR+LLM pipelines across all sessions
+    se_queue_timeout_seconds: float = 5.0  # Max wait for a free slot before skipping a check
+    se_asr_timeout_seconds: float = 15.0  # Fish Audio ASR call timeout
+    se_llm_timeout_seconds: float = 15.0  # Gemini call timeout
+    se_summary_max_chars: int = 600  # Rolling conversation summary sent with each delta
+    se_max_delta_chars: int = 2000  # Newest transcript text sent per request
+    se_transcript_max_chars: int = 4000  # Verbatim transcript kept per session (older text is in the summary)
+    se_prefilter_enabled: bool = True  # Local tactic matcher decides which deltas reach the LLM
+    se_prefilter_every_n: int = 4  # Escalate at least every Nth delta even without a local match
+    se_cache_max_entries: int = 1024  # LLM verdict cache size (0 disables the cache)
+    se_cache_ttl_seconds: float = 3600.0  # Cached verdicts expire after this long
+    se_cache_path: str = ""  # Optional JSON file to keep the cache warm across restarts
+    se_batch_window_ms: int = 100  # Collect analyses from other sessions this long (0 disables batching)
+    se_batch_max_items: int = 8  # Send a batch as soon as it has this many items
+    
+    # Social engineering speech-to-text (fish | local)
+    se_asr_backend: str = "fish"
+    local_asr_engine: str = "speechbrain"  # speechbrain (encoder-decoder) | torchaudio (wav2vec2 CTC)
+    local_asr_source: str = "speechbrain/asr-crdnn-rnnlm-librispeech"  # HF id or local model dir
+    local_asr_weights_path: str = ""  # torchaudio engine: local state dict for air-gapped hosts
+    local_asr_chunk_seconds: float = 4.0  # Streaming decode chunk length
+    local_asr_workers: int = 2  # Decode worker threads
+    
     # Session management
     max_sessions: int = 100
-    session_timeout_seconds: int = 300
+    session_timeout_seconds: int = 300  # Idle time (no audio, no open websocket) before an open session is evicted
+    session_closed_grace_seconds: float = 60.0  # Closed sessions stay readable (risk, export) this long
+    session_reap_interval_seconds: float = 1.0  # Background reaper tick
+    session_reap_batch: int = 256  # Max expiry entries handled per tick
+    store_raw_audio: bool = True  # Keep non-caller audio too (no analysis reads it)
+    session_audio_memory_bytes: int = 1_048_576  # Per-buffer RAM before older audio spills to disk (0 = never)
+    session_audio_horizon_seconds: float = 10.0  # Newest audio always kept in memory for analysis
+    session_spill_dir: str = "../data/session_audio"  # Spilled audio segments (cleared at startup)
+    session_snapshot_enabled: bool = True  # Snapshot sessions to disk and restore them after a restart
+    session_snapshot_dir: str = "../data/session_snapshots"
+    session_snapshot_interval_seconds: float = 3.0
+    call_archive_enabled: bool = True  # Archive caller audio (FLAC) + scores when a call closes
+    call_archive_dir: str = "../data/call_archive"
+    call_archive_workers: int = 2  # Background encode/write threads
+    
+    # Enrollment uploads
+    enrollment_max_upload_mb: int = 50
+    enrollment_max_seconds: float = 120.0  # Longer recordings are truncated while decoding
+    enrollment_min_speech_seconds: float = 5.0  # Clean speech required after dropping silence/clipping
+    enrollment_segment_seconds: float = 3.0  # Speech is embedded in segments of this length
+    enrollment_max_segments: int = 20  # Best segments embedded (bounds the batch, and so latency)
     
     # Data paths
     data_dir: str = "../data"
@@ -1,9 +1,13 @@
 """FastAPI application entry point"""
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.config import get_settings
 from app.api import sessions_router, websocket_router, enrollment_router
-from app.api.agent import router as agent_router
+from app.api.agent import router as agent_router, prerender_agent_audio
+from app.services import get_session_manager
+from app.services.session_snapshot import get_session_snapshotter
+from app.services.social_engineering import get_social_engineering_detector
 
 # Load settings
 settings = get_settings()
@@ -51,9 +55,55 @@ async def health():
             "voice_embedding": "ready",  # TODO: Check if model loaded
             "deepfake_detector": "ready",
         },
+        "sessions": get_session_manager().get_stats(),
+        "session_snapshots": snapshotter.stats if (snapshotter := get_session_snapshotter()) else None,
+        "social_engineering": get_social_engineering_detector().get_stats(),
     }
 
 
+@app.on_event("startup")
+async def startup():
+    """Restore snapshotted sessions, start the reaper and snapshot loop, pre-render agent speech"""
+    session_manager = get_session_manager()
+    snapshotter = get_session_snapshotter()
+    if snapshotter is not None:
+        snapshotter.restore(session_manager)
+        app.state.session_snapshots = asyncio.create_task(
+            snapshotter.run(session_manager, settings.session_snapshot_interval_seconds)
+        )
+    
+    app.state.session_reaper = asyncio.create_task(
+        session_manager.run_reaper(settings.session_reap_interval_seconds)
+    )
+    
+    app.state.agent_prerender = None
+    if settings.tts_prerender and settings.fish_audio_api_key:
+        async def prerender():
+            try:
+                await prerender_agent_audio()
+            except Exception as e:
+                print(f"✗ [Agent TTS] Pre-render failed, segments will render on first use: {e}")
+        
+        app.state.agent_prerender = asyncio.create_task(prerender())
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop background loops, take a final snapshot, finish queued call archives and persist warm caches"""
+    app.state.session_reaper.cancel()
+    if app.state.agent_prerender is not None:
+        app.state.agent_prerender.cancel()
+    session_manager = get_session_manager()
+    snapshotter = get_session_snapshotter()
+    if snapshotter is not None:
+        app.state.session_snapshots.cancel()
+        # A tick already in its worker thread keeps running; snapshot() waits for it
+        snapshotter.snapshot(session_manager)
+    if session_manager.archiver is not None:
+        session_manager.archiver.shutdown()
+    get_social_engineering_detector().save_cache()
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(
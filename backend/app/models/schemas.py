@@ -1,5 +1,6 @@
 """Pydantic models for API requests and responses"""
 from enum import Enum
+from typing import Optional
 from pydantic import BaseModel, Field
 
 
@@ -27,6 +28,7 @@ class RiskResponse(BaseModel):
     """Real-time risk analysis response"""
     match_score: int = Field(ge=0, le=100, description="Voice match score (0-100)")
     fake_score: int = Field(ge=0, le=100, description="AI synthetic likelihood (0-100)")
+    fake_score_available: bool = Field(default=True, description="False when the latest deepfake check failed on every backend")
     status: RiskStatus = Field(description="Overall risk status")
     status_reason: str = Field(description="Explanation of risk assessment")
     
@@ -37,6 +39,24 @@ class RiskResponse(BaseModel):
     se_reason: str = Field(default="", description="Reason for social engineering flag")
 
 
+class SessionRisk(BaseModel):
+    """Risk for one session in a bulk response"""
+    session_id: str = Field(description="Session identifier")
+    user_id: str = Field(description="User identifier for this session")
+    version: int = Field(description="Risk version (increases on every score update)")
+    risk: RiskResponse = Field(description="Current risk assessment")
+
+
+class BulkRiskResponse(BaseModel):
+    """Risk for many active sessions"""
+    version: int = Field(description="Newest risk version seen; pass as since_version on the next poll")
+    total: int = Field(description="Number of matching sessions across all pages")
+    next_offset: Optional[int] = Field(default=None, description="Offset of the next page (null on the last page)")
+    sessions: list[SessionRisk] = Field(default=[], description="Matching sessions on this page")
+    dropped: list[str] = Field(default=[], description="Sessions updated since since_version that don't match the status filter (remove them if shown)")
+    ended: list[str] = Field(default=[], description="Sessions closed, timed out or deleted since since_version (remove them if shown)")
+
+
 class ErrorResponse(BaseModel):
     """Error response"""
     detail: str = Field(description="Error message")
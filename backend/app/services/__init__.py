@@ -2,7 +2,7 @@
 from .session_manager import SessionManager, get_session_manager
 from .audio_processor import AudioProcessor
 from .voice_embedding import VoiceEmbedding, get_voice_embedding
-from .deepfake_detector import DeepfakeDetector
+from .deepfake_detector import DeepfakeDetector, get_deepfake_detector
 from .risk_engine import RiskEngine
 
 __all__ = [
@@ -12,5 +12,6 @@ __all__ = [
     "VoiceEmbedding",
     "get_voice_embedding",
     "DeepfakeDetector",
+    "get_deepfake_detector",
     "RiskEngine",
 ]
@@ -0,0 +1,167 @@
+"""Analysis Cache - TTL + LRU cache for social engineering LLM verdicts"""
+import hashlib
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_DIGITS_RE = re.compile(r"\d+")
+_SPACE_RE = re.compile(r"\s+")
+_KEY_RE = re.compile(r"[0-9a-f]{32}(\|[0-9a-f]{16})?")
+
+
+def normalize(text: str) -> str:
+    """
+    Cache key for transcript text.
+    
+    Case, punctuation and whitespace are folded. Digits are kept as spoken:
+    text that differs only in an account or card number is a different entry.
+    """
+    text = _PUNCT_RE.sub(" ", text.lower())
+    return _SPACE_RE.sub(" ", text).strip()
+
+
+def cache_key(text: str, context: str = "") -> str:
+    """
+    Digest of the normalized text, plus a digest of the conversation context
+    it was judged in.
+    
+    A verdict on a short delta depends on the rolling summary sent with it,
+    so the same words in two different conversations get separate entries.
+    Context-free requests (empty summary) share one entry per text. Because
+    the summary changes with every analyzed delta, hits come almost entirely
+    from a call's first delta and from identical openings across calls, not
+    from repeats later in the same call. Only digests are kept, so neither
+    memory nor the persisted file holds transcript text or the numbers in it.
+    """
+    key = hashlib.blake2b(normalize(text).encode("utf-8"), digest_size=16).hexdigest()
+    if context:
+        key += "|" + hashlib.blake2b(context.encode("utf-8"), digest_size=8).hexdigest()
+    return key
+
+
+def redact(result: dict) -> dict:
+    """
+    Copy of a verdict that is safe to serve to another caller.
+    
+    Flagged phrases quoting digits (account, card or one-time codes) are
+    dropped and digit runs in the reason are masked, so a hit never repeats
+    another caller's numbers. The producing session's rolling summary is
+    never stored.
+    """
+    redacted = dict(result)
+    redacted.pop("context_summary", None)
+    if "flagged_phrases" in redacted:
+        redacted["flagged_phrases"] = [
+            phrase for phrase in redacted["flagged_phrases"] or []
+            if not _DIGITS_RE.search(str(phrase))
+        ]
+    if isinstance(redacted.get("reason"), str):
+        redacted["reason"] = _DIGITS_RE.sub("#", redacted["reason"])
+    return redacted
+
+
+class AnalysisCache:
+    """
+    Bounded cache of LLM analysis results keyed on digests of the normalized
+    transcript text and of its context.
+    
+    Entries expire after ttl_seconds; once max_entries is reached the least
+    recently used entry is evicted. With persist_path set, entries are loaded
+    at startup and written back by save().
+    """
+    
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600.0, persist_path: str = ""):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persist_path = Path(persist_path) if persist_path else None
+        
+        # key -> (expires_at wall-clock seconds, result)
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+        
+        if self.persist_path is not None:
+            self.load()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def get(self, text: str, context: str = "") -> Optional[dict]:
+        """Cached result for the text in this context, or None on a miss"""
+        key = cache_key(text, context)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.stats["misses"] += 1
+            return None
+        
+        expires_at, result = entry
+        if expires_at <= time.time():
+            del self._entries[key]
+            self.stats["expired"] += 1
+            self.stats["misses"] += 1
+            return None
+        
+        self._entries.move_to_end(key)
+        self.stats["hits"] += 1
+        return dict(result)
+    
+    def put(self, text: str, result: dict, context: str = "") -> None:
+        """Store a redacted result, evicting the least recently used entry when full"""
+        if not normalize(text) or self.max_entries <= 0:
+            return
+        key = cache_key(text, context)
+        self._entries[key] = (time.time() + self.ttl_seconds, redact(result))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats["evictions"] += 1
+    
+    def snapshot_stats(self) -> dict:
+        """Counters plus current size and hit rate"""
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "size": len(self._entries),
+            "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else 0.0,
+        }
+    
+    def load(self) -> int:
+        """Load unexpired entries from persist_path. Returns number loaded."""
+        if self.persist_path is None or not self.persist_path.exists():
+            return 0
+        try:
+            with open(self.persist_path, "r") as f:
+                stored = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"✗ [AnalysisCache] Could not load {self.persist_path}: {e}")
+            return 0
+        
+        now = time.time()
+        for key, expires_at, result in stored.get("entries", []):
+            # Files written before keys were hashed hold plaintext keys; drop those
+            if expires_at > now and _KEY_RE.fullmatch(key):
+                self._entries[key] = (expires_at, redact(result))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        print(f"✓ [AnalysisCache] Loaded {len(self._entries)} cached analyses")
+        return len(self._entries)
+    
+    def save(self) -> None:
+        """Write unexpired entries to persist_path (atomic replace)"""
+        if self.persist_path is None:
+            return
+        now = time.time()
+        entries = [
+            [key, expires_at, result]
+            for key, (expires_at, result) in self._entries.items()
+            if expires_at > now
+        ]
+        self.persist_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.persist_path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"entries": entries}, f)
+        os.replace(tmp_path, self.persist_path)
@@ -0,0 +1,234 @@
+"""Audio Buffer - Per-session PCM buffer with a memory budget and spill-to-disk segments"""
+import mmap
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# Spill writes run here, never on the event loop thread that appends audio
+_spill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio-spill")
+
+
+class AudioBuffer:
+    """
+    Append-only 16-bit mono PCM buffer for one session.
+    
+    The newest audio stays in memory. Once the in-memory part exceeds
+    memory_budget bytes, everything older than the analysis horizon (the most
+    recent horizon_bytes) is appended to segment files under spill_dir.
+    Spilled audio is read back through mmap, so reads never hold more than the
+    requested range on the heap.
+    
+    Spills are written by a background worker: append() only schedules one,
+    and the chunks being written stay readable in memory until the write has
+    landed, so readers never see a gap.
+    """
+    
+    def __init__(
+        self,
+        spill_dir: Optional[str] = None,
+        name: str = "audio",
+        memory_budget: int = 0,
+        horizon_bytes: int = 0,
+        segment_bytes: int = 4 * 1024 * 1024,
+        bytes_per_second: int = 32000,
+        start_bytes: int = 0,
+    ):
+        """
+        Args:
+            spill_dir: Directory for segment files (None = keep everything in memory)
+            name: File name prefix for this buffer's segments
+            memory_budget: In-memory bytes that trigger a spill (0 = never spill)
+            horizon_bytes: Newest bytes that always stay in memory
+            segment_bytes: Start a new segment file once the current one reaches this size
+            bytes_per_second: PCM byte rate (16 kHz 16-bit mono = 32000)
+            start_bytes: Offset of the first byte held (a restored buffer only has the tail of the call)
+        """
+        self.spill_dir = Path(spill_dir) if spill_dir and memory_budget > 0 else None
+        self.name = name
+        self.memory_budget = memory_budget
+        self.horizon_bytes = horizon_bytes
+        self.segment_bytes = segment_bytes
+        self.bytes_per_second = bytes_per_second
+        
+        self.start_bytes = start_bytes  # Audio before this offset is not available
+        self.num_bytes = start_bytes  # End offset of the audio (total bytes appended, including start_bytes)
+        self.chunk_count = 0
+        self.spilled_bytes = 0
+        
+        self._lock = threading.Lock()
+        self._chunks: List[bytes] = []  # In-memory tail, oldest first
+        self._memory_bytes = 0
+        self._segments: List[Tuple[Path, int]] = []  # (path, size) in audio order
+        self._writer = None  # Open handle on the last segment (used only by the spill worker)
+        self._maps: Dict[int, Tuple[int, mmap.mmap]] = {}  # segment index -> (mapped size, map)
+        self._spill_future: Optional[Future] = None  # Pending background spill
+        self._released = False
+    
+    @property
+    def duration(self) -> float:
+        """Seconds of audio appended so far"""
+        return self.num_bytes / self.bytes_per_second
+    
+    @property
+    def memory_bytes(self) -> int:
+        return self._memory_bytes
+    
+    def append(self, chunk: bytes) -> None:
+        with self._lock:
+            self._chunks.append(chunk)
+            self._memory_bytes += len(chunk)
+            self.num_bytes += len(chunk)
+            self.chunk_count += 1
+            if (
+                self.spill_dir is not None
+                and self._memory_bytes > self.memory_budget
+                and self._spill_future is None
+            ):
+                self._spill_future = _spill_executor.submit(self._spill)
+    
+    def _spill(self) -> None:
+        """Move audio older than the horizon from memory to segment files (spill worker)"""
+        try:
+            while self._spill_once():
+                pass
+        finally:
+            with self._lock:
+                self._spill_future = None
+                if self._released:
+                    self._delete_files()
+        
+    def _spill_once(self) -> bool:
+        """Write one batch of old chunks; True if more audio is over the budget"""
+        with self._lock:
+            if self._released or self.spill_dir is None or self._memory_bytes <= self.memory_budget:
+                return False
+            count = 0
+            size = 0
+            for chunk in self._chunks:
+                if self._memory_bytes - size - len(chunk) < self.horizon_bytes:
+                    break
+                size += len(chunk)
+                count += 1
+            if count == 0:
+                return False
+            data = b"".join(self._chunks[:count])
+            new_path = None
+            if self._writer is None:
+                new_path = self.spill_dir / f"{self.name}-{len(self._segments):06d}.pcm"
+        
+        # The file write happens without the lock, so appends and reads carry on meanwhile
+        try:
+            if new_path is not None:
+                new_path.parent.mkdir(parents=True, exist_ok=True)
+                self._writer = open(new_path, "ab")
+            self._writer.write(data)
+            self._writer.flush()
+        except OSError as e:
+            print(f"✗ [AudioBuffer] Spill to {self.spill_dir} failed ({e}), keeping audio in memory")
+            with self._lock:
+                self.spill_dir = None
+            return False
+        
+        with self._lock:
+            if new_path is not None:
+                self._segments.append((new_path, 0))
+            path, segment_size = self._segments[-1]
+            self._segments[-1] = (path, segment_size + size)
+            if segment_size + size >= self.segment_bytes:
+                self._writer.close()
+                self._writer = None
+            if self._released:
+                return False  # release() already dropped the chunks; files go in _spill()
+            # Only appends happened since the batch was taken, so it is still at the front
+            del self._chunks[:count]
+            self._memory_bytes -= size
+            self.spilled_bytes += size
+            return self._memory_bytes > self.memory_budget
+        
+    def flush(self) -> None:
+        """Wait for a pending background spill to finish"""
+        future = self._spill_future
+        if future is not None:
+            future.result()
+    
+    def _map(self, index: int) -> mmap.mmap:
+        """Read-only map of a segment, remapped when the segment has grown"""
+        path, size = self._segments[index]
+        cached = self._maps.get(index)
+        if cached is not None and cached[0] == size:
+            return cached[1]
+        with open(path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), size, access=mmap.ACCESS_READ)
+        # An outdated map is left to the garbage collector: a reader may still hold it
+        self._maps[index] = (size, mapped)
+        return mapped
+    
+    def iter_range(self, start: int = 0, end: Optional[int] = None, piece_bytes: int = 65536) -> Iterator[bytes]:
+        """
+        Iterate bytes [start, end) in pieces of at most piece_bytes.
+        
+        The range is captured when this is called (spilled segments stay
+        mapped even if the buffer is released), so later appends, spills or
+        release() don't affect what the iterator returns.
+        """
+        sources = []  # (buffer, offset, length)
+        with self._lock:
+            start = max(start, self.start_bytes)
+            end = self.num_bytes if end is None else min(end, self.num_bytes)
+            pos = self.start_bytes
+            for index, (_, size) in enumerate(self._segments):
+                if pos + size > start and pos < end:
+                    offset = max(start - pos, 0)
+                    sources.append((self._map(index), offset, min(end - pos, size) - offset))
+                pos += size
+            for chunk in self._chunks:
+                if pos >= end:
+                    break
+                if pos + len(chunk) > start:
+                    offset = max(start - pos, 0)
+                    sources.append((chunk, offset, min(end - pos, len(chunk)) - offset))
+                pos += len(chunk)
+        
+        def pieces() -> Iterator[bytes]:
+            for source, offset, length in sources:
+                if length == len(source) and length <= piece_bytes:
+                    yield source if isinstance(source, bytes) else source[:]
+                    continue
+                for piece_start in range(offset, offset + length, piece_bytes):
+                    yield source[piece_start:min(piece_start + piece_bytes, offset + length)]
+        
+        return pieces()
+    
+    def read(self, start: int = 0, end: Optional[int] = None) -> bytes:
+        """Bytes [start, end) as one contiguous copy (clamped to the available audio)"""
+        return b"".join(self.iter_range(start, end, piece_bytes=1 << 30))
+    
+    def tail(self, n_bytes: int) -> bytes:
+        """The newest n_bytes"""
+        return self.read(max(self.num_bytes - n_bytes, 0))
+    
+    def release(self) -> None:
+        """Drop in-memory audio and delete this buffer's segment files"""
+        with self._lock:
+            self._released = True
+            self._chunks.clear()
+            self._memory_bytes = 0
+            if self._spill_future is None:
+                self._delete_files()
+            # Otherwise the spill worker deletes the files once its write has finished
+
+    def _delete_files(self) -> None:
+        """Close and delete the segment files (caller holds the lock)"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._maps.clear()
+        for path, _ in self._segments:
+            path.unlink(missing_ok=True)
+        self._segments.clear()
+        if self.spill_dir is not None:
+            try:
+                self.spill_dir.rmdir()  # Only succeeds once the other buffer is gone too
+            except OSError:
+                pass
@@ -0,0 +1,284 @@
+"""Audio Codec - Compressed encodings for vendor uploads and TTS output (WAV, FLAC, Opus, MP3)"""
+import asyncio
+import io
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Optional
+
+import numpy as np
+
+# codec -> (libsndfile format, subtype, upload filename, MIME type)
+CODECS = {
+    "wav": ("WAV", "PCM_16", "recording.wav", "audio/wav"),
+    "flac": ("FLAC", "PCM_16", "recording.flac", "audio/flac"),
+    "opus": ("OGG", "OPUS", "recording.ogg", "audio/ogg"),
+}
+
+# Encoding is CPU work - keep it off the event loop
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="audio-codec")
+# Upload decoding gets its own pool so a burst of enrollments can't delay call-path encodes
+_decode_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="audio-decode")
+
+
+def encode_pcm(pcm_bytes: bytes, sample_rate: int = 16000, codec: str = "wav") -> bytes:
+    """
+    Encode raw PCM for upload.
+    
+    Args:
+        pcm_bytes: Raw PCM audio bytes (16-bit mono)
+        sample_rate: Sample rate in Hz
+        codec: "wav" (uncompressed), "flac" (lossless) or "opus" (lossy)
+    
+    Returns:
+        Encoded audio bytes
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown upload codec: {codec}")
+    
+    import soundfile as sf
+    
+    audio_format, subtype, _, _ = CODECS[codec]
+    samples = np.frombuffer(pcm_bytes, dtype=np.int16)
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, sample_rate, format=audio_format, subtype=subtype)
+    return buffer.getvalue()
+
+
+async def encode_pcm_async(pcm_bytes: bytes, sample_rate: int = 16000, codec: str = "wav") -> bytes:
+    """encode_pcm in the codec worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, encode_pcm, pcm_bytes, sample_rate, codec)
+
+
+def sniff_upload_type(audio_bytes: bytes) -> tuple[str, str]:
+    """
+    Identify an encoded payload from its magic bytes.
+    
+    Returns:
+        (upload filename, MIME type) - defaults to WAV
+    """
+    if audio_bytes.startswith(b"fLaC"):
+        return CODECS["flac"][2:]
+    if audio_bytes.startswith(b"OggS"):
+        return CODECS["opus"][2:]
+    if audio_bytes.startswith(b"ID3") or audio_bytes[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return "recording.mp3", "audio/mpeg"
+    return CODECS["wav"][2:]
+
+
+def decode_audio(audio_bytes: bytes) -> tuple[np.ndarray, int]:
+    """
+    Decode a WAV/FLAC/Ogg payload to mono float32 samples.
+    
+    Returns:
+        (samples in [-1, 1], sample rate)
+    """
+    import soundfile as sf
+    
+    samples, sample_rate = sf.read(io.BytesIO(audio_bytes), dtype="float32", always_2d=True)
+    return samples.mean(axis=1), sample_rate
+
+
+def sniff_container(head: bytes) -> Optional[str]:
+    """
+    Identify an uploaded file's container from its first bytes.
+    
+    Returns:
+        "wav", "flac", "ogg", "mp3", "m4a" or None if unrecognized
+    """
+    if head[:4] in (b"RIFF", b"RF64") and head[8:12] == b"WAVE":
+        return "wav"
+    if head.startswith(b"fLaC"):
+        return "flac"
+    if head.startswith(b"OggS"):
+        return "ogg"
+    if head.startswith(b"ID3") or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "mp3"
+    if head[4:8] == b"ftyp":
+        return "m4a"
+    return None
+
+
+def resample_float(samples: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Polyphase resampling of float32 samples"""
+    if src_rate == dst_rate:
+        return samples
+    from math import gcd
+    from scipy.signal import resample_poly
+    
+    g = gcd(src_rate, dst_rate)
+    return resample_poly(samples, dst_rate // g, src_rate // g).astype(np.float32)
+
+
+def decode_upload(
+    file: BinaryIO,
+    max_seconds: float,
+    sample_rate: int = 16000,
+    block_frames: int = 65536,
+) -> np.ndarray:
+    """
+    Decode an uploaded recording to mono float32 at sample_rate.
+    
+    The container is detected from its header, not the file name. WAV (any
+    header layout, including WAVE_FORMAT_EXTENSIBLE and RF64), FLAC, Ogg and
+    MP3 are decoded by libsndfile block by block; M4A/AAC goes through ffmpeg
+    when it is installed. Decoding stops at max_seconds, so memory stays
+    bounded however large the upload is.
+    
+    Args:
+        file: Seekable binary file positioned anywhere
+        max_seconds: Audio beyond this is ignored
+        sample_rate: Output sample rate
+        block_frames: Frames decoded per block
+    
+    Returns:
+        Samples in [-1, 1] (raises ValueError for unsupported or corrupt audio)
+    """
+    file.seek(0)
+    container = sniff_container(file.read(16))
+    file.seek(0)
+    if container is None:
+        raise ValueError("Unrecognized audio format (expected WAV, MP3 or M4A)")
+    if container == "m4a":
+        return _decode_with_ffmpeg(file, max_seconds, sample_rate)
+    
+    import soundfile as sf
+    
+    try:
+        with sf.SoundFile(file) as f:
+            source_rate = f.samplerate
+            max_frames = int(max_seconds * source_rate)
+            parts = []
+            frames = 0
+            for block in f.blocks(blocksize=block_frames, dtype="float32", always_2d=True):
+                mono = block.mean(axis=1) if block.shape[1] > 1 else block[:, 0]
+                parts.append(mono[:max_frames - frames])
+                frames += len(parts[-1])
+                if frames >= max_frames:
+                    break
+    except sf.LibsndfileError as e:
+        raise ValueError(f"Could not decode {container.upper()} audio: {e}") from e
+    
+    samples = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+    return resample_float(samples, source_rate, sample_rate)
+
+
+def _decode_with_ffmpeg(file: BinaryIO, max_seconds: float, sample_rate: int) -> np.ndarray:
+    ffmpeg = shutil.which("ffmpeg")
+    if ffmpeg is None:
+        raise ValueError("M4A uploads need ffmpeg installed on the server; upload WAV or MP3 instead")
+    
+    # MP4 keeps its index (moov) anywhere in the file, so ffmpeg needs a seekable path, not a pipe
+    with tempfile.NamedTemporaryFile(suffix=".m4a") as tmp:
+        shutil.copyfileobj(file, tmp, 1 << 20)
+        tmp.flush()
+        result = subprocess.run(
+            [ffmpeg, "-nostdin", "-v", "error", "-i", tmp.name, "-t", str(max_seconds),
+             "-f", "f32le", "-ac", "1", "-ar", str(sample_rate), "pipe:1"],
+            capture_output=True,
+        )
+    if result.returncode != 0:
+        raise ValueError(f"Could not decode M4A audio: {result.stderr.decode(errors='replace').strip()}")
+    return np.frombuffer(result.stdout, dtype="<f4").copy()
+
+
+async def decode_upload_async(file: BinaryIO, max_seconds: float, sample_rate: int = 16000) -> np.ndarray:
+    """decode_upload in the decode worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_decode_executor, decode_upload, file, max_seconds, sample_rate)
+
+
+# Output format -> (libsndfile format, subtype); "pcm" is headerless 16-bit little-endian mono
+OUTPUT_FORMATS = {
+    "wav": ("WAV", "PCM_16"),
+    "flac": ("FLAC", "PCM_16"),
+    "mp3": ("MP3", "MPEG_LAYER_III"),
+    "opus": ("OGG", "OPUS"),
+    "pcm": (None, None),
+}
+SUPPORTED_SAMPLE_RATES = (8000, 11025, 12000, 16000, 22050, 24000, 32000, 44100, 48000)
+OPUS_SAMPLE_RATES = (8000, 12000, 16000, 24000, 48000)
+
+
+def resample_pcm(samples: np.ndarray, src_rate: int, dst_rate: int) -> np.ndarray:
+    """Polyphase resampling of int16 samples"""
+    if src_rate == dst_rate:
+        return samples
+    from math import gcd
+    from scipy.signal import resample_poly
+    
+    g = gcd(src_rate, dst_rate)
+    resampled = resample_poly(samples.astype(np.float32), dst_rate // g, src_rate // g)
+    return np.clip(np.round(resampled), -32768, 32767).astype(np.int16)
+
+
+def transcode_pcm(pcm_bytes: bytes, src_rate: int, format: str, dst_rate: int) -> bytes:
+    """
+    Convert 16-bit mono PCM to an output format and sample rate.
+    
+    Args:
+        pcm_bytes: Raw PCM audio bytes (16-bit mono)
+        src_rate: Sample rate of pcm_bytes
+        format: One of OUTPUT_FORMATS
+        dst_rate: Output sample rate
+    
+    Returns:
+        Encoded audio bytes
+    """
+    if format not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown output format: {format}")
+    
+    samples = resample_pcm(np.frombuffer(pcm_bytes, dtype=np.int16), src_rate, dst_rate)
+    if format == "pcm":
+        return samples.tobytes()
+    
+    import soundfile as sf
+    
+    audio_format, subtype = OUTPUT_FORMATS[format]
+    buffer = io.BytesIO()
+    sf.write(buffer, samples, dst_rate, format=audio_format, subtype=subtype)
+    return buffer.getvalue()
+
+
+async def transcode_pcm_async(pcm_bytes: bytes, src_rate: int, format: str, dst_rate: int) -> bytes:
+    """transcode_pcm in the codec worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, transcode_pcm, pcm_bytes, src_rate, format, dst_rate)
+
+
+def decode_to_pcm(audio_bytes: bytes, sample_rate: int) -> bytes:
+    """
+    Decode an encoded rendering (WAV, FLAC, Ogg or MP3) to 16-bit mono PCM.
+    
+    Args:
+        audio_bytes: Encoded audio bytes
+        sample_rate: Output sample rate
+    
+    Returns:
+        Raw PCM audio bytes
+    """
+    samples, source_rate = decode_audio(audio_bytes)
+    samples = resample_float(samples, source_rate, sample_rate)
+    return np.clip(np.round(samples * 32768), -32768, 32767).astype(np.int16).tobytes()
+
+
+async def decode_to_pcm_async(audio_bytes: bytes, sample_rate: int) -> bytes:
+    """decode_to_pcm in the codec worker pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, decode_to_pcm, audio_bytes, sample_rate)
+
+
+def wav_stream_header(sample_rate: int, data_bytes: Optional[int] = None) -> bytes:
+    """44-byte WAV header for 16-bit mono PCM (data_bytes None = unknown length, for streaming)"""
+    import struct
+    
+    unknown = 0xFFFFFFFF
+    riff_size = unknown if data_bytes is None else 36 + data_bytes
+    data_size = unknown if data_bytes is None else data_bytes
+    return (
+        b"RIFF" + struct.pack("<I", riff_size) + b"WAVE"
+        + b"fmt " + struct.pack("<IHHIIHH", 16, 1, 1, sample_rate, sample_rate * 2, 2, 16)
+        + b"data" + struct.pack("<I", data_size)
+    )
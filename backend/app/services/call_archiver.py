@@ -0,0 +1,121 @@
+"""Call Archiver - Compressed per-call archive (caller audio FLAC + score record) written off the request path"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable
+
+import numpy as np
+import soundfile as sf
+
+
+def write_flac(path: Path, pieces: Iterable[bytes], sample_rate: int) -> int:
+    """
+    Encode 16-bit mono PCM pieces to FLAC incrementally (bounded memory).
+    
+    Returns:
+        Number of samples written
+    """
+    samples = 0
+    carry = b""
+    with sf.SoundFile(path, "w", samplerate=sample_rate, channels=1, format="FLAC", subtype="PCM_16") as f:
+        for piece in pieces:
+            if carry:
+                piece = carry + piece
+            # Pieces may split a sample; keep the odd byte for the next one
+            usable = len(piece) & ~1
+            carry = piece[usable:]
+            if usable:
+                f.write(np.frombuffer(piece[:usable], dtype="<i2"))
+                samples += usable // 2
+    return samples
+
+
+class CallArchiver:
+    """
+    Writes <archive_dir>/<YYYY-MM-DD>/<session_id>.flac and .json when a call closes.
+    
+    submit() only captures the session's state (its audio buffer range, risk
+    summary and the bounded per-window score history); FLAC encoding and file
+    writes run in a dedicated worker pool. Both files are written atomically.
+    """
+    
+    def __init__(self, archive_dir: str, sample_rate: int = 16000, workers: int = 2):
+        self.archive_dir = Path(archive_dir)
+        self.sample_rate = sample_rate
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="call-archive")
+        self._stats_lock = threading.Lock()
+        self.stats = {"submitted": 0, "archived": 0, "failed": 0, "audio_seconds": 0.0, "bytes_written": 0}
+    
+    def submit(self, session) -> Future:
+        """Queue a closed session for archiving"""
+        with session.lock:
+            se = session.risk.se_last
+            record = {
+                "session_id": session.session_id,
+                "user_id": session.user_id,
+                "start_time": session.start_time,
+                "elapsed_time": session.elapsed_time,
+                "closed_at": time.time(),
+                "risk": json.loads(session.risk.snapshot[1]),
+                "scores": session.risk.summary(),
+                "social_engineering": dict(se) if se else None,
+                "history": session.risk.history(),
+            }
+        pieces = session.caller_audio.iter_range()  # Captured now, so eviction can't pull it away
+        with self._stats_lock:
+            self.stats["submitted"] += 1
+        return self._executor.submit(self._archive, record, pieces)
+    
+    def _archive(self, record: dict, pieces: Iterable[bytes]) -> Path:
+        day = time.strftime("%Y-%m-%d", time.gmtime(record["start_time"]))
+        directory = self.archive_dir / day
+        try:
+            directory.mkdir(parents=True, exist_ok=True)
+            
+            # A call resumed after a restart is archived again; keep each part
+            stem = record["session_id"]
+            part = 1
+            while (directory / f"{stem}.json").exists():
+                stem = f"{record['session_id']}.{part}"
+                part += 1
+            audio_path = directory / f"{stem}.flac"
+            record_path = directory / f"{stem}.json"
+            
+            tmp_audio = audio_path.with_name(f".{audio_path.name}.tmp")
+            samples = write_flac(tmp_audio, pieces, self.sample_rate)
+            os.replace(tmp_audio, audio_path)
+            
+            record["audio"] = {
+                "file": audio_path.name,
+                "sample_rate": self.sample_rate,
+                "seconds": samples / self.sample_rate,
+            }
+            tmp_record = record_path.with_name(f".{record_path.name}.tmp")
+            with open(tmp_record, "w") as f:
+                json.dump(record, f, separators=(",", ":"))
+            os.replace(tmp_record, record_path)
+        except Exception as e:
+            print(f"✗ [CallArchiver] Archiving {record['session_id'][:8]} failed: {e}")
+            with self._stats_lock:
+                self.stats["failed"] += 1
+            raise
+        
+        with self._stats_lock:
+            self.stats["archived"] += 1
+            self.stats["audio_seconds"] += samples / self.sample_rate
+            self.stats["bytes_written"] += audio_path.stat().st_size + record_path.stat().st_size
+        return record_path
+    
+    def get_stats(self) -> dict:
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["pending"] = stats["submitted"] - stats["archived"] - stats["failed"]
+        stats["audio_seconds"] = round(stats["audio_seconds"], 1)
+        return stats
+    
+    def shutdown(self) -> None:
+        """Finish queued archives (called on app shutdown)"""
+        self._executor.shutdown(wait=True)
@@ -1,90 +1,450 @@
-"""Deepfake Detector - API wrapper for AI voice clone detection using Aurigin.AI"""
+"""Deepfake Detector - Multi-backend AI voice clone detection (Aurigin.AI primary, Undetectable.AI backup)"""
+import asyncio
 import httpx
 import io
+import time
 import wave
-import os
+from collections import deque
 from typing import Optional
 
+from .audio_codec import encode_pcm_async, sniff_upload_type
 
-class DeepfakeDetector:
-    """Detect AI-generated/synthetic speech using Aurigin.AI"""
+
+class BackendError(Exception):
+    """Raised when a detection backend fails or returns an unusable response"""
+    
+
+class CircuitBreaker:
+    """
+    Per-vendor circuit breaker.
+    
+    closed    -> requests flow normally
+    open      -> requests are skipped until reset_timeout has passed
+    half_open -> a single probe request is allowed; success closes, failure re-opens
+    """
+    
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._probe: Optional[object] = None  # Ticket held by the in-flight half-open probe
+    
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half_open"
+        return "open"
     
-    def __init__(self, api_url: str, api_key: str):
+    def allow_request(self) -> Optional[object]:
         """
-        Initialize deepfake detector.
+        Check whether a request may be sent.
         
-        Args:
-            api_url: Base URL for Aurigin.AI API
-            api_key: API key for authentication (x-api-key header)
+        Returns:
+            A ticket to pass back to the record_* methods (the probe
+            ticket when half-open), or None if the request must be skipped
         """
-        self.api_url = api_url.rstrip('/')
-        self.api_key = api_key
-        self.use_stub = not api_key
+        state = self.state
+        if state == "closed":
+            return object()
+        if state == "half_open" and self._probe is None:
+            self._probe = object()
+            return self._probe
+        return None
+    
+    def record_success(self, ticket: Optional[object] = None) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self._probe = None
     
-    async def detect(self, audio_bytes: bytes) -> float:
+    def record_failure(self, ticket: Optional[object] = None) -> None:
+        self.failures += 1
+        self._release(ticket)
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+    
+    def record_cancelled(self, ticket: Optional[object] = None) -> None:
+        """Request was cancelled (e.g. lost a hedge race) - neither success nor failure"""
+        self._release(ticket)
+    
+    def _release(self, ticket: Optional[object]) -> None:
+        # Only the probe's own request frees the slot - a cancelled or failed
+        # request started before the circuit opened must not admit a second probe
+        if ticket is not None and ticket is self._probe:
+            self._probe = None
+
+
+class LatencyTracker:
+    """Rolling window of successful request latencies"""
+    
+    def __init__(self, window: int = 100, min_samples: int = 10):
+        self.samples: deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+    
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+    
+    def percentile(self, pct: float) -> Optional[float]:
+        """Latency at the given percentile, or None until enough samples exist"""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class DetectorBackend:
+    """Base class for a deepfake detection vendor"""
+    
+    name = "backend"
+    
+    def __init__(
+        self,
+        timeout: float = 30.0,
+        failure_threshold: int = 3,
+        reset_timeout: float = 30.0,
+    ):
+        self.timeout = timeout
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.latency = LatencyTracker()
+    
+    async def predict(self, audio_bytes: bytes) -> float:
         """
-        Detect if audio is AI-generated using Aurigin.AI API.
-        Uses multipart/form-data upload with "file" field.
+        Score audio with this backend.
         
         Args:
-            audio_bytes: WAV format audio bytes
+            audio_bytes: Encoded audio bytes (WAV, FLAC or Opus)
             
         Returns:
             Probability [0, 1] that audio is synthetic
+        
+        Raises:
+            BackendError (or any transport error) if no usable score was produced
         """
-        if self.use_stub:
-            return 0.0  # No API key configured
+        raise NotImplementedError
+
+
+class AuriginBackend(DetectorBackend):
+    """Aurigin.AI - multipart upload to /predict"""
+    
+    name = "Aurigin.AI"
+    
+    def __init__(self, api_url: str, api_key: str, **kwargs):
+        super().__init__(**kwargs)
+        self.api_url = api_url.rstrip('/')
+        self.api_key = api_key
+    
+    async def predict(self, audio_bytes: bytes) -> float:
+        file_name, content_type = sniff_upload_type(audio_bytes)
+        files = {
+            "file": (file_name, audio_bytes, content_type)
+        }
         
-        try:
-            import time
-            total_start = time.time()
-            print("  🔍 Starting Aurigin.AI deepfake detection...")
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            response = await client.post(
+                f"{self.api_url}/predict",
+                headers={"x-api-key": self.api_key},
+                files=files
+            )
+            response.raise_for_status()
+            result = response.json()
+        
+        # Actual API format: {"predictions": ["real", "fake", ...], "global_probability": [0.001, 0.99, ...]}
+        predictions = result.get("predictions", [])
+        probabilities = result.get("global_probability", [])
+        
+        if not predictions or not probabilities:
+            raise BackendError(f"Invalid API response: {result}")
+        
+        # These are probabilities of being FAKE, so the mean is the AI probability
+        return sum(probabilities) / len(probabilities)
+
+
+class UndetectableBackend(DetectorBackend):
+    """
+    Undetectable.AI audio detection.
+    
+    Flow: request a presigned upload URL, PUT the audio, submit a detect job,
+    then poll /query until the job is done.
+    """
+    
+    name = "Undetectable.AI"
+    
+    def __init__(self, api_url: str, api_key: str, user_id: str = "", poll_interval: float = 0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.api_url = api_url.rstrip('/')
+        self.api_key = api_key
+        self.user_id = user_id
+        self.poll_interval = poll_interval
+    
+    async def predict(self, audio_bytes: bytes) -> float:
+        headers = {"apikey": self.api_key}
+        upload_name, content_type = sniff_upload_type(audio_bytes)
+        file_name = f"callshield_{int(time.time() * 1000)}.{upload_name.rsplit('.', 1)[-1]}"
+        
+        async with httpx.AsyncClient(timeout=self.timeout) as client:
+            # 1. Presigned upload URL
+            response = await client.get(
+                f"{self.api_url}/get-presigned-url",
+                params={"file_name": file_name},
+                headers=headers,
+            )
+            response.raise_for_status()
+            presign = response.json()
+            upload_url = presign.get("presigned_url")
+            file_path = presign.get("file_path")
+            if not upload_url or not file_path:
+                raise BackendError(f"Invalid presign response: {presign}")
+            
+            # 2. Upload audio
+            response = await client.put(
+                upload_url,
+                content=audio_bytes,
+                headers={"Content-Type": content_type},
+            )
+            response.raise_for_status()
             
-            # Prepare multipart form data
-            files = {
-                "file": ("recording.wav", audio_bytes, "audio/wav")
-            }
+            # 3. Submit detection job
+            response = await client.post(
+                f"{self.api_url}/detect",
+                headers=headers,
+                json={
+                    "key": self.api_key,
+                    "url": file_path,
+                    "document_type": "Audio",
+                    "user_id": self.user_id,
+                },
+            )
+            response.raise_for_status()
+            job_id = response.json().get("id")
+            if not job_id:
+                raise BackendError(f"Invalid detect response: {response.text}")
             
-            # Make API request
-            async with httpx.AsyncClient(timeout=30.0) as client:
+            # 4. Poll for the result
+            while True:
                 response = await client.post(
-                    f"{self.api_url}/predict",
-                    headers={"x-api-key": self.api_key},
-                    files=files
+                    f"{self.api_url}/query",
+                    headers=headers,
+                    json={"id": job_id},
                 )
-                print(f"    [DEBUG] Raw HTTP Status: {response.status_code}")
-                print(f"    [DEBUG] Raw Response Text: {response.text}")
                 response.raise_for_status()
                 result = response.json()
+                status = result.get("status")
+                if status == "done":
+                    break
+                if status == "failed":
+                    raise BackendError(f"Detection job failed: {result}")
+                await asyncio.sleep(self.poll_interval)
+        
+        score = result.get("result")
+        if score is None:
+            raise BackendError(f"Invalid query response: {result}")
+        score = float(score)
+        # Scores may be reported as a percentage
+        return score / 100.0 if score > 1.0 else score
+
+
+class DeepfakeDetector:
+    """
+    Detect AI-generated/synthetic speech across one or more vendor backends.
+    
+    Backends are tried in order. A backup is fired when the current backend
+    fails, has an open circuit, or runs longer than its own latency percentile
+    (hedged request); the first usable score wins and the rest are cancelled.
+    
+    An optional pre-screen backend (e.g. the local CPU model) runs first; a
+    confident pre-screen score is returned without any vendor round trip.
+    """
+    
+    def __init__(
+        self,
+        api_url: str = "",
+        api_key: str = "",
+        backup_api_url: str = "",
+        backup_api_key: str = "",
+        backup_user_id: str = "",
+        backends: Optional[list[DetectorBackend]] = None,
+        hedge_percentile: float = 95.0,
+        hedge_default_delay: float = 8.0,
+        prescreen: Optional[DetectorBackend] = None,
+        prescreen_low: float = 0.1,
+        prescreen_high: float = 0.9,
+        upload_codec: str = "wav",
+    ):
+        """
+        Initialize deepfake detector.
+        
+        Args:
+            api_url: Base URL for Aurigin.AI API (primary)
+            api_key: API key for Aurigin.AI (x-api-key header)
+            backup_api_url: Base URL for Undetectable.AI API (backup)
+            backup_api_key: API key for Undetectable.AI
+            backup_user_id: Undetectable.AI user id
+            backends: Explicit ordered backend list (overrides the URL/key arguments)
+            hedge_percentile: Latency percentile after which the next backend is fired
+            hedge_default_delay: Hedge delay (seconds) until enough latency samples exist
+            prescreen: Backend run before the vendor chain
+            prescreen_low: Pre-screen score at/below which audio is accepted as real
+            prescreen_high: Pre-screen score at/above which audio is flagged as synthetic
+            upload_codec: Encoding used by encode_for_upload ("wav", "flac" or "opus")
+        """
+        if backends is None:
+            backends = []
+            if api_key:
+                backends.append(AuriginBackend(api_url, api_key))
+            if backup_api_url and backup_api_key:
+                backends.append(UndetectableBackend(backup_api_url, backup_api_key, backup_user_id))
+        self.backends = backends
+        self.hedge_percentile = hedge_percentile
+        self.hedge_default_delay = hedge_default_delay
+        self.prescreen = prescreen
+        self.prescreen_low = prescreen_low
+        self.prescreen_high = prescreen_high
+        self.upload_codec = upload_codec
+        self.use_stub = not backends and prescreen is None
+    
+    def hedge_delay(self, backend: DetectorBackend) -> float:
+        """Seconds to wait on a backend before firing the next one"""
+        delay = backend.latency.percentile(self.hedge_percentile)
+        return delay if delay is not None else self.hedge_default_delay
+    
+    async def detect(self, audio_bytes: bytes) -> Optional[float]:
+        """
+        Detect if audio is AI-generated.
+        
+        Args:
+            audio_bytes: Encoded audio bytes (WAV, FLAC or Opus)
+        
+        Returns:
+            Probability [0, 1] that audio is synthetic, or None if no backend
+            produced a usable score (unknown - NOT the same as "not fake")
+        """
+        if self.use_stub:
+            return None  # No detection backend configured - unknown, never a fabricated "real"
+        
+        ticket = self.prescreen.breaker.allow_request() if self.prescreen is not None else None
+        if ticket is not None:
+            # Run as a task so a cancelled detect() gives a half-open probe back
+            score = await self._start_backend(self.prescreen, audio_bytes, ticket)
+            if score is not None:
+                if not self.backends or score <= self.prescreen_low or score >= self.prescreen_high:
+                    print(f"  ⚡ {self.prescreen.name} pre-screen: {score:.3f} - vendor check skipped")
+                    return score
+                print(f"  ⚡ {self.prescreen.name} pre-screen inconclusive ({score:.3f}), escalating")
+        
+        return await self._detect_hedged(audio_bytes)
+    
+    async def _detect_hedged(self, audio_bytes: bytes) -> Optional[float]:
+        """Run the backend chain with hedging and failover"""
+        total_start = time.monotonic()
+        remaining = list(self.backends)
+        pending: dict[asyncio.Task, DetectorBackend] = {}
+        hedge_deadline: Optional[float] = None
+        hedge_after = 0.0
+        
+        def launch_next() -> bool:
+            nonlocal hedge_deadline, hedge_after
+            while remaining:
+                backend = remaining.pop(0)
+                ticket = backend.breaker.allow_request()
+                if ticket is None:
+                    print(f"  ⏭ {backend.name}: circuit open, skipping")
+                    continue
+                print(f"  🔍 Starting {backend.name} deepfake detection...")
+                task = self._start_backend(backend, audio_bytes, ticket)
+                pending[task] = backend
+                hedge_after = self.hedge_delay(backend)
+                hedge_deadline = time.monotonic() + hedge_after
+                return True
+            hedge_deadline = None
+            return False
+        
+        launch_next()
+        try:
+            while pending:
+                timeout = None
+                if remaining and hedge_deadline is not None:
+                    timeout = max(0.0, hedge_deadline - time.monotonic())
             
-            total_time = time.time() - total_start
-            
-            # Extract AI probability from response
-            # Actual API format: {"predictions": ["real", "fake", ...], "global_probability": [0.001, 0.99, ...]}
-            predictions = result.get("predictions", [])
-            probabilities = result.get("global_probability", [])
-            
-            if not predictions or not probabilities:
-                print(f"    ✗ Invalid API response: {result}")
-                return 0.0
-            
-            # Count fake vs real predictions
-            fake_count = sum(1 for p in predictions if p == "fake")
-            total_count = len(predictions)
+                done, _ = await asyncio.wait(
+                    pending.keys(), timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
             
-            # Calculate mean probability - these are probabilities of being FAKE
-            # So we can use the mean directly as AI probability
-            mean_fake_prob = sum(probabilities) / len(probabilities) if probabilities else 0.0
+                if not done:
+                    # Current backend is slower than its latency percentile - hedge
+                    print(f"  ⏱ Hedging: no answer after {hedge_after:.2f}s, firing backup")
+                    launch_next()
+                    continue
             
-            ai_prob = mean_fake_prob
+                for task in done:
+                    backend = pending.pop(task)
+                    score = task.result()
+                    if score is not None:
+                        total_time = time.monotonic() - total_start
+                        print(f"  ✓ {backend.name}: {score:.3f} ({score*100:.1f}% AI) in {total_time:.1f}s")
+                        return score
             
-            print(f"  ✓ Aurigin.AI: {ai_prob:.3f} ({ai_prob*100:.1f}% AI) - {fake_count}/{total_count} fake segments in {total_time:.1f}s")
+                # Failover: nothing in flight succeeded, move to the next backend
+                if not pending:
+                    launch_next()
             
-            return ai_prob
+            print("✗ Deepfake detection unavailable: all backends failed or circuits open")
+            return None
+        finally:
+            for task in pending:
+                task.cancel()
             
+    def _start_backend(
+        self, backend: DetectorBackend, audio_bytes: bytes, ticket: Optional[object]
+    ) -> asyncio.Task:
+        """
+        Start one backend call as a task.
+        
+        Cancellation is recorded from a done callback rather than inside the
+        call: a hedge cancelled before its first step never enters
+        _call_backend, and would otherwise keep a half-open probe slot forever.
+        """
+        task = asyncio.create_task(self._call_backend(backend, audio_bytes, ticket))
+        
+        def release_probe(done: asyncio.Task) -> None:
+            if done.cancelled():
+                backend.breaker.record_cancelled(ticket)
+        
+        task.add_done_callback(release_probe)
+        return task
+    
+    async def _call_backend(
+        self, backend: DetectorBackend, audio_bytes: bytes, ticket: Optional[object]
+    ) -> Optional[float]:
+        """Run one backend with timeout, breaker and latency bookkeeping"""
+        start = time.monotonic()
+        try:
+            score = await asyncio.wait_for(backend.predict(audio_bytes), timeout=backend.timeout)
         except Exception as e:
-            print(f"✗ Aurigin.AI detection error: {e}")
-            return 0.0
+            backend.breaker.record_failure(ticket)
+            print(f"✗ {backend.name} detection error: {e} (circuit {backend.breaker.state})")
+            return None
+            
+        backend.latency.record(time.monotonic() - start)
+        backend.breaker.record_success(ticket)
+        return min(max(score, 0.0), 1.0)
+    
+    async def encode_for_upload(self, pcm_bytes: bytes, sample_rate: int = 16000) -> bytes:
+        """
+        Encode PCM with the configured upload codec, off the event loop.
+        
+        Args:
+            pcm_bytes: Raw PCM audio bytes (16-bit)
+            sample_rate: Sample rate in Hz
+        
+        Returns:
+            Encoded audio bytes ready for detect()
+        """
+        if self.upload_codec == "wav":
+            return self.bytes_to_wav(pcm_bytes, sample_rate)
+        return await encode_pcm_async(pcm_bytes, sample_rate, self.upload_codec)
     
     def bytes_to_wav(self, pcm_bytes: bytes, sample_rate: int = 16000) -> bytes:
         """
@@ -104,3 +464,63 @@ class DeepfakeDetector:
             wav_file.setframerate(sample_rate)
             wav_file.writeframes(pcm_bytes)
         return buffer.getvalue()
+
+
+# Global instance - singleton pattern
+_deepfake_detector: Optional[DeepfakeDetector] = None
+
+
+def get_deepfake_detector() -> DeepfakeDetector:
+    """Get or create global deepfake detector instance"""
+    global _deepfake_detector
+    if _deepfake_detector is None:
+        from ..config import get_settings
+        settings = get_settings()
+        backend_options = dict(
+            timeout=settings.deepfake_request_timeout,
+            failure_threshold=settings.deepfake_breaker_failure_threshold,
+            reset_timeout=settings.deepfake_breaker_reset_seconds,
+        )
+        backends: list[DetectorBackend] = []
+        if settings.aurigin_api_key:
+            backends.append(AuriginBackend(
+                settings.aurigin_api_url, settings.aurigin_api_key, **backend_options
+            ))
+        if settings.undetectable_api_url and settings.undetectable_api_key:
+            backends.append(UndetectableBackend(
+                settings.undetectable_api_url,
+                settings.undetectable_api_key,
+                settings.undetectable_user_id,
+                **backend_options,
+            ))
+        
+        # Local CPU model: in front of, behind, or ahead of (pre-screen) the vendors
+        prescreen: Optional[DetectorBackend] = None
+        mode = settings.local_detector_mode
+        if mode != "off":
+            from .local_spoof_detector import LocalSpoofBackend
+            local = LocalSpoofBackend(
+                weights_path=settings.local_detector_weights_path,
+                sample_rate=settings.sample_rate,
+                workers=settings.local_detector_workers,
+                **backend_options,
+            )
+            if mode == "primary":
+                backends.insert(0, local)
+            elif mode == "fallback":
+                backends.append(local)
+            elif mode == "prescreen":
+                prescreen = local
+            else:
+                raise ValueError(f"Unknown local_detector_mode: {mode}")
+        
+        _deepfake_detector = DeepfakeDetector(
+            backends=backends,
+            hedge_percentile=settings.deepfake_hedge_percentile,
+            hedge_default_delay=settings.deepfake_hedge_default_delay,
+            prescreen=prescreen,
+            prescreen_low=settings.local_prescreen_low,
+            prescreen_high=settings.local_prescreen_high,
+            upload_codec=settings.upload_codec,
+        )
+    return _deepfake_detector
@@ -0,0 +1,112 @@
+"""In-flight Tracker - One vendor request per session and stage, with coalescing and cancellation"""
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+# A job is started lazily, so coalesced triggers never encode or upload anything
+Job = Callable[[], Awaitable[Any]]
+
+
+class InFlightTracker:
+    """
+    Track at most one running analysis request per (session_id, stage).
+    
+    - A trigger while a request is running is coalesced: only the newest
+      pending trigger is kept and it starts when the running one finishes.
+    - A trigger from a newer window can supersede (cancel) the running
+      request when the stage asks for it.
+    - Closing a session cancels everything it still has in flight.
+    """
+    
+    def __init__(self):
+        self._running: Dict[Tuple[str, str], Tuple[asyncio.Task, Any]] = {}
+        self._pending: Dict[Tuple[str, str], Tuple[Job, Any]] = {}
+        self.stats = {"started": 0, "coalesced": 0, "superseded": 0, "cancelled": 0}
+    
+    def submit(
+        self,
+        session_id: str,
+        stage: str,
+        job: Job,
+        window_id: Any = None,
+        supersede: bool = False,
+    ) -> str:
+        """
+        Start or coalesce an analysis request.
+        
+        Args:
+            session_id: Session the request belongs to
+            stage: Analysis stage (e.g. "deepfake", "social_engineering")
+            job: Async callable that performs the request and stores its result
+            window_id: Identifier of the audio window that triggered the request
+            supersede: Cancel a running request from an older window instead of queueing
+        
+        Returns:
+            "started", "coalesced" or "superseded"
+        """
+        key = (session_id, stage)
+        running = self._running.get(key)
+        
+        if running is None:
+            self._start(key, job, window_id)
+            return "started"
+        
+        task, running_window = running
+        if supersede and window_id != running_window:
+            # Newer window makes the running request obsolete - stop paying for it
+            del self._running[key]
+            self._pending.pop(key, None)
+            task.cancel()
+            self.stats["superseded"] += 1
+            self._start(key, job, window_id)
+            return "superseded"
+        
+        self.stats["coalesced"] += 1
+        self._pending[key] = (job, window_id)
+        return "coalesced"
+    
+    def is_running(self, session_id: str, stage: str) -> bool:
+        return (session_id, stage) in self._running
+    
+    def cancel_session(self, session_id: str) -> int:
+        """Cancel running and drop pending requests for a session. Returns number cancelled."""
+        cancelled = 0
+        for key in [k for k in self._running if k[0] == session_id]:
+            task, _ = self._running.pop(key)
+            task.cancel()
+            cancelled += 1
+        for key in [k for k in self._pending if k[0] == session_id]:
+            del self._pending[key]
+        self.stats["cancelled"] += cancelled
+        return cancelled
+    
+    def _start(self, key: Tuple[str, str], job: Job, window_id: Any) -> None:
+        task = asyncio.create_task(job())
+        self._running[key] = (task, window_id)
+        self.stats["started"] += 1
+        task.add_done_callback(lambda t: self._on_done(key, t))
+    
+    def _on_done(self, key: Tuple[str, str], task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f"✗ [{key[1]}] analysis error for session {key[0][:8]}: {task.exception()}")
+        
+        running = self._running.get(key)
+        if running is None or running[0] is not task:
+            return  # Superseded or cancelled - a newer request owns this slot
+        del self._running[key]
+        
+        pending = self._pending.pop(key, None)
+        if pending is not None:
+            job, window_id = pending
+            self._start(key, job, window_id)
+
+
+# Global instance - singleton pattern
+_inflight_tracker: Optional[InFlightTracker] = None
+
+
+def get_inflight_tracker() -> InFlightTracker:
+    """Get or create global in-flight tracker instance"""
+    global _inflight_tracker
+    if _inflight_tracker is None:
+        _inflight_tracker = InFlightTracker()
+    return _inflight_tracker
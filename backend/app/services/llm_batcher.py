@@ -0,0 +1,183 @@
+"""LLM Batcher - Combine social engineering analyses from several sessions into one LLM request"""
+import asyncio
+import json
+from dataclasses import dataclass
+from typing import Awaitable, Callable, List, Optional, Set
+
+BATCH_INSTRUCTIONS = """Several independent phone calls are included below, each with an "id".
+Analyze every item on its own, exactly as you would a single request; never mix context between items.
+Return ONLY a JSON object of the form {"results": [{"id": "<item id>", ...analysis fields...}, ...]}
+with one entry per item, using the same analysis fields as for a single request."""
+
+
+@dataclass
+class _Item:
+    item_id: str
+    summary: str
+    delta: str
+    future: asyncio.Future
+    deadline: float  # Loop time after which the caller no longer wants the result
+
+
+def parse_json_response(response_text: str):
+    """Parse an LLM JSON reply, tolerating markdown code fences"""
+    response_text = response_text.strip()
+    # Remove markdown code blocks if present
+    if response_text.startswith("```json"):
+        response_text = response_text[7:]
+    if response_text.startswith("```"):
+        response_text = response_text[3:]
+    if response_text.endswith("```"):
+        response_text = response_text[:-3]
+    return json.loads(response_text.strip())
+
+
+class LLMBatcher:
+    """
+    Collect pending transcript deltas from many sessions for a short window and
+    send them as one structured multi-item prompt.
+    
+    Results are demultiplexed by item id. Items missing from the reply, or the
+    whole batch if the reply doesn't parse, fall back to single requests.
+    A fallback request is cancelled as soon as its caller gives up or its
+    deadline passes, so no work outlives the caller's timeout.
+    """
+    
+    def __init__(
+        self,
+        generate: Callable[[str], Awaitable[str]],
+        build_prompt: Callable[[str, str], str],
+        window_seconds: float = 0.1,
+        max_items: int = 8,
+        timeout_seconds: float = 15.0,
+        generate_batch: Optional[Callable[[str], Awaitable[str]]] = None,
+    ):
+        """
+        Args:
+            generate: Sends a prompt to the LLM and returns the raw reply text
+            build_prompt: Single-item prompt builder (summary, delta) -> prompt
+            window_seconds: How long the first item waits for others to join
+            max_items: Batch is sent as soon as it has this many items
+            timeout_seconds: How long a caller waits for its result (bounds fallback work)
+            generate_batch: Sends a multi-item prompt; needed when `generate` carries
+                single-item instructions (e.g. a system prompt asking for one analysis)
+        """
+        self.generate = generate
+        self.generate_batch = generate_batch or generate
+        self.build_prompt = build_prompt
+        self.window_seconds = window_seconds
+        self.max_items = max_items
+        self.timeout_seconds = timeout_seconds
+        self._items: List[_Item] = []
+        self._tasks: Set[asyncio.Task] = set()  # Strong references to running batches
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._next_id = 0
+        self.stats = {"requests": 0, "batches": 0, "batched_items": 0, "fallbacks": 0}
+    
+    async def submit(self, summary: str, delta: str) -> dict:
+        """
+        Queue one analysis and wait for its result.
+        
+        Args:
+            summary: Rolling conversation summary for the session
+            delta: New transcript text
+        
+        Returns:
+            Parsed analysis dict (raises on LLM or parse failure)
+        """
+        loop = asyncio.get_running_loop()
+        self._next_id += 1
+        item = _Item(f"c{self._next_id}", summary, delta, loop.create_future(), loop.time() + self.timeout_seconds)
+        self._items.append(item)
+        
+        if len(self._items) >= self.max_items:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.window_seconds, self._flush)
+        
+        try:
+            return await asyncio.shield(item.future)
+        except asyncio.CancelledError:
+            # Caller gave up (timeout / session closed) - its slot in the batch is simply ignored
+            item.future.cancel()
+            raise
+    
+    def _flush(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        items, self._items = self._items, []
+        if items:
+            task = asyncio.create_task(self._run(items))
+            self._tasks.add(task)
+            task.add_done_callback(self._task_done)
+    
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"✗ [LLMBatcher] Batch task failed: {task.exception()}")
+    
+    def build_batch_prompt(self, items: List[_Item]) -> str:
+        payload = [
+            {"id": item.item_id, "earlier_conversation_summary": item.summary or "", "new_transcript_text": item.delta}
+            for item in items
+        ]
+        return f"{BATCH_INSTRUCTIONS}\n\nItems:\n{json.dumps(payload, ensure_ascii=False)}"
+    
+    async def _run(self, items: List[_Item]) -> None:
+        items = [item for item in items if not item.future.done()]
+        if not items:
+            return
+        if len(items) == 1:
+            await self._run_single(items[0])
+            return
+        
+        self.stats["requests"] += 1
+        self.stats["batches"] += 1
+        self.stats["batched_items"] += len(items)
+        results = {}
+        try:
+            reply = parse_json_response(await self.generate_batch(self.build_batch_prompt(items)))
+            for result in reply.get("results", []):
+                if isinstance(result, dict) and "id" in result:
+                    results[str(result.pop("id"))] = result
+        except Exception as e:
+            print(f"✗ [LLMBatcher] Batch of {len(items)} failed ({e}), falling back to single requests")
+        
+        missing = []
+        for item in items:
+            if item.future.done():
+                continue  # Caller already gave up
+            result = results.get(item.item_id)
+            if result is None:
+                missing.append(item)
+            else:
+                item.future.set_result(result)
+        
+        if missing:
+            self.stats["fallbacks"] += len(missing)
+            await asyncio.gather(*(self._run_single(item) for item in missing))
+    
+    async def _run_single(self, item: _Item) -> None:
+        remaining = item.deadline - asyncio.get_running_loop().time()
+        if item.future.done() or remaining <= 0:
+            return  # Caller already gave up; its own wait_for reports the timeout
+        
+        self.stats["requests"] += 1
+        request = asyncio.ensure_future(self.generate(self.build_prompt(item.summary, item.delta)))
+        # Stop as soon as the caller stops waiting (cancelled future) or the deadline passes
+        await asyncio.wait({request, item.future}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+        if not request.done():
+            request.cancel()
+            if not item.future.done():
+                item.future.set_exception(asyncio.TimeoutError())
+            return
+        
+        try:
+            result = parse_json_response(request.result())
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+            return
+        if not item.future.done():
+            item.future.set_result(result)
@@ -0,0 +1,175 @@
+"""Local Spoof Detector - On-CPU synthetic speech detection (LFCC front end + small CNN)"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+from .audio_codec import decode_audio
+from .deepfake_detector import DetectorBackend, BackendError
+
+
+class LFCCFrontEnd(nn.Module):
+    """Linear-frequency cepstral coefficients with delta and delta-delta features"""
+    
+    def __init__(self, sample_rate: int = 16000, n_lfcc: int = 20):
+        super().__init__()
+        import torchaudio
+        self.lfcc = torchaudio.transforms.LFCC(
+            sample_rate=sample_rate,
+            n_lfcc=n_lfcc,
+            speckwargs={"n_fft": 512, "win_length": 400, "hop_length": 160},
+        )
+        self._compute_deltas = torchaudio.functional.compute_deltas
+    
+    def forward(self, audio: torch.Tensor) -> torch.Tensor:
+        """
+        Args:
+            audio: (batch, time) float audio in [-1, 1]
+        
+        Returns:
+            (batch, 1, 3 * n_lfcc, frames) feature map
+        """
+        features = self.lfcc(audio)
+        delta = self._compute_deltas(features)
+        delta2 = self._compute_deltas(delta)
+        features = torch.cat([features, delta, delta2], dim=1)
+        # Per-utterance mean/variance normalization over time
+        features = (features - features.mean(dim=-1, keepdim=True)) / (features.std(dim=-1, keepdim=True) + 1e-5)
+        return features.unsqueeze(1)
+
+
+class SpoofCNN(nn.Module):
+    """Lightweight CNN classifier over LFCC features - outputs P(synthetic)"""
+    
+    def __init__(self, sample_rate: int = 16000, n_lfcc: int = 20, channels: tuple[int, ...] = (16, 32, 64)):
+        super().__init__()
+        self.front_end = LFCCFrontEnd(sample_rate, n_lfcc)
+        
+        layers: list[nn.Module] = []
+        in_channels = 1
+        for out_channels in channels:
+            layers += [
+                nn.Conv2d(in_channels, out_channels, kernel_size=3, padding=1),
+                nn.BatchNorm2d(out_channels),
+                nn.ReLU(inplace=True),
+                nn.MaxPool2d(2),
+            ]
+            in_channels = out_channels
+        self.encoder = nn.Sequential(*layers)
+        self.pool = nn.AdaptiveAvgPool2d(1)
+        self.classifier = nn.Linear(in_channels, 1)
+    
+    def forward(self, audio: torch.Tensor) -> torch.Tensor:
+        """
+        Args:
+            audio: (batch, time) float audio
+        
+        Returns:
+            (batch,) probability that each clip is synthetic
+        """
+        x = self.encoder(self.front_end(audio))
+        x = self.pool(x).flatten(1)
+        return torch.sigmoid(self.classifier(x)).squeeze(-1)
+
+
+def decode_to_tensor(audio_bytes: bytes, sample_rate: int = 16000) -> torch.Tensor:
+    """
+    Decode a WAV/FLAC/Opus upload payload into a mono float tensor.
+    
+    Raises:
+        BackendError: if the payload cannot be decoded at the expected rate
+    """
+    try:
+        audio, payload_rate = decode_audio(audio_bytes)
+    except Exception as e:
+        raise BackendError(f"Unsupported audio payload: {e}")
+    if payload_rate != sample_rate:
+        raise BackendError(f"Local detector expects {sample_rate} Hz audio, got {payload_rate} Hz")
+    return torch.from_numpy(np.ascontiguousarray(audio))
+
+
+class LocalSpoofBackend(DetectorBackend):
+    """
+    Deepfake backend running SpoofCNN on CPU - no network, no per-call cost.
+    
+    Audio is cut into fixed-length segments that are scored as one batch;
+    the clip score is the mean segment probability. Inference runs in a
+    dedicated worker pool so the event loop is never blocked.
+    """
+    
+    name = "Local LFCC-CNN"
+    
+    def __init__(
+        self,
+        weights_path: str = "",
+        sample_rate: int = 16000,
+        segment_seconds: float = 4.0,
+        max_seconds: float = 30.0,
+        workers: int = 1,
+        **kwargs,
+    ):
+        super().__init__(**kwargs)
+        self.weights_path = weights_path
+        self.sample_rate = sample_rate
+        self.segment_seconds = segment_seconds
+        self.max_seconds = max_seconds
+        self.model: Optional[SpoofCNN] = None  # Lazy loaded
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="local-spoof")
+    
+    def load_weights(self, weights_path: Optional[str] = None) -> SpoofCNN:
+        """
+        Load SpoofCNN weights from a local state_dict file (no network access).
+        
+        Args:
+            weights_path: Path to a .pt/.pth file; defaults to the configured path
+        """
+        path = Path(weights_path or self.weights_path)
+        if not path.is_file():
+            raise BackendError(f"Local detector weights not found: {path}")
+        
+        checkpoint = torch.load(path, map_location="cpu", weights_only=True)
+        state_dict = checkpoint.get("state_dict", checkpoint)
+        
+        model = SpoofCNN(sample_rate=self.sample_rate)
+        model.load_state_dict(state_dict)
+        model.eval()
+        self.model = model
+        print(f"✓ Local spoof detector loaded from {path}")
+        return model
+    
+    def _load_model(self) -> SpoofCNN:
+        if self.model is None:
+            self.load_weights()
+        return self.model
+    
+    def score_tensor(self, audio: torch.Tensor) -> float:
+        """Synchronously score a 1D float tensor (runs in the worker pool)"""
+        model = self._load_model()
+        
+        # Only the most recent max_seconds matter for a live call
+        audio = audio[-int(self.max_seconds * self.sample_rate):]
+        segment = int(self.segment_seconds * self.sample_rate)
+        if len(audio) < segment:
+            audio = torch.nn.functional.pad(audio, (0, segment - len(audio)))
+        
+        # Non-overlapping segments; the tail segment is aligned to the end of the clip
+        starts = list(range(0, len(audio) - segment + 1, segment))
+        if starts[-1] + segment < len(audio):
+            starts.append(len(audio) - segment)
+        batch = torch.stack([audio[s:s + segment] for s in starts])
+        
+        with torch.inference_mode():
+            probabilities = model(batch)
+        return float(probabilities.mean())
+    
+    async def predict(self, audio_bytes: bytes) -> float:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._score_payload, audio_bytes)
+
+    def _score_payload(self, audio_bytes: bytes) -> float:
+        """Decode and score in one worker hop"""
+        return self.score_tensor(decode_to_tensor(audio_bytes, self.sample_rate))
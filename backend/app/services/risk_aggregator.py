@@ -0,0 +1,339 @@
+"""Risk Aggregator - Constant-memory streaming risk state for one session"""
+import itertools
+import math
+import threading
+from array import array
+from collections import deque
+from typing import Iterable, List, Optional, Tuple
+
+from ..models.schemas import RiskResponse, RiskStatus
+from .risk_engine import RiskEngine
+
+_default_engine = RiskEngine()
+
+# Shared by every aggregator, so versions also order updates across sessions
+# (bulk readers ask for "everything newer than version N")
+_versions = itertools.count(1)
+_versions_lock = threading.Lock()
+
+
+def version_high_water() -> int:
+    """A version number above every one handed out so far (consumes one number)"""
+    return next(_versions)
+
+
+def advance_versions(past: int) -> None:
+    """
+    Make every later version larger than past.
+    
+    Called when restoring snapshots from a previous process, so delta readers
+    holding a pre-restart version (and cached ETags) never see numbers repeat.
+    """
+    global _versions
+    with _versions_lock:
+        current = next(_versions)
+        _versions = itertools.count(max(current, past + 1))
+
+# Per-window history kept for the call archive (4-byte floats; ~16 KiB per series at the cap)
+HISTORY_LIMIT = 4096
+SE_HISTORY_LIMIT = 256
+
+
+class RiskAggregator:
+    """
+    Incrementally maintained risk state, updated on every new result.
+    
+    Voice match keeps a fixed-size window (ring buffer + running sum) for the
+    recent mean, plus EWMA, min, max and count over the whole call. Deepfake
+    and social engineering keep only their latest result for the status. The
+    risk status is assessed once per update, so reads never recompute anything.
+    
+    For the call archive, every window's score is also appended to compact
+    float arrays (match, deepfake score + audio end) and social engineering
+    results to a deque of trimmed verdicts. These are capped (HISTORY_LIMIT /
+    SE_HISTORY_LIMIT; past the cap the oldest half is dropped and counted), so
+    memory stays bounded however long the call runs.
+    
+    Every accepted update takes a new version from a process-wide counter and
+    re-encodes the RiskResponse JSON, so pollers get (version, bytes) without
+    any per-read work.
+    """
+    
+    __slots__ = (
+        "engine", "alpha",
+        "match_window", "match_sum", "match_count", "match_ewma", "match_min", "match_max",
+        "fake_last", "fake_count", "fake_scored", "fake_ewma", "fake_max", "fake_end",
+        "se_last", "se_count",
+        "history_limit", "match_history", "fake_history", "fake_history_end", "se_history", "history_dropped",
+        "mean_match", "mean_fake", "status", "reason",
+        "version", "snapshot",
+    )
+    
+    def __init__(
+        self,
+        engine: Optional[RiskEngine] = None,
+        window: int = 5,
+        alpha: float = 0.3,
+        history_limit: int = HISTORY_LIMIT,
+    ):
+        """
+        Args:
+            engine: Thresholds used to assess status (default RiskEngine())
+            window: Number of recent match scores averaged for the status
+            alpha: EWMA smoothing factor
+            history_limit: Max per-window scores kept per series for the archive
+        """
+        self.engine = engine or _default_engine
+        self.alpha = alpha
+        
+        self.match_window: deque = deque(maxlen=window)
+        self.match_sum = 0.0
+        self.match_count = 0
+        self.match_ewma = 0.0
+        self.match_min = 1.0
+        self.match_max = 0.0
+        
+        self.fake_last: Optional[float] = None  # Latest deepfake score (None = unknown or none yet)
+        self.fake_count = 0
+        self.fake_scored = 0  # Results that produced an actual score
+        self.fake_ewma = 0.0
+        self.fake_max = 0.0
+        self.fake_end = 0.0  # Caller-audio offset (s) covered by the latest deepfake score
+        
+        self.se_last: Optional[dict] = None
+        self.se_count = 0
+        
+        self.history_limit = history_limit
+        self.match_history = array("f")
+        self.fake_history = array("f")  # NaN = detection unavailable for that window
+        self.fake_history_end = array("f")  # Caller-audio offset (s) each deepfake score covers up to
+        self.se_history: deque = deque(maxlen=SE_HISTORY_LIMIT)
+        self.history_dropped = {"match": 0, "fake": 0, "se": 0}
+        
+        self.mean_match = 0.0
+        self.mean_fake = 0.0
+        self.status = RiskStatus.INITIAL
+        self.reason = "Waiting for caller audio..."
+    
+        # New sessions get a version too, so delta readers pick them up before their first score
+        self.version = next(_versions)
+        self.snapshot: Tuple[int, bytes] = (self.version, self._encode())  # (version, RiskResponse JSON)
+    
+    @property
+    def fake_unknown(self) -> bool:
+        """True when the latest deepfake check could not produce a score"""
+        return self.fake_count > 0 and self.fake_last is None
+    
+    def add_match(self, score: float) -> None:
+        if len(self.match_window) == self.match_window.maxlen:
+            self.match_sum -= self.match_window[0]
+        self.match_window.append(score)
+        self.match_sum += score
+        
+        self.match_ewma = score if self.match_count == 0 else self.alpha * score + (1 - self.alpha) * self.match_ewma
+        self.match_min = min(self.match_min, score)
+        self.match_max = max(self.match_max, score)
+        self.match_count += 1
+        self._record(self.match_history, score, "match")
+        self._assess()
+        self._publish()
+    
+    def add_fake(self, score: Optional[float], audio_range: Optional[Tuple[float, float]] = None) -> bool:
+        """
+        Record a deepfake result. Results covering audio that ends no later than
+        the latest stored one arrived out of order and are dropped.
+        
+        Returns:
+            True if the score was stored
+        """
+        if audio_range is not None and self.fake_count and audio_range[1] <= self.fake_end:
+            return False
+        if audio_range is not None:
+            self.fake_end = audio_range[1]
+        
+        self.fake_last = score
+        if score is not None:
+            self.fake_ewma = score if self.fake_scored == 0 else self.alpha * score + (1 - self.alpha) * self.fake_ewma
+            self.fake_max = max(self.fake_max, score)
+            self.fake_scored += 1
+        self.fake_count += 1
+        self._record(self.fake_history, math.nan if score is None else score, "fake", self.fake_history_end, self.fake_end)
+        self._assess()
+        self._publish()
+        return True
+    
+    def add_se(self, result: dict, audio_range: Optional[Tuple[float, float]] = None) -> bool:
+        """
+        Record a social engineering result, stamped with the audio range it covers.
+        
+        Returns:
+            True if the result was stored (False if stale)
+        """
+        if audio_range is not None:
+            if self.se_last is not None and audio_range[1] <= self.se_last.get("audio_end", 0.0):
+                return False
+            result["audio_start"], result["audio_end"] = audio_range
+        self.se_last = result
+        self.se_count += 1
+        if len(self.se_history) == self.se_history.maxlen:
+            self.history_dropped["se"] += 1
+        self.se_history.append({
+            key: result[key]
+            for key in ("audio_start", "audio_end", "risk_score", "risk_level", "flagged_phrases", "reason")
+            if key in result
+        })
+        self._publish()
+        return True
+    
+    def _record(self, series: array, value: float, name: str, ends: Optional[array] = None, end: float = 0.0) -> None:
+        """Append to a history series, dropping its oldest half once it reaches history_limit"""
+        if len(series) >= self.history_limit:
+            half = self.history_limit // 2
+            del series[:half]
+            if ends is not None:
+                del ends[:half]
+            self.history_dropped[name] += half
+        series.append(value)
+        if ends is not None:
+            ends.append(end)
+    
+    def history(self) -> dict:
+        """Per-window score series and social engineering verdicts (for the call archive)"""
+        return {
+            "match": [round(score, 4) for score in self.match_history],
+            "fake": [
+                [round(end, 2), None if math.isnan(score) else round(score, 4)]
+                for end, score in zip(self.fake_history_end, self.fake_history)
+            ],
+            "social_engineering": list(self.se_history),
+            "dropped": dict(self.history_dropped),
+        }
+    
+    def _assess(self) -> None:
+        """Recompute the cached status - O(1), runs once per update"""
+        self.mean_match = self.match_sum / len(self.match_window) if self.match_window else 0.0
+        fake_unknown = self.fake_unknown
+        self.mean_fake = self.fake_last if self.fake_last is not None else 0.0
+        self.status, self.reason = self.engine.assess_risk(self.mean_match, self.mean_fake, fake_unknown)
+    
+    def _encode(self) -> bytes:
+        """Serialized RiskResponse for the current state"""
+        se = self.se_last or {}
+        return RiskResponse(
+            match_score=self.engine.normalize_to_100(self.mean_match),
+            fake_score=self.engine.normalize_to_100(self.mean_fake),
+            status=self.status,
+            status_reason=self.reason,
+            fake_score_available=not self.fake_unknown,
+            se_risk_score=min(max(int(se.get("risk_score", 0)), 0), 100),
+            se_risk_level=se.get("risk_level", "SAFE"),
+            se_flagged_phrases=se.get("flagged_phrases", []),
+            se_reason=se.get("reason", ""),
+        ).model_dump_json().encode("utf-8")
+    
+    def touch(self) -> None:
+        """Take a new version without a new score (the session is visible to delta readers again)"""
+        self._publish()
+    
+    def _publish(self) -> None:
+        # One tuple assignment, so readers always see a matching version and payload
+        self.version = next(_versions)
+        self.snapshot = (self.version, self._encode())
+    
+    # Everything needed to rebuild the aggregator (engine and snapshot are derived)
+    _STATE_FIELDS = (
+        "alpha", "match_sum", "match_count", "match_ewma", "match_min", "match_max",
+        "fake_last", "fake_count", "fake_scored", "fake_ewma", "fake_max", "fake_end",
+        "se_last", "se_count", "mean_match", "mean_fake", "reason",
+    )
+    
+    def to_state(self) -> dict:
+        """JSON-serializable state (for session snapshots; history is saved separately, see history_records)"""
+        state = {name: getattr(self, name) for name in self._STATE_FIELDS}
+        state["match_window"] = list(self.match_window)
+        state["window"] = self.match_window.maxlen
+        state["status"] = self.status.value
+        state["version"] = self.version
+        state["history_limit"] = self.history_limit
+        return state
+    
+    def history_records(self, cursor: Optional[dict] = None) -> Tuple[List[list], dict]:
+        """
+        History entries appended since cursor, as small JSON-serializable records.
+        
+        Lets a snapshot append only what is new each tick instead of rewriting
+        the whole history.
+        
+        Args:
+            cursor: Entries ever appended per series, as returned by the previous
+                call (None = the whole retained history, led by the dropped counts)
+        
+        Returns:
+            (records, cursor for the next call)
+        """
+        totals = {
+            "match": self.history_dropped["match"] + len(self.match_history),
+            "fake": self.history_dropped["fake"] + len(self.fake_history),
+            "se": self.history_dropped["se"] + len(self.se_history),
+        }
+        records = []
+        if cursor is None:
+            cursor = dict(self.history_dropped)
+            records.append(["dropped", dict(self.history_dropped)])
+        
+        start = max(len(self.match_history) - (totals["match"] - cursor["match"]), 0)
+        records.extend(["match", round(score, 4)] for score in self.match_history[start:])
+        start = max(len(self.fake_history) - (totals["fake"] - cursor["fake"]), 0)
+        records.extend(
+            ["fake", round(end, 2), None if math.isnan(score) else round(score, 4)]
+            for end, score in zip(self.fake_history_end[start:], self.fake_history[start:])
+        )
+        start = max(len(self.se_history) - (totals["se"] - cursor["se"]), 0)
+        records.extend(["se", verdict] for verdict in itertools.islice(self.se_history, start, None))
+        return records, totals
+    
+    def load_history(self, records: Iterable[list]) -> None:
+        """Replay records from history_records() (rebuilds the history after a restart)"""
+        for record in records:
+            kind = record[0]
+            if kind == "dropped":
+                self.history_dropped.update(record[1])
+            elif kind == "match":
+                self._record(self.match_history, record[1], "match")
+            elif kind == "fake":
+                score = math.nan if record[2] is None else record[2]
+                self._record(self.fake_history, score, "fake", self.fake_history_end, record[1])
+            elif kind == "se":
+                if len(self.se_history) == self.se_history.maxlen:
+                    self.history_dropped["se"] += 1
+                self.se_history.append(record[1])
+    
+    @classmethod
+    def from_state(cls, state: dict, engine: Optional[RiskEngine] = None) -> "RiskAggregator":
+        """Rebuild an aggregator saved by to_state() (gets a fresh version above the saved one)"""
+        advance_versions(state.get("version", 0))
+        aggregator = cls(
+            engine, window=state["window"], alpha=state["alpha"],
+            history_limit=state.get("history_limit", HISTORY_LIMIT),
+        )
+        for name in cls._STATE_FIELDS:
+            setattr(aggregator, name, state[name])
+        aggregator.match_window.extend(state["match_window"])
+        aggregator.status = RiskStatus(state["status"])
+        aggregator._publish()
+        return aggregator
+    
+    def summary(self) -> dict:
+        """Whole-call statistics"""
+        return {
+            "match_count": self.match_count,
+            "match_mean_recent": self.mean_match,
+            "match_ewma": self.match_ewma,
+            "match_min": self.match_min if self.match_count else None,
+            "match_max": self.match_max if self.match_count else None,
+            "fake_count": self.fake_count,
+            "fake_last": self.fake_last,
+            "fake_ewma": self.fake_ewma,
+            "fake_max": self.fake_max,
+            "se_count": self.se_count,
+        }
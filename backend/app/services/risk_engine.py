@@ -1,5 +1,5 @@
 """Risk Engine - Compute risk scores and status"""
-from typing import Tuple
+from typing import Optional, Tuple
 from ..models.schemas import RiskStatus
 
 
@@ -13,14 +13,14 @@ class RiskEngine:
     def compute_risk(
         self,
         match_scores: list[float],
-        fake_scores: list[float],
+        fake_scores: list[Optional[float]],
     ) -> Tuple[float, float, RiskStatus, str]:
         """
         Compute overall risk assessment.
         
         Args:
             match_scores: List of voice similarity scores [0, 1]
-            fake_scores: List of AI-generated probabilities [0, 1]
+            fake_scores: List of AI-generated probabilities [0, 1] (None = detection unavailable)
             
         Returns:
             (mean_match, mean_fake, RiskStatus, reason_text)
@@ -34,19 +34,30 @@ class RiskEngine:
         mean_match = sum(recent_match_scores) / len(recent_match_scores) if recent_match_scores else 0.0
         
         # Fake scores: Use LAST score only (no averaging) for immediate AI detection
-        mean_fake = fake_scores[-1] if fake_scores else 0.0
+        fake_unknown = self.is_fake_unknown(fake_scores)
+        mean_fake = fake_scores[-1] if fake_scores and not fake_unknown else 0.0
         
         # Determine status and generate reason
-        status, reason = self._assess_risk(mean_match, mean_fake)
+        status, reason = self.assess_risk(mean_match, mean_fake, fake_unknown)
         
         return mean_match, mean_fake, status, reason
     
-    def _assess_risk(self, mean_match: float, mean_fake: float) -> Tuple[RiskStatus, str]:
+    def is_fake_unknown(self, fake_scores: list[Optional[float]]) -> bool:
+        """True when the latest deepfake check could not produce a score"""
+        return bool(fake_scores) and fake_scores[-1] is None
+    
+    def assess_risk(
+        self,
+        mean_match: float,
+        mean_fake: float,
+        fake_unknown: bool = False,
+    ) -> Tuple[RiskStatus, str]:
         """
         Apply threshold rules to determine risk status.
         
         Rules:
         - HIGH_RISK: Low match (<0.5) OR high fake (>0.6)
+        - UNCERTAIN: Deepfake check unavailable (never SAFE without a synthetic score)
         - SAFE: High match (≥0.8) AND low fake (≤0.2)
         - UNCERTAIN: Everything else
         """
@@ -63,6 +74,13 @@ class RiskEngine:
                 f"High probability ({mean_fake:.1%}) of AI-generated voice. Possible deepfake attack."
             )
         
+        # Unknown synthetic likelihood - cannot vouch for the caller
+        if fake_unknown:
+            return (
+                RiskStatus.UNCERTAIN,
+                f"Voice match {mean_match:.1%}. Synthetic speech check unavailable."
+            )
+        
         # SAFE conditions - both metrics pass thresholds
         if mean_match >= self.match_threshold and mean_fake <= self.fake_threshold:
             return (
@@ -1,9 +1,19 @@
 """Session Manager - Manages session state and lifecycle"""
+import asyncio
+import heapq
+import shutil
 import time
 import uuid
 import threading
+from collections import deque
 from dataclasses import dataclass, field
-from typing import Dict, Optional
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from ..config import get_settings
+from ..models.schemas import RiskStatus
+from .audio_buffer import AudioBuffer
+from .call_archiver import CallArchiver
+from .risk_aggregator import RiskAggregator, version_high_water
 
 
 @dataclass
@@ -12,120 +22,372 @@ class Session:
     session_id: str
     user_id: str
     start_time: float
-    # Audio buffers - will store raw PCM bytes
-    raw_audio: list[bytes] = field(default_factory=list)  # All audio
-    caller_audio: list[bytes] = field(default_factory=list)  # Only caller windows
-    # Analysis results
-    match_scores: list[float] = field(default_factory=list)  # Voice similarity scores
-    fake_scores: list[float] = field(default_factory=list)  # Deepfake probabilities
-    se_results: list[dict] = field(default_factory=list)  # Social engineering results
+    # Audio buffers - raw PCM bytes, older audio spilled to disk past the memory budget
+    raw_audio: AudioBuffer = field(default_factory=AudioBuffer)  # All audio
+    caller_audio: AudioBuffer = field(default_factory=AudioBuffer)  # Only caller windows
+    # Analysis results - streaming aggregates, constant size for the whole call
+    risk: RiskAggregator = field(default_factory=RiskAggregator)
     # Metadata
     elapsed_time: float = 0.0
     active: bool = True
+    expires_at: float = 0.0  # Next reaper check (last activity + idle timeout, or close + grace)
+    last_activity: float = 0.0  # Last audio / websocket loop tick, pushes an open session's expiry forward
+    # Guards this session's buffers and risk state (held only for a few appends)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+    
+    def release_audio(self) -> None:
+        """Free both audio buffers, including spilled segments"""
+        self.raw_audio.release()
+        self.caller_audio.release()
 
 
 class SessionManager:
-    """Manages active sessions with thread-safe operations"""
+    """
+    Manages active sessions, sharded by session id.
+    
+    Lookups are lock-free (a single dict read is atomic). Each shard has its
+    own lock, taken only to add or remove sessions, and each session has its
+    own lock guarding its buffers and risk state, so calls and REST polls on
+    different sessions never contend with each other.
+    
+    Expiry is tracked in a min-heap of (expires_at, session_id). The reaper
+    pops due entries (bounded per tick); entries made obsolete by a later
+    deadline or a deleted session are skipped when popped.
+    
+    Open sessions time out only when idle. Activity just stamps
+    last_activity (no heap work per chunk); when an open session's entry
+    comes due, the reaper re-pushes it at last_activity + timeout instead of
+    evicting it, so a streaming call costs one heap push per timeout period.
     
-    def __init__(self, max_sessions: int = 100, timeout_seconds: int = 300):
-        self._sessions: Dict[str, Session] = {}
-        self._lock = threading.RLock()
+    A session that ends (closed, timed out or deleted) takes a risk version
+    too and is kept in a bounded log, so delta readers of risk_snapshots
+    learn that it left the active set.
+    """
+    
+    def __init__(
+        self,
+        max_sessions: int = 100,
+        timeout_seconds: int = 300,
+        closed_grace_seconds: float = 60.0,
+        reap_batch: int = 256,
+        num_shards: int = 16,
+        store_raw_audio: bool = True,
+        audio_memory_bytes: int = 0,
+        audio_horizon_bytes: int = 0,
+        spill_dir: str = "",
+        archiver: Optional[CallArchiver] = None,
+        ended_log_size: int = 4096,
+    ):
+        """
+        Args:
+            max_sessions: Capacity before old sessions are cleaned up
+            timeout_seconds: Idle time after which an open session counts as timed out
+            closed_grace_seconds: How long a closed session stays readable (risk, export)
+            reap_batch: Max heap entries the reaper pops per tick
+            num_shards: Number of independently locked session tables
+            store_raw_audio: Keep all audio, not just caller windows (nothing analyzes it)
+            audio_memory_bytes: Per-buffer in-memory budget before spilling (0 = never spill)
+            audio_horizon_bytes: Newest audio per buffer that always stays in memory
+            spill_dir: Directory for spilled audio segments
+            archiver: Archives each call when it is closed (None = no archive)
+            ended_log_size: Most recent session ends remembered for delta readers
+        """
+        self._shards: List[Dict[str, Session]] = [{} for _ in range(num_shards)]
+        self._shard_locks = [threading.Lock() for _ in range(num_shards)]
         self.max_sessions = max_sessions
         self.timeout_seconds = timeout_seconds
+        self.closed_grace_seconds = closed_grace_seconds
+        self.reap_batch = reap_batch
+        self._expiry: List[Tuple[float, str]] = []
+        self._expiry_lock = threading.Lock()
+        self._ended: deque = deque(maxlen=ended_log_size)  # (version, session_id), guarded by _expiry_lock
+        self.stats = {"evicted_closed": 0, "evicted_timeout": 0, "reap_ticks": 0}
+        self.store_raw_audio = store_raw_audio
+        self.audio_memory_bytes = audio_memory_bytes
+        self.audio_horizon_bytes = audio_horizon_bytes
+        self.spill_dir = Path(spill_dir) if spill_dir else None
+        self.archiver = archiver
+        
+        # Segments left by a previous process belong to sessions that no longer exist
+        if self.spill_dir is not None and self.spill_dir.exists():
+            for stale in self.spill_dir.iterdir():
+                shutil.rmtree(stale, ignore_errors=True)
+    
+    def _shard(self, session_id: str) -> int:
+        return hash(session_id) % len(self._shards)
+    
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self._shards)
     
     def create_session(self, user_id: str = "demo_user") -> Session:
         """Create a new session"""
-        with self._lock:
-            # Clean up old sessions if at capacity
-            if len(self._sessions) >= self.max_sessions:
-                self._cleanup_old_sessions()
+        # At capacity, evict anything already due instead of waiting for the next tick
+        if len(self) >= self.max_sessions:
+            self.reap()
             
-            # Generate unique session ID
-            session_id = str(uuid.uuid4())
+        # Generate unique session ID
+        session_id = str(uuid.uuid4())
             
-            # Create session object
-            session = Session(
-                session_id=session_id,
-                user_id=user_id,
-                start_time=time.time(),
-            )
+        # Create session object
+        raw_audio, caller_audio = self.new_audio_buffers(session_id)
+        session = Session(
+            session_id=session_id,
+            user_id=user_id,
+            start_time=time.time(),
+            raw_audio=raw_audio,
+            caller_audio=caller_audio,
+        )
+        session.last_activity = session.start_time
             
-            # Store in sessions dict
-            self._sessions[session_id] = session
+        # Store in its shard
+        index = self._shard(session_id)
+        with self._shard_locks[index]:
+            self._shards[index][session_id] = session
+        self._schedule(session, session.last_activity + self.timeout_seconds)
             
-            return session
+        return session
+    
+    def new_audio_buffers(self, session_id: str, raw_start: int = 0, caller_start: int = 0) -> Tuple[AudioBuffer, AudioBuffer]:
+        """(raw, caller) buffers for a session, spilling under spill_dir/<session_id>"""
+        spill_dir = str(self.spill_dir / session_id) if self.spill_dir is not None else None
+        return (
+            # Raw audio is never analyzed, so none of it needs to stay in memory
+            AudioBuffer(spill_dir, "raw", self.audio_memory_bytes, 0, start_bytes=raw_start),
+            AudioBuffer(spill_dir, "caller", self.audio_memory_bytes, self.audio_horizon_bytes, start_bytes=caller_start),
+        )
+    
+    def restore_session(self, session: Session) -> None:
+        """Re-insert a session rebuilt from a snapshot, keeping its expiry (extended again by activity)"""
+        index = self._shard(session.session_id)
+        with self._shard_locks[index]:
+            self._shards[index][session.session_id] = session
+        self._schedule(session, session.expires_at)
+    
+    def sessions(self) -> List[Session]:
+        """All sessions (a point-in-time list, safe to iterate from any thread)"""
+        return [session for shard in self._shards for session in list(shard.values())]
     
     def get_session(self, session_id: str) -> Optional[Session]:
-        """Get session by ID (thread-safe)"""
-        with self._lock:
-            return self._sessions.get(session_id)
+        """Get session by ID (lock-free)"""
+        return self._shards[self._shard(session_id)].get(session_id)
     
     def update_elapsed_time(self, session_id: str) -> None:
-        """Update elapsed_time = current_time - start_time"""
-        with self._lock:
-            session = self._sessions.get(session_id)
-            if session:
-                session.elapsed_time = time.time() - session.start_time
+        """Update elapsed_time = current_time - start_time (the websocket loop calls this every tick)"""
+        session = self.get_session(session_id)
+        if session:
+            session.last_activity = time.time()
+            session.elapsed_time = session.last_activity - session.start_time
     
     def append_raw_audio(self, session_id: str, audio_chunk: bytes) -> None:
-        """Append audio chunk to raw_audio buffer"""
-        with self._lock:
-            session = self._sessions.get(session_id)
-            if session:
-                session.raw_audio.append(audio_chunk)
+        """Append audio chunk to raw_audio buffer (no-op when raw audio storage is off)"""
+        if not self.store_raw_audio:
+            return
+        session = self.get_session(session_id)
+        if session:
+            session.last_activity = time.time()
+            session.raw_audio.append(audio_chunk)
     
     def append_caller_audio(self, session_id: str, audio_chunk: bytes) -> None:
         """Append audio chunk to caller_audio buffer (only during caller windows)"""
-        with self._lock:
-            session = self._sessions.get(session_id)
-            if session:
-                session.caller_audio.append(audio_chunk)
+        session = self.get_session(session_id)
+        if session:
+            session.last_activity = time.time()
+            session.caller_audio.append(audio_chunk)
     
     def append_match_score(self, session_id: str, score: float) -> None:
-        """Append voice match score to list"""
-        with self._lock:
-            session = self._sessions.get(session_id)
-            if session:
-                session.match_scores.append(score)
-    
-    def append_fake_score(self, session_id: str, score: float) -> None:
-        """Append deepfake probability score to list"""
-        with self._lock:
-            session = self._sessions.get(session_id)
-            if session:
-                session.fake_scores.append(score)
-    
-    def append_se_result(self, session_id: str, result: dict) -> None:
-        """Append social engineering result to list"""
-        with self._lock:
-            session = self._sessions.get(session_id)
-            if session:
-                session.se_results.append(result)
+        """Add voice match score to the session's risk aggregate"""
+        session = self.get_session(session_id)
+        if session:
+            with session.lock:
+                session.risk.add_match(score)
+    
+    def append_fake_score(
+        self,
+        session_id: str,
+        score: Optional[float],
+        audio_range: Optional[Tuple[float, float]] = None,
+    ) -> bool:
+        """
+        Add deepfake probability score (None when detection was unavailable).
+        
+        Results covering audio that ends no later than the newest stored
+        result are stale (arrived out of order) and are dropped.
+        
+        Returns:
+            True if the score was stored
+        """
+        session = self.get_session(session_id)
+        if not session:
+            return False
+        with session.lock:
+            return session.risk.add_fake(score, audio_range)
+    
+    def append_se_result(
+        self,
+        session_id: str,
+        result: dict,
+        audio_range: Optional[Tuple[float, float]] = None,
+    ) -> bool:
+        """
+        Record social engineering result, stamped with the audio range it covers.
+        
+        Returns:
+            True if the result was stored (False if stale)
+        """
+        session = self.get_session(session_id)
+        if not session:
+            return False
+        with session.lock:
+            return session.risk.add_se(result, audio_range)
+    
+    def risk_snapshots(
+        self, since_version: int = 0,
+    ) -> Tuple[int, List[Tuple[Session, int, RiskStatus, bytes]], List[str]]:
+        """
+        Pre-encoded risk of every active session, in one pass over the table.
+        
+        Args:
+            since_version: Only return sessions whose risk changed after this version
+        
+        Returns:
+            (newest version seen, [(session, version, status, RiskResponse JSON), ...] in creation
+            order, ids of sessions that ended after since_version (empty for a full read))
+        """
+        newest = since_version
+        ended = []
+        if since_version:
+            with self._expiry_lock:
+                ended_log = list(self._ended)
+            for version, session_id in ended_log:
+                if version > since_version:
+                    newest = max(newest, version)
+                    session = self.get_session(session_id)
+                    # Reopened since it ended: it is back in the rows instead
+                    if session is None or not session.active:
+                        ended.append(session_id)
+        rows = []
+        for shard in self._shards:
+            for session in list(shard.values()):
+                if not session.active:
+                    continue
+                with session.lock:
+                    version, body = session.risk.snapshot
+                    status = session.risk.status
+                if version > newest:
+                    newest = version
+                if version > since_version:
+                    rows.append((session, version, status, body))
+        rows.sort(key=lambda row: (row[0].start_time, row[0].session_id))
+        return newest, rows, list(dict.fromkeys(ended))
+    
+    def _record_ended(self, session_id: str) -> None:
+        """Log a session leaving the active set under a new version (for delta readers)"""
+        with self._expiry_lock:
+            self._ended.append((version_high_water(), session_id))
     
     def close_session(self, session_id: str) -> None:
-        """Mark session as inactive"""
-        with self._lock:
-            session = self._sessions.get(session_id)
-            if session:
-                session.active = False
+        """Mark session as inactive (archived, then evicted after the grace period)"""
+        session = self.get_session(session_id)
+        if session:
+            was_active, session.active = session.active, False
+            if was_active:
+                self._record_ended(session_id)
+                if self.archiver is not None:
+                    self.archiver.submit(session)
+            self._schedule(session, time.time() + self.closed_grace_seconds)
+    
+    def reopen_session(self, session_id: str) -> None:
+        """Mark a closed (not yet evicted) session active again when its client reconnects"""
+        session = self.get_session(session_id)
+        if session and not session.active:
+            session.active = True
+            session.last_activity = time.time()
+            # New version, so delta readers that removed it at close pick it up again
+            with session.lock:
+                session.risk.touch()
+            self._schedule(session, session.last_activity + self.timeout_seconds)
     
     def delete_session(self, session_id: str) -> None:
         """Remove session from manager"""
-        with self._lock:
-            self._sessions.pop(session_id, None)
+        index = self._shard(session_id)
+        with self._shard_locks[index]:
+            session = self._shards[index].pop(session_id, None)
+        if session:
+            if session.active:
+                self._record_ended(session_id)
+            session.release_audio()
+    
+    def _schedule(self, session: Session, expires_at: float) -> None:
+        with self._expiry_lock:
+            session.expires_at = expires_at
+            heapq.heappush(self._expiry, (expires_at, session.session_id))
+        
+    def deadline(self, session: Session) -> float:
+        """When the session would actually be evicted, counting activity since its heap entry"""
+        if session.active:
+            return max(session.expires_at, session.last_activity + self.timeout_seconds)
+        return session.expires_at
     
-    def _cleanup_old_sessions(self) -> None:
-        """Remove oldest inactive or timed-out sessions"""
-        current_time = time.time()
-        sessions_to_remove = []
+    def reap(self, now: Optional[float] = None) -> int:
+        """
+        Evict closed and idle sessions that are due.
         
-        for sid, session in self._sessions.items():
-            age = current_time - session.start_time
-            if not session.active or age > self.timeout_seconds:
-                sessions_to_remove.append(sid)
+        Pops at most reap_batch heap entries, so one call does bounded work
+        however many sessions exist; anything left is picked up next tick.
         
-        for sid in sessions_to_remove:
-            del self._sessions[sid]
+        Returns:
+            Number of sessions evicted
+        """
+        now = time.time() if now is None else now
+        due = []
+        with self._expiry_lock:
+            for _ in range(self.reap_batch):
+                if not self._expiry or self._expiry[0][0] > now:
+                    break
+                expires_at, session_id = heapq.heappop(self._expiry)
+                session = self.get_session(session_id)
+                # Deleted already, or rescheduled (closed) since this entry was pushed
+                if session is None or session.expires_at != expires_at:
+                    continue
+                # Still streaming: push the entry forward to the new idle deadline
+                idle_deadline = session.last_activity + self.timeout_seconds
+                if session.active and idle_deadline > now:
+                    session.expires_at = idle_deadline
+                    heapq.heappush(self._expiry, (idle_deadline, session_id))
+                    continue
+                due.append(session)
+            self.stats["reap_ticks"] += 1
+        
+        for session in due:
+            index = self._shard(session.session_id)
+            with self._shard_locks[index]:
+                self._shards[index].pop(session.session_id, None)
+            session.release_audio()
+            if session.active:
+                # Closed sessions were already logged as ended when they closed
+                self._record_ended(session.session_id)
+            self.stats["evicted_timeout" if session.active else "evicted_closed"] += 1
+        return len(due)
+    
+    async def run_reaper(self, interval_seconds: float = 1.0) -> None:
+        """Background loop: reap due sessions every interval_seconds"""
+        while True:
+            try:
+                evicted = self.reap()
+                if evicted:
+                    print(f"🧹 [SessionManager] Evicted {evicted} expired session(s), {len(self)} remaining")
+            except Exception as e:
+                print(f"✗ [SessionManager] Reaper tick failed: {e}")
+            await asyncio.sleep(interval_seconds)
+    
+    def get_stats(self) -> dict:
+        """Session count, eviction counters and archive progress"""
+        with self._expiry_lock:
+            pending = len(self._expiry)
+        stats = {"sessions": len(self), "expiry_heap": pending, **self.stats}
+        if self.archiver is not None:
+            stats["archive"] = self.archiver.get_stats()
+        return stats
 
 
 # Global instance - singleton pattern
@@ -136,5 +398,20 @@ def get_session_manager() -> SessionManager:
     """Get or create global session manager instance"""
     global _session_manager
     if _session_manager is None:
-        _session_manager = SessionManager()
+        settings = get_settings()
+        _session_manager = SessionManager(
+            max_sessions=settings.max_sessions,
+            timeout_seconds=settings.session_timeout_seconds,
+            closed_grace_seconds=settings.session_closed_grace_seconds,
+            reap_batch=settings.session_reap_batch,
+            store_raw_audio=settings.store_raw_audio,
+            audio_memory_bytes=settings.session_audio_memory_bytes,
+            audio_horizon_bytes=int(settings.session_audio_horizon_seconds * settings.sample_rate * 2),
+            spill_dir=settings.session_spill_dir,
+            archiver=CallArchiver(
+                settings.call_archive_dir,
+                sample_rate=settings.sample_rate,
+                workers=settings.call_archive_workers,
+            ) if settings.call_archive_enabled else None,
+        )
     return _session_manager
@@ -0,0 +1,281 @@
+"""Session Snapshots - Incremental on-disk session snapshots, restored at startup"""
+import asyncio
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from ..config import get_settings
+from .risk_aggregator import SE_HISTORY_LIMIT, RiskAggregator, advance_versions, version_high_water
+from .session_manager import Session, SessionManager
+
+SNAPSHOT_VERSION = 1
+
+
+class SessionSnapshotter:
+    """
+    Keeps <snapshot_dir>/<session_id>.json, .pcm and .history in step with live sessions.
+    
+    Each tick only touches sessions that changed since the previous one
+    (new risk version, new caller audio, closed): the small JSON state file is
+    rewritten atomically and only the newly received caller audio is appended
+    to the .pcm file. Once the .pcm file grows past twice tail_bytes it is
+    rewritten down to the last tail_bytes, which is all the next analysis
+    window needs after a restart. The per-window risk history (for the call
+    archive) is handled the same way: new entries are appended to the
+    .history file (one JSON record per line), which is rewritten from the
+    retained history once it holds twice as many records, so a tick costs
+    the same early and late in a call. Snapshots of evicted sessions are deleted.
+    
+    Each tick that writes anything also records the risk version high-water
+    mark in versions.meta; restore() moves the version counter past it, so
+    versions and ETags keep increasing across restarts.
+    
+    snapshot() is serialized by a lock: cancelling the background loop does
+    not stop a tick already running in its worker thread, and the final
+    snapshot at shutdown must not interleave with it (both would append the
+    same audio to a .pcm file).
+    """
+    
+    def __init__(self, snapshot_dir: str, tail_bytes: int):
+        """
+        Args:
+            snapshot_dir: Directory for snapshot files
+            tail_bytes: Caller audio kept per session (the analysis horizon)
+        """
+        self.snapshot_dir = Path(snapshot_dir)
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        self.tail_bytes = tail_bytes
+        self._marks: Dict[str, tuple] = {}  # session_id -> change marker at the last write
+        self._audio: Dict[str, Tuple[int, int]] = {}  # session_id -> (caller offset of .pcm byte 0, .pcm size)
+        self._history: Dict[str, Tuple[dict, int]] = {}  # session_id -> (history cursor, .history records)
+        self.stats = {"ticks": 0, "written": 0, "removed": 0, "restored": 0, "last_tick_ms": 0.0}
+        self._lock = threading.Lock()  # One snapshot() at a time (_marks/_audio/_history and file appends)
+    
+    def _paths(self, session_id: str) -> Tuple[Path, Path, Path]:
+        base = self.snapshot_dir / session_id
+        return base.with_suffix(".json"), base.with_suffix(".pcm"), base.with_suffix(".history")
+    
+    def snapshot(self, manager: SessionManager) -> int:
+        """
+        Write every session that changed since the previous call (blocking file I/O).
+        
+        Returns:
+            Number of sessions written
+        """
+        with self._lock:
+            return self._snapshot(manager)
+    
+    def _snapshot(self, manager: SessionManager) -> int:
+        start = time.perf_counter()
+        written = 0
+        seen = set()
+        for session in manager.sessions():
+            seen.add(session.session_id)
+            expires_at = manager.deadline(session)
+            mark = (session.risk.version, session.caller_audio.num_bytes, session.active, expires_at)
+            if self._marks.get(session.session_id) == mark:
+                continue
+            try:
+                self._write(session, expires_at)
+            except OSError as e:
+                print(f"✗ [SessionSnapshots] Could not snapshot {session.session_id[:8]}: {e}")
+                continue
+            self._marks[session.session_id] = mark
+            written += 1
+        
+        removed = set(self._marks) - seen
+        for session_id in removed:
+            self._remove(session_id)
+        if written or removed:
+            self._write_versions()
+        
+        self.stats["ticks"] += 1
+        self.stats["written"] += written
+        self.stats["last_tick_ms"] = round((time.perf_counter() - start) * 1000, 2)
+        return written
+    
+    def _write(self, session: Session, expires_at: float) -> None:
+        json_path, pcm_path, history_path = self._paths(session.session_id)
+        cursor, history_size = self._history.get(session.session_id, (None, 0))
+        if history_size > 2 * (2 * session.risk.history_limit + SE_HISTORY_LIMIT):
+            cursor = None  # Rewrite from the retained history
+        with session.lock:
+            risk_state = session.risk.to_state()
+            records, next_cursor = session.risk.history_records(cursor)
+        
+        # Caller audio first, so the state file never claims audio the .pcm file lacks
+        caller = session.caller_audio
+        end = caller.num_bytes
+        audio_start, audio_size = self._audio.get(session.session_id, (None, 0))
+        if audio_start is None or end - audio_start > 2 * self.tail_bytes:
+            audio_start = max(end - self.tail_bytes, caller.start_bytes)
+            tmp_path = pcm_path.with_name(f".{pcm_path.name}.tmp")
+            with open(tmp_path, "wb") as f:
+                for piece in caller.iter_range(audio_start, end):
+                    f.write(piece)
+            os.replace(tmp_path, pcm_path)
+        elif end > audio_start + audio_size:
+            with open(pcm_path, "ab") as f:
+                for piece in caller.iter_range(audio_start + audio_size, end):
+                    f.write(piece)
+        self._audio[session.session_id] = (audio_start, end - audio_start)
+        
+        # History: append new records, or rewrite the file from the retained history
+        lines = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        if cursor is None:
+            tmp_path = history_path.with_name(f".{history_path.name}.tmp")
+            with open(tmp_path, "w") as f:
+                f.write(lines)
+            os.replace(tmp_path, history_path)
+            history_size = 0
+        elif lines:
+            with open(history_path, "a") as f:
+                f.write(lines)
+        self._history[session.session_id] = (next_cursor, history_size + len(records))
+        
+        state = {
+            "v": SNAPSHOT_VERSION,
+            "session_id": session.session_id,
+            "user_id": session.user_id,
+            "start_time": session.start_time,
+            "elapsed_time": session.elapsed_time,
+            "active": session.active,
+            "expires_at": expires_at,
+            "risk": risk_state,
+            "caller_bytes": end,
+            "audio_start": audio_start,
+            "raw_bytes": session.raw_audio.num_bytes,
+        }
+        tmp_path = json_path.with_name(f".{json_path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(state, f, separators=(",", ":"))
+        os.replace(tmp_path, json_path)
+    
+    def _write_versions(self) -> None:
+        path = self.snapshot_dir / "versions.meta"
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"v": SNAPSHOT_VERSION, "high_water": version_high_water()}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"✗ [SessionSnapshots] Could not record version high-water mark: {e}")
+    
+    def _remove(self, session_id: str) -> None:
+        for path in self._paths(session_id):
+            path.unlink(missing_ok=True)
+        self._marks.pop(session_id, None)
+        self._audio.pop(session_id, None)
+        self._history.pop(session_id, None)
+        self.stats["removed"] += 1
+    
+    def restore(self, manager: SessionManager) -> int:
+        """
+        Rebuild unexpired sessions from disk into the manager (called at startup).
+        
+        Restored sessions keep their id, scores and expiry, and their caller
+        buffer holds the snapshotted tail at its original offset, so a client
+        can reconnect to /ws/audio with the same session_id.
+        
+        Returns:
+            Number of sessions restored
+        """
+        # Versions handed out before the restart must never come round again
+        try:
+            with open(self.snapshot_dir / "versions.meta", "r") as f:
+                advance_versions(int(json.load(f)["high_water"]))
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"✗ [SessionSnapshots] Unreadable versions.meta: {e}")
+        
+        now = time.time()
+        restored = 0
+        for json_path in self.snapshot_dir.glob("*.json"):
+            paths = self._paths(json_path.stem)
+            _, pcm_path, history_path = paths
+            try:
+                with open(json_path, "r") as f:
+                    state = json.load(f)
+                if state.get("v") != SNAPSHOT_VERSION or state["expires_at"] <= now:
+                    # Expired or written by an incompatible version: nothing to resume
+                    for path in paths:
+                        path.unlink(missing_ok=True)
+                    continue
+                tail = pcm_path.read_bytes() if pcm_path.exists() else b""
+                tail = tail[:max(state["caller_bytes"] - state["audio_start"], 0)]
+                
+                raw_audio, caller_audio = manager.new_audio_buffers(
+                    state["session_id"],
+                    raw_start=state["raw_bytes"],
+                    caller_start=state["caller_bytes"] - len(tail),
+                )
+                if tail:
+                    caller_audio.append(tail)
+                risk = RiskAggregator.from_state(state["risk"])
+                risk.load_history(self._read_history(history_path))
+                session = Session(
+                    session_id=state["session_id"],
+                    user_id=state["user_id"],
+                    start_time=state["start_time"],
+                    raw_audio=raw_audio,
+                    caller_audio=caller_audio,
+                    risk=risk,
+                    elapsed_time=state["elapsed_time"],
+                    active=state["active"],
+                    expires_at=state["expires_at"],
+                )
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                print(f"✗ [SessionSnapshots] Skipping unreadable {json_path.name}: {e}")
+                for path in paths:
+                    path.unlink(missing_ok=True)
+                continue
+            manager.restore_session(session)
+            restored += 1
+        
+        self.stats["restored"] += restored
+        if restored:
+            print(f"✓ [SessionSnapshots] Restored {restored} session(s)")
+        return restored
+    
+    @staticmethod
+    def _read_history(path: Path) -> list:
+        """Records of a .history file (stops at a line cut short by a crash mid-append)"""
+        if not path.exists():
+            return []
+        records = []
+        with open(path, "r") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+        return records
+    
+    async def run(self, manager: SessionManager, interval_seconds: float) -> None:
+        """Background loop: snapshot changed sessions every interval_seconds (I/O off the event loop)"""
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await asyncio.to_thread(self.snapshot, manager)
+            except Exception as e:
+                print(f"✗ [SessionSnapshots] Snapshot tick failed: {e}")
+
+
+# Global instance - singleton pattern
+_snapshotter: Optional[SessionSnapshotter] = None
+
+
+def get_session_snapshotter() -> Optional[SessionSnapshotter]:
+    """Get or create the global snapshotter (None when snapshots are disabled)"""
+    global _snapshotter
+    settings = get_settings()
+    if _snapshotter is None and settings.session_snapshot_enabled:
+        _snapshotter = SessionSnapshotter(
+            settings.session_snapshot_dir,
+            tail_bytes=int(settings.session_audio_horizon_seconds * settings.sample_rate * 2),
+        )
+    return _snapshotter
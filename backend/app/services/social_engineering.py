@@ -1,79 +1,313 @@
+import asyncio
 import json
 import io
-from fishaudio import FishAudio
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+from fishaudio import AsyncFishAudio
 import google.generativeai as genai
 from ..config import get_settings
+from .tactic_filter import get_tactic_filter
+from .analysis_cache import AnalysisCache
+from .transcriber import build_transcriber
+from .llm_batcher import LLMBatcher, parse_json_response
+
+
+@dataclass
+class ConversationState:
+    """Per-session running transcript and rolling context for delta-only analysis"""
+    transcript: list[str] = field(default_factory=list)  # Newest ASR deltas, in order (bounded)
+    transcript_chars: int = 0
+    summary: str = ""  # Compact LLM-maintained summary of everything already analyzed
+    pending: str = ""  # Transcript text not yet sent to the LLM
+    skipped: int = 0  # Consecutive deltas the local pre-filter kept away from the LLM
+
 
 class SocialEngineeringDetector:
     def __init__(self):
         self.settings = get_settings()
-        # Fish Audio for speech-to-text transcription
-        self.fish_client = FishAudio(api_key=self.settings.fish_audio_api_key)
+        # Fish Audio for speech-to-text transcription (native async client - never blocks the loop)
+        self.fish_client = AsyncFishAudio(api_key=self.settings.fish_audio_api_key)
         
-        # Configure Gemini for analysis
-        genai.configure(api_key=self.settings.gemini_api_key)
-        self.gemini_model = genai.GenerativeModel('gemini-2.5-flash')
+        # Speech-to-text backend: Fish Audio ASR or an offline local recognizer
+        self.transcriber = build_transcriber(self.settings, self.fish_client)
+        
+        # Global cap on concurrent ASR+LLM pipelines across all sessions
+        self._slots = asyncio.Semaphore(self.settings.se_max_concurrency)
+        
+        # Running transcript + rolling summary per session
+        self._conversations: Dict[str, ConversationState] = {}
         
-        self.system_prompt = """You are a real-time social engineering detection system. 
-Analyze the following text from a phone call. 
+        # Local tactic matcher - benign deltas never reach the LLM
+        self.tactic_filter = get_tactic_filter() if self.settings.se_prefilter_enabled else None
+        self.stats = {"escalated": 0, "prefiltered": 0}
+        
+        # Verdicts for recurring text ("thank you", common call openings) skip the Gemini round trip
+        self.cache: Optional[AnalysisCache] = None
+        if self.settings.se_cache_max_entries > 0:
+            self.cache = AnalysisCache(
+                max_entries=self.settings.se_cache_max_entries,
+                ttl_seconds=self.settings.se_cache_ttl_seconds,
+                persist_path=self.settings.se_cache_path,
+            )
+        
+        tactics = """Use the summary as context so tactics spread across several turns are recognized.
 Identify if the speaker is using any social engineering tactics such as:
 - Urgency (rushing the victim)
 - Fear/Intimidation (threats of legal action, account closure)
 - Authority (pretending to be police, bank official)
 - Secrecy (telling victim not to tell anyone)
-- Credential Harvesting (asking for OTP, passwords, SSN)
-
-Return a JSON object with:
-- risk_score: 0 to 100 (integer)
+- Credential Harvesting (asking for OTP, passwords, SSN)"""
+        fields = """- risk_score: 0 to 100 (integer)
 - risk_level: "SAFE", "LOW", "MEDIUM", "HIGH"
-- flagged_phrases: list of strings (specific quotes that are suspicious)
+- flagged_phrases: list of strings (specific quotes from the new text that are suspicious)
 - reason: brief explanation
+- context_summary: updated summary of the whole conversation so far (earlier summary + new text),
+  at most 60 words, keeping any claims, requests or tactics that matter for later turns"""
+        
+        self.system_prompt = f"""You are a real-time social engineering detection system. 
+You monitor a phone call incrementally. Each request contains:
+- "Earlier conversation summary": a compact summary of what was said before (may be empty)
+- "New transcript text": only the speech transcribed since the last request
 
-If the text is harmless or just normal conversation, return risk_score 0 and risk_level "SAFE".
+{tactics}
+
+Return a JSON object with:
+{fields}
+
+If the conversation is harmless or just normal conversation, return risk_score 0 and risk_level "SAFE".
 Output ONLY valid JSON, no markdown formatting."""
+        
+        # Batched requests carry several calls at once and need the multi-item reply shape
+        self.batch_system_prompt = f"""You are a real-time social engineering detection system. 
+You monitor several independent phone calls incrementally. Each request lists items, each with:
+- "id": the item id to echo back
+- "earlier_conversation_summary": a compact summary of what was said before in that call (may be empty)
+- "new_transcript_text": only the speech transcribed in that call since its last request
+
+Analyze every item on its own; never mix context between items.
+{tactics}
+
+Return a JSON object {{"results": [...]}} with one object per item, each with:
+- id: the item's id
+{fields}
 
-    async def detect(self, audio_bytes: bytes) -> dict:
+For a harmless item, return risk_score 0 and risk_level "SAFE".
+Output ONLY valid JSON, no markdown formatting."""
+
+        # Configure Gemini for analysis; the fixed instructions live in system_instruction
+        # so each request carries only the summary and the new text
+        genai.configure(api_key=self.settings.gemini_api_key)
+        self.gemini_model = genai.GenerativeModel(
+            'gemini-2.5-flash',
+            system_instruction=self.system_prompt,
+        )
+        self.gemini_batch_model = genai.GenerativeModel(
+            'gemini-2.5-flash',
+            system_instruction=self.batch_system_prompt,
+        )
+    
+        # Cross-session batching of Gemini requests (window 0 = one request per analysis)
+        self.batcher: Optional[LLMBatcher] = None
+        if self.settings.se_batch_window_ms > 0:
+            self.batcher = LLMBatcher(
+                generate=self._generate,
+                generate_batch=self._generate_batch,
+                build_prompt=self.build_prompt,
+                window_seconds=self.settings.se_batch_window_ms / 1000,
+                max_items=self.settings.se_batch_max_items,
+                timeout_seconds=self.settings.se_llm_timeout_seconds,
+            )
+    
+    def get_transcript(self, session_id: str) -> str:
+        """Recent running transcript for a session (the newest se_transcript_max_chars)"""
+        state = self._conversations.get(session_id)
+        return " ".join(state.transcript) if state else ""
+    
+    def end_session(self, session_id: str) -> None:
+        """Drop conversation state for a finished session"""
+        self._conversations.pop(session_id, None)
+        self.transcriber.end_session(session_id)
+    
+    @property
+    def streaming_asr(self) -> bool:
+        """True when the transcriber decodes caller audio as it arrives (no upload payload needed)"""
+        return self.transcriber.streaming
+    
+    def feed_audio(self, session_id: str, pcm_bytes: bytes, start_seconds: float = 0.0) -> None:
+        """Hand caller PCM (starting at caller-audio offset start_seconds) to a streaming transcriber"""
+        if self.transcriber.streaming:
+            self.transcriber.feed(session_id, pcm_bytes, start_seconds)
+    
+    def get_stats(self) -> dict:
+        """Pre-filter and cache counters"""
+        return {
+            **self.stats,
+            "cache": self.cache.snapshot_stats() if self.cache is not None else None,
+            "batching": dict(self.batcher.stats) if self.batcher is not None else None,
+        }
+    
+    def save_cache(self) -> None:
+        """Persist the analysis cache (no-op without se_cache_path)"""
+        if self.cache is not None:
+            self.cache.save()
+    
+    def build_prompt(self, summary: str, delta: str) -> str:
+        """Per-request prompt: bounded rolling summary plus only the new text"""
+        return (
+            f"Earlier conversation summary:\n{summary or '(none)'}\n\n"
+            f"New transcript text:\n{delta}"
+        )
+    
+    async def _generate(self, prompt: str, model=None) -> str:
+        """One Gemini request; returns the raw reply text"""
+        response = await asyncio.wait_for(
+            (model or self.gemini_model).generate_content_async(
+                prompt,
+                generation_config=genai.types.GenerationConfig(
+                    temperature=0.1,
+                )
+            ),
+            timeout=self.settings.se_llm_timeout_seconds,
+        )
+        return response.text
+    
+    async def _generate_batch(self, prompt: str) -> str:
+        """One multi-item Gemini request, answered in the {"results": [...]} shape"""
+        return await self._generate(prompt, self.gemini_batch_model)
+    
+    async def detect(
+        self,
+        audio_bytes: bytes,
+        session_id: Optional[str] = None,
+        audio_end: Optional[float] = None,
+    ) -> dict:
+        """
+        Transcribe and analyze one window of caller audio.
+        
+        Args:
+            audio_bytes: Encoded window audio (unused by streaming transcribers)
+            session_id: Session the audio belongs to (enables delta analysis)
+            audio_end: Caller-audio offset (s) where the window ends, for streaming transcribers
+        
+        Returns:
+            Analysis dict, or None if skipped / nothing new to report
+        """
+        # Shed load instead of queueing unboundedly when the vendors slow down
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.settings.se_queue_timeout_seconds)
+        except asyncio.TimeoutError:
+            print("⏳ [SocialEngineering] All analysis slots busy, skipping this check")
+            return None
+        
+        try:
+            return await self._analyze(audio_bytes, session_id, audio_end)
+        finally:
+            self._slots.release()
+    
+    async def _transcribe(self, audio_bytes: bytes, session_id: Optional[str], audio_end: Optional[float]) -> str:
+        if self.transcriber.streaming and session_id is not None and audio_end is not None:
+            # Most chunks are already decoded; only the window tail is left
+            return await self.transcriber.finish(session_id, audio_end)
+        return await self.transcriber.transcribe(audio_bytes)
+    
+    async def _analyze(self, audio_bytes: bytes, session_id: Optional[str], audio_end: Optional[float]) -> dict:
+        # Without a session there is no earlier context to carry
+        if session_id is None:
+            state = ConversationState()
+        else:
+            state = self._conversations.setdefault(session_id, ConversationState())
+        
         try:
-            # 1. Transcribe using Fish Audio ASR
-            transcription = self.fish_client.asr.transcribe(
-                audio=audio_bytes,
-                language="en"  # Optional: specify language
+            # 1. Transcribe (Fish Audio ASR or local recognizer)
+            text = await asyncio.wait_for(
+                self._transcribe(audio_bytes, session_id, audio_end),
+                timeout=self.settings.se_asr_timeout_seconds,
             )
-            text = transcription.text
             
             if not text or len(text.strip()) < 5:
                 return None
 
-            # 2. Analyze text using Gemini
-            print(f"🔍 [SocialEngineering] Fish Audio transcribed: \"{text[:50]}...\"")
-            print(f"🔍 [SocialEngineering] Analyzing with Gemini...")
+            # Append the increment to the running transcript
+            delta = text.strip()
+            state.transcript.append(delta)
+            state.transcript_chars += len(delta) + 1
+            # Older text lives on in the rolling summary; keep only the newest deltas verbatim
+            while len(state.transcript) > 1 and state.transcript_chars > self.settings.se_transcript_max_chars:
+                state.transcript_chars -= len(state.transcript.pop(0)) + 1
+            state.pending = f"{state.pending} {delta}".strip()[-self.settings.se_max_delta_chars:]
+            print(f"🔍 [SocialEngineering] {self.transcriber.name} ASR transcribed: \"{text[:50]}...\"")
             
-            prompt = f"{self.system_prompt}\n\nTranscript to analyze:\n{text}"
+            # 2. Local pre-filter: only tactic vocabulary (or every Nth delta) escalates to the LLM
+            tactics = self.tactic_filter.tactics(delta) if self.tactic_filter else []
+            if self.tactic_filter and not tactics and state.skipped + 1 < self.settings.se_prefilter_every_n:
+                state.skipped += 1
+                self.stats["prefiltered"] += 1
+                print("⚡ [SocialEngineering] No tactic vocabulary, skipping LLM for this delta")
+                return None
+            self.stats["escalated"] += 1
             
-            response = self.gemini_model.generate_content(
-                prompt,
-                generation_config=genai.types.GenerationConfig(
-                    temperature=0.1,
+            # Identical (normalized) text was analyzed recently in the same context - reuse
+            # the verdict. The cached copy holds no summary from the session that produced
+            # it, so this session's own summary is extended with the text instead.
+            cached = self.cache.get(state.pending, state.summary) if self.cache is not None else None
+            if cached is not None:
+                cached["transcript"] = state.pending
+                cached["local_tactics"] = tactics
+                max_chars = self.settings.se_summary_max_chars
+                state.summary = f"{state.summary} {state.pending}".strip()[-max_chars:]
+                state.pending = ""
+                state.skipped = 0
+                print("⚡ [SocialEngineering] Cache hit, reusing previous Gemini verdict")
+                return cached
+            
+            # 3. Analyze only the new text, with the rolling summary as context
+            print(f"🔍 [SocialEngineering] Analyzing with Gemini (local tactics: {tactics or 'none'})...")
+            
+            if self.batcher is not None:
+                # Shares one Gemini request with other sessions analyzing at the same moment
+                analysis = await asyncio.wait_for(
+                    self.batcher.submit(state.summary, state.pending),
+                    timeout=self.settings.se_llm_timeout_seconds,
                 )
-            )
+            else:
+                prompt = self.build_prompt(state.summary, state.pending)
+                analysis = parse_json_response(await self._generate(prompt))
+            analysis["transcript"] = state.pending
+            analysis["local_tactics"] = tactics
+            
+            # Everything pending has now been analyzed
+            context = state.summary
+            state.pending = ""
+            state.skipped = 0
             
-            # Extract JSON from response
-            response_text = response.text.strip()
-            # Remove markdown code blocks if present
-            if response_text.startswith("```json"):
-                response_text = response_text[7:]
-            if response_text.startswith("```"):
-                response_text = response_text[3:]
-            if response_text.endswith("```"):
-                response_text = response_text[:-3]
-            response_text = response_text.strip()
+            # Keep the rolling summary bounded so prompts don't grow with call length
+            summary = str(analysis.pop("context_summary", "") or "")
+            if summary:
+                state.summary = summary[:self.settings.se_summary_max_chars]
             
-            analysis = json.loads(response_text)
-            analysis["transcript"] = text
+            if self.cache is not None:
+                self.cache.put(analysis["transcript"], {
+                    k: v for k, v in analysis.items() if k not in ("transcript", "local_tactics")
+                }, context)
             
             print(f"🤖 [SocialEngineering] Gemini Result: {json.dumps(analysis, indent=2)}")
             return analysis
             
+        except asyncio.TimeoutError:
+            print("Social Engineering Detection Error: vendor call timed out")
+            return None
         except Exception as e:
             print(f"Social Engineering Detection Error: {e}")
             return None
+
+
+# Global instance - singleton pattern
+_se_detector: Optional[SocialEngineeringDetector] = None
+
+
+def get_social_engineering_detector() -> SocialEngineeringDetector:
+    """Get or create global social engineering detector instance"""
+    global _se_detector
+    if _se_detector is None:
+        _se_detector = SocialEngineeringDetector()
+    return _se_detector
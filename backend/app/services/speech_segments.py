@@ -0,0 +1,172 @@
+"""Speech Segments - Energy-based speech detection and fixed-length segmentation for enrollment"""
+from dataclasses import dataclass
+from typing import List, Tuple
+
+import numpy as np
+
+
+@dataclass
+class SpeechSegment:
+    """One fixed-length stretch of detected speech"""
+    samples: np.ndarray  # float32 mono
+    start: float  # Seconds into the recording where the segment's first sample was
+    duration: float
+    snr_db: float  # Segment level above the recording's noise floor
+    clipped_ratio: float  # Fraction of samples at full scale
+    weight: float  # Contribution to the enrollment template (0-1]
+    
+    def quality(self) -> dict:
+        return {
+            "start": round(self.start, 2),
+            "duration": round(self.duration, 2),
+            "snr_db": round(self.snr_db, 1),
+            "clipped_ratio": round(self.clipped_ratio, 4),
+            "weight": round(self.weight, 3),
+        }
+
+
+def _runs(mask: np.ndarray) -> List[Tuple[int, int]]:
+    """[start, end) index pairs of the True runs in a boolean array"""
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def detect_speech(
+    samples: np.ndarray,
+    sample_rate: int = 16000,
+    frame_seconds: float = 0.03,
+    margin_db: float = 9.0,
+    min_level_db: float = -55.0,
+    hangover_seconds: float = 0.2,
+    min_speech_seconds: float = 0.1,
+    clip_level: float = 0.99,
+    max_clipped_ratio: float = 0.005,
+    clip_bridge_seconds: float = 0.25,
+) -> Tuple[np.ndarray, np.ndarray, float, int]:
+    """
+    Classify fixed-length frames as speech, silence or clipped.
+    
+    A frame is speech when its level is margin_db above the recording's noise
+    floor (10th percentile frame level), capped so a recording that is
+    almost all speech still keeps its quieter syllables. A recording whose
+    frame levels barely vary (p90 - p10 below margin_db: steady noise, hum, a
+    constant tone) has no speech/silence contrast and yields no speech at
+    all, rather than being passed through whole. Pauses shorter than
+    hangover_seconds are bridged and blips shorter than min_speech_seconds
+    dropped. Frames with more than max_clipped_ratio samples at full scale
+    are marked clipped; gaps of up to clip_bridge_seconds between clipped
+    frames are marked clipped too, so the quieter troughs of an overdriven
+    stretch are not kept as clean speech.
+    
+    Args:
+        samples: float32 mono audio in [-1, 1]
+        sample_rate: Sample rate of samples
+    
+    Returns:
+        (speech mask, clipped mask, noise floor dBFS, frame length in samples)
+    """
+    frame = int(frame_seconds * sample_rate)
+    n_frames = len(samples) // frame
+    if n_frames == 0:
+        empty = np.zeros(0, dtype=bool)
+        return empty, empty, min_level_db, frame
+    
+    frames = samples[:n_frames * frame].reshape(n_frames, frame)
+    level_db = 10 * np.log10(np.mean(frames.astype(np.float64) ** 2, axis=1) + 1e-10)
+    noise_floor = float(np.percentile(level_db, 10))
+    loud = float(np.percentile(level_db, 90))
+    clipped = np.mean(np.abs(frames) >= clip_level, axis=1) > max_clipped_ratio
+    
+    # Bridge short gaps between clipped frames (the troughs of an overdriven stretch)
+    bridge = int(clip_bridge_seconds / frame_seconds)
+    for start, end in _runs(~clipped):
+        if 0 < start and end < n_frames and end - start <= bridge:
+            clipped[start:end] = True
+    if loud - noise_floor < margin_db:
+        # Stationary input: nothing stands out from the floor, so nothing counts as speech
+        return np.zeros(n_frames, dtype=bool), clipped, noise_floor, frame
+    
+    threshold = max(min(noise_floor + margin_db, loud - 2 * margin_db), min_level_db)
+    speech = level_db > threshold
+    
+    # Bridge short pauses, then drop isolated blips
+    hangover = int(hangover_seconds / frame_seconds)
+    silent_runs = _runs(~speech)
+    for start, end in silent_runs:
+        if 0 < start and end < n_frames and end - start <= hangover:
+            speech[start:end] = True
+    min_frames = max(int(min_speech_seconds / frame_seconds), 1)
+    for start, end in _runs(speech):
+        if end - start < min_frames:
+            speech[start:end] = False
+    
+    return speech, clipped, noise_floor, frame
+
+
+def select_speech_segments(
+    samples: np.ndarray,
+    sample_rate: int = 16000,
+    segment_seconds: float = 3.0,
+    min_segment_seconds: float = 1.5,
+    max_segments: int = 20,
+) -> Tuple[List[SpeechSegment], dict]:
+    """
+    Keep the clean speech of a recording and cut it into fixed-length segments.
+    
+    Silence and clipped frames are removed, the remaining speech is joined
+    and split every segment_seconds (a trailing piece shorter than
+    min_segment_seconds is dropped). Each segment is weighted by its SNR and
+    length; only the max_segments best are kept, which bounds the cost of
+    embedding them however long the recording is.
+    
+    Args:
+        samples: float32 mono audio in [-1, 1]
+        sample_rate: Sample rate of samples
+        segment_seconds: Segment length
+        min_segment_seconds: Shortest trailing segment worth embedding
+        max_segments: Most segments returned (highest weight first, then back in time order)
+    
+    Returns:
+        (segments in time order, summary with speech/silence/clipped seconds and noise floor)
+    """
+    speech, clipped, noise_floor, frame = detect_speech(samples, sample_rate)
+    keep = speech & ~clipped
+    
+    # Join the kept regions, remembering where each one started in the recording
+    regions = [(start * frame, end * frame) for start, end in _runs(keep)]
+    joined = np.concatenate([samples[a:b] for a, b in regions]) if regions else np.zeros(0, dtype=np.float32)
+    region_starts = np.cumsum([0] + [b - a for a, b in regions])
+    
+    segment_len = int(segment_seconds * sample_rate)
+    min_len = int(min_segment_seconds * sample_rate)
+    segments = []
+    for offset in range(0, len(joined), segment_len):
+        piece = joined[offset:offset + segment_len]
+        if len(piece) < min_len:
+            break
+        region = int(np.searchsorted(region_starts, offset, side="right")) - 1
+        level_db = 10 * np.log10(np.mean(piece.astype(np.float64) ** 2) + 1e-10)
+        snr_db = float(level_db - noise_floor)
+        segments.append(SpeechSegment(
+            samples=piece,
+            start=float(regions[region][0] + offset - region_starts[region]) / sample_rate,
+            duration=len(piece) / sample_rate,
+            snr_db=snr_db,
+            clipped_ratio=float(np.mean(np.abs(piece) >= 0.99)),
+            # 20 dB above the floor counts as clean; noisier segments still count a little
+            weight=float(np.clip(snr_db / 20.0, 0.25, 1.0) * len(piece) / segment_len),
+        ))
+    
+    if len(segments) > max_segments:
+        best = sorted(range(len(segments)), key=lambda i: segments[i].weight, reverse=True)[:max_segments]
+        segments = [segments[i] for i in sorted(best)]
+    
+    frame_seconds = frame / sample_rate
+    summary = {
+        "total_seconds": round(len(samples) / sample_rate, 2),
+        "speech_seconds": round(len(joined) / sample_rate, 2),
+        "silence_seconds": round(float(np.sum(~speech)) * frame_seconds, 2),
+        "clipped_seconds": round(float(np.sum(speech & clipped)) * frame_seconds, 2),
+        "noise_floor_db": round(noise_floor, 1),
+    }
+    return segments, summary
@@ -0,0 +1,163 @@
+"""Tactic Filter - Local multi-pattern pre-filter for social engineering vocabulary"""
+import re
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+# Tactic vocabulary mirroring the categories in SocialEngineeringDetector.system_prompt.
+# Phrases are normalized and stemmed at compile time, so "arrested"/"arresting" match "arrest".
+# Words a genuine customer uses in a banking call ("bank", "pin", "account number") only count
+# in request or claim context ("your pin", "this is your bank"), never on their own.
+TACTIC_VOCABULARY: Dict[str, List[str]] = {
+    "urgency": [
+        "urgent", "immediately", "right now", "right away", "as soon as possible", "asap",
+        "hurry", "quickly", "act now", "last chance", "deadline", "time sensitive",
+        "within the hour", "within 24 hours", "today only", "expire", "don't hang up",
+        "before it's too late", "stay on the line",
+    ],
+    "fear": [
+        "arrest", "warrant", "lawsuit", "legal action", "jail", "prison", "prosecute",
+        "deport", "suspend", "freeze", "frozen", "locked", "penalty", "compromised",
+        "hacked", "suspicious activity", "unauthorized", "fraudulent", "criminal",
+    ],
+    "authority": [
+        "police", "officer", "detective", "sheriff", "irs", "fbi", "federal", "government",
+        "court", "tax office", "back taxes", "fraud department", "security team",
+        "this is your bank", "calling from your bank", "calling on behalf of",
+        "social security administration", "tech support", "microsoft", "customs",
+        "federal agent", "special agent", "badge number",
+    ],
+    "secrecy": [
+        "don't tell", "do not tell", "don't mention", "do not mention", "don't discuss",
+        "keep this between", "keep it between", "confidential", "secret", "no one else",
+        "nobody else", "don't contact", "do not contact", "don't hang up",
+    ],
+    "credential_request": [
+        "your password", "your passcode", "your pin", "your login", "your username",
+        "your account number", "your routing number", "your card number",
+        "your social security number", "your ssn", "your date of birth", "your maiden name",
+        "otp", "o t p", "one time password", "one time code", "verification code",
+        "security code", "code we sent", "code we just sent", "read me the code",
+        "tell me the code", "read me the number", "cvv", "gift card", "wire transfer",
+        "bitcoin", "crypto", "remote access", "anydesk", "teamviewer",
+    ],
+}
+
+# Longest suffix first; stems never drop below MIN_STEM characters
+_SUFFIXES = ("ations", "ation", "ings", "ing", "edly", "ed", "ies", "ly", "s")
+MIN_STEM = 3
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def stem(token: str) -> str:
+    """Crude suffix-stripping stemmer - only has to be consistent between patterns and text"""
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= MIN_STEM:
+            token = token[:-len(suffix)] + ("y" if suffix == "ies" else "")
+            break
+    # "expire"/"expired" and "code"/"codes" share a stem
+    if token.endswith("e") and len(token) > MIN_STEM:
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, fold contractions ("don't" -> "dont") and stem"""
+    text = text.lower().replace("'", "").replace("’", "")
+    return [stem(token) for token in _TOKEN_RE.findall(text)]
+
+
+@dataclass(frozen=True)
+class TacticMatch:
+    tactic: str
+    phrase: str
+
+
+class TacticFilter:
+    """
+    Aho-Corasick automaton over stemmed word tokens.
+    
+    Every phrase of every tactic is compiled once; a scan is a single pass
+    over the delta's tokens regardless of vocabulary size.
+    """
+    
+    def __init__(self, vocabulary: Optional[Dict[str, Iterable[str]]] = None):
+        vocabulary = TACTIC_VOCABULARY if vocabulary is None else vocabulary
+        
+        # Node 0 is the root; goto[node][token] -> next node
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._output: List[List[TacticMatch]] = [[]]
+        
+        for tactic, phrases in vocabulary.items():
+            for phrase in phrases:
+                self._add(tokenize(phrase), TacticMatch(tactic, phrase))
+        self._build_failure_links()
+    
+    def _add(self, tokens: List[str], match: TacticMatch) -> None:
+        if not tokens:
+            return
+        node = 0
+        for token in tokens:
+            nxt = self._goto[node].get(token)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][token] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            node = nxt
+        self._output[node].append(match)
+    
+    def _build_failure_links(self) -> None:
+        # Breadth-first so each node's failure target is already final
+        queue = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            node = queue[head]
+            head += 1
+            for token, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(token, 0)
+                self._fail[child] = target if target != child else 0
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+    
+    def scan(self, text: str) -> List[TacticMatch]:
+        """
+        Find every tactic phrase in a transcript delta.
+        
+        Args:
+            text: Transcript text
+        
+        Returns:
+            Matches in order of occurrence (empty if the text looks benign)
+        """
+        goto, fail, output = self._goto, self._fail, self._output
+        matches: List[TacticMatch] = []
+        node = 0
+        for token in tokenize(text):
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            if output[node]:
+                matches.extend(output[node])
+        return matches
+    
+    def tactics(self, text: str) -> List[str]:
+        """Distinct tactics present in the text"""
+        return sorted({match.tactic for match in self.scan(text)})
+
+
+# Global instance - compiled once per process
+_tactic_filter: Optional[TacticFilter] = None
+
+
+def get_tactic_filter() -> TacticFilter:
+    """Get or create global tactic filter instance"""
+    global _tactic_filter
+    if _tactic_filter is None:
+        _tactic_filter = TacticFilter()
+    return _tactic_filter
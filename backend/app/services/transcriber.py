@@ -0,0 +1,249 @@
+"""Transcriber - Pluggable speech-to-text backends for the social engineering stage"""
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from .audio_codec import decode_audio
+
+
+class Transcriber:
+    """
+    Speech-to-text backend.
+    
+    Backends with streaming = True also accept raw caller PCM as it arrives
+    (feed) and decode it in chunks, so most of a window is already
+    transcribed when the analysis request for it starts (finish).
+    """
+    
+    name = "transcriber"
+    streaming = False
+    
+    async def transcribe(self, audio_bytes: bytes) -> str:
+        """
+        Transcribe an encoded payload (WAV/FLAC/Ogg).
+        
+        Returns:
+            Transcribed text (empty string if nothing was recognized)
+        """
+        raise NotImplementedError
+    
+    def feed(self, session_id: str, pcm_bytes: bytes, start_seconds: float = 0.0) -> None:
+        """
+        Append 16-bit mono PCM for a session (streaming backends only).
+        
+        Args:
+            session_id: Session the audio belongs to
+            pcm_bytes: 16-bit mono PCM
+            start_seconds: Caller-audio offset of the first sample (positions a new stream)
+        """
+    
+    async def finish(self, session_id: str, upto_seconds: float) -> str:
+        """Text for the session's audio fed since the previous finish, up to caller-audio offset upto_seconds"""
+        raise NotImplementedError
+    
+    def end_session(self, session_id: str) -> None:
+        """Drop any per-session decode state"""
+
+
+class FishTranscriber(Transcriber):
+    """Fish Audio hosted ASR"""
+    
+    name = "fish"
+    
+    def __init__(self, client, language: str = "en"):
+        self.client = client
+        self.language = language
+    
+    async def transcribe(self, audio_bytes: bytes) -> str:
+        transcription = await self.client.asr.transcribe(audio=audio_bytes, language=self.language)
+        return transcription.text or ""
+
+
+@dataclass
+class _DecodeStream:
+    """Per-session streaming decode state"""
+    buffer: np.ndarray = field(default_factory=lambda: np.zeros(0, dtype=np.float32))
+    buffer_start: int = 0  # Absolute sample offset of buffer[0]
+    chunks: List[tuple] = field(default_factory=list)  # (start sample, Future[str]) in audio order
+
+
+class LocalTranscriber(Transcriber):
+    """
+    Offline CPU recognizer (SpeechBrain encoder-decoder or torchaudio wav2vec2 CTC).
+    
+    Decoding runs in a dedicated worker pool. Fed audio is cut into ~chunk_seconds
+    pieces at the quietest point near each boundary (to avoid splitting words)
+    and every piece is decoded as soon as it is complete.
+    """
+    
+    name = "local"
+    streaming = True
+    
+    def __init__(
+        self,
+        engine: str = "speechbrain",
+        source: str = "speechbrain/asr-crdnn-rnnlm-librispeech",
+        weights_path: str = "",
+        sample_rate: int = 16000,
+        chunk_seconds: float = 4.0,
+        workers: int = 1,
+    ):
+        if engine not in ("speechbrain", "torchaudio"):
+            raise ValueError(f"Unknown local ASR engine: {engine}")
+        self.engine = engine
+        self.source = source
+        self.weights_path = weights_path
+        self.sample_rate = sample_rate
+        self.chunk_samples = int(chunk_seconds * sample_rate)
+        self.model = None  # Lazy loaded
+        self._model_lock = threading.Lock()
+        self._labels: Optional[List[str]] = None
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="local-asr")
+        self._streams: Dict[str, _DecodeStream] = {}
+    
+    def _load_model(self):
+        """Lazy load the recognizer (from local files when air-gapped)"""
+        if self.model is not None:
+            return
+        with self._model_lock:
+            if self.model is None:
+                self._load_model_locked()
+    
+    def _load_model_locked(self):
+        import torch
+        
+        if self.engine == "speechbrain":
+            # Same torchaudio compatibility patch as VoiceEmbedding
+            import torchaudio
+            if not hasattr(torchaudio, 'list_audio_backends'):
+                torchaudio.list_audio_backends = lambda: ["sox", "soundfile"]
+            
+            from speechbrain.inference.ASR import EncoderDecoderASR
+            
+            # source may be a local directory with hyperparams.yaml + checkpoints
+            print(f"Loading SpeechBrain ASR model: {self.source}...")
+            self.model = EncoderDecoderASR.from_hparams(
+                source=self.source,
+                savedir=f"pretrained_models/{self.source.rstrip('/').split('/')[-1]}",
+                run_opts={"device": "cpu"},
+            )
+        else:
+            import torchaudio
+            
+            bundle = torchaudio.pipelines.WAV2VEC2_ASR_BASE_960H
+            self._labels = list(bundle.get_labels())
+            print("Loading torchaudio wav2vec2 ASR model...")
+            if self.weights_path:
+                # Air-gapped: same architecture, weights from a local state dict
+                self.model = torchaudio.models.wav2vec2_base(aux_num_out=len(self._labels))
+                self.model.load_state_dict(torch.load(self.weights_path, map_location="cpu", weights_only=True))
+            else:
+                self.model = bundle.get_model()
+            self.model.eval()
+        print("✓ Local ASR model loaded")
+    
+    def _decode(self, samples: np.ndarray) -> str:
+        """Blocking decode of one chunk (runs in the worker pool)"""
+        import torch
+        
+        self._load_model()
+        if len(samples) < self.sample_rate // 10:
+            return ""
+        
+        waveform = torch.from_numpy(np.ascontiguousarray(samples, dtype=np.float32)).unsqueeze(0)
+        with torch.inference_mode():
+            if self.engine == "speechbrain":
+                words, _ = self.model.transcribe_batch(waveform, torch.tensor([1.0]))
+                text = words[0]
+            else:
+                # Greedy CTC: best label per frame, collapse repeats, drop blanks
+                emissions, _ = self.model(waveform)
+                indices = torch.unique_consecutive(emissions[0].argmax(dim=-1)).tolist()
+                text = "".join(self._labels[i] for i in indices if i != 0).replace("|", " ")
+        return text.strip().lower()
+    
+    def _split_point(self, buffer: np.ndarray) -> int:
+        """Cut position near chunk_samples at the quietest 20 ms frame of the last second"""
+        frame = self.sample_rate // 50
+        search_start = max(self.chunk_samples - self.sample_rate, 0)
+        region = buffer[search_start:self.chunk_samples]
+        n_frames = len(region) // frame
+        if n_frames == 0:
+            return self.chunk_samples
+        energy = (region[:n_frames * frame].reshape(n_frames, frame) ** 2).mean(axis=1)
+        return search_start + (int(energy.argmin()) + 1) * frame
+    
+    def _submit(self, stream: _DecodeStream, length: int) -> None:
+        piece, stream.buffer = stream.buffer[:length], stream.buffer[length:]
+        stream.chunks.append((stream.buffer_start, self._executor.submit(self._decode, piece)))
+        stream.buffer_start += length
+    
+    def feed(self, session_id: str, pcm_bytes: bytes, start_seconds: float = 0.0) -> None:
+        stream = self._streams.get(session_id)
+        if stream is None:
+            # Offsets are absolute caller-audio positions: a stream recreated after a
+            # reconnect or restore starts where the caller audio already is
+            stream = _DecodeStream(buffer_start=int(round(start_seconds * self.sample_rate)))
+            self._streams[session_id] = stream
+        samples = np.frombuffer(pcm_bytes, dtype=np.int16).astype(np.float32) / 32768.0
+        stream.buffer = np.concatenate([stream.buffer, samples])
+        while len(stream.buffer) >= self.chunk_samples:
+            self._submit(stream, self._split_point(stream.buffer))
+    
+    async def finish(self, session_id: str, upto_seconds: float) -> str:
+        stream = self._streams.get(session_id)
+        if stream is None:
+            return ""
+        
+        # Flush fed audio up to the window end; later audio stays for the next window
+        upto = int(upto_seconds * self.sample_rate)
+        length = min(upto - stream.buffer_start, len(stream.buffer))
+        if length > 0:
+            self._submit(stream, length)
+        
+        # A chunk that started inside the window belongs to it, even if it runs past the end
+        done = [(start, future) for start, future in stream.chunks if start < upto]
+        stream.chunks = stream.chunks[len(done):]
+        texts = await asyncio.gather(*(asyncio.wrap_future(future) for _, future in done))
+        return " ".join(t for t in texts if t).strip()
+    
+    async def transcribe(self, audio_bytes: bytes) -> str:
+        samples, sample_rate = decode_audio(audio_bytes)
+        if sample_rate != self.sample_rate:
+            raise ValueError(f"Local ASR expects {self.sample_rate} Hz audio, got {sample_rate} Hz")
+        
+        # Same chunking as streaming so long payloads decode in parallel across workers
+        futures: List[Future] = []
+        while len(samples) > self.chunk_samples:
+            cut = self._split_point(samples)
+            futures.append(self._executor.submit(self._decode, samples[:cut]))
+            samples = samples[cut:]
+        futures.append(self._executor.submit(self._decode, samples))
+        texts = await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        return " ".join(t for t in texts if t).strip()
+    
+    def end_session(self, session_id: str) -> None:
+        stream = self._streams.pop(session_id, None)
+        if stream is not None:
+            for _, future in stream.chunks:
+                future.cancel()
+
+
+def build_transcriber(settings, fish_client) -> Transcriber:
+    """Transcriber selected by settings.se_asr_backend ("fish" or "local")"""
+    if settings.se_asr_backend == "local":
+        return LocalTranscriber(
+            engine=settings.local_asr_engine,
+            source=settings.local_asr_source,
+            weights_path=settings.local_asr_weights_path,
+            sample_rate=settings.sample_rate,
+            chunk_seconds=settings.local_asr_chunk_seconds,
+            workers=settings.local_asr_workers,
+        )
+    if settings.se_asr_backend != "fish":
+        raise ValueError(f"Unknown ASR backend: {settings.se_asr_backend}")
+    return FishTranscriber(fish_client)
@@ -0,0 +1,66 @@
+"""TTS Cache - Content-addressed on-disk cache for rendered agent speech"""
+import hashlib
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import Iterable, Optional
+
+# Bump when the rendering pipeline changes in a way the key fields don't capture
+CACHE_VERSION = 1
+
+
+class TTSCache:
+    """
+    Rendered audio stored as <sha256>.<format>.
+    
+    The key covers everything that changes the audio (text, voice reference,
+    model, format, sample rate), so editing agent_script.py or the voice settings simply
+    produces new keys; files nothing refers to anymore are removed by prune().
+    """
+    
+    def __init__(self, cache_dir: str):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+    
+    @staticmethod
+    def key(text: str, reference_id: Optional[str], model: str, format: str, sample_rate: int) -> str:
+        """Content address for one rendering; doubles as the strong ETag"""
+        fields = {
+            "v": CACHE_VERSION,
+            "text": text,
+            "reference_id": reference_id or "",
+            "model": model,
+            "format": format,
+            "sample_rate": sample_rate,
+        }
+        return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+    
+    def path(self, key: str, format: str) -> Path:
+        return self.cache_dir / f"{key}.{format}"
+    
+    def get(self, key: str, format: str) -> Optional[Path]:
+        """Path of the cached rendering, or None if it hasn't been rendered yet"""
+        path = self.path(key, format)
+        return path if path.exists() else None
+    
+    def put(self, key: str, format: str, audio_bytes: bytes) -> Path:
+        """Store a rendering (atomic, so readers never see a partial file)"""
+        path = self.path(key, format)
+        # Unique per write: concurrent fills of one key (e.g. a relay finishing while a variant
+        # is transcoded) each write their own file and the last replace wins
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(audio_bytes)
+        os.replace(tmp_path, path)
+        return path
+    
+    def prune(self, keep: Iterable[str]) -> int:
+        """Delete renderings whose key is not in keep. Returns number removed."""
+        keep = set(keep)
+        removed = 0
+        for path in self.cache_dir.iterdir():
+            if path.is_file() and path.name.split(".", 1)[0] not in keep and not path.name.startswith("."):
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
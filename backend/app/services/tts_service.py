@@ -1,71 +1,296 @@
 """Fish Audio TTS Service for Agent Voice"""
-from fishaudio import FishAudio
-from fishaudio.utils import save
-from typing import Optional
-import tempfile
-import os
+import asyncio
+import weakref
+from fishaudio import AsyncFishAudio
+from fishaudio.types import TTSConfig
+from typing import AsyncIterator, Dict, Iterable, List, Optional
+from pathlib import Path
+from .tts_cache import TTSCache
+from .audio_codec import OPUS_SAMPLE_RATES, SUPPORTED_SAMPLE_RATES, decode_to_pcm_async, transcode_pcm_async
+
+# Sample rates Fish Audio can synthesize MP3 at (relayed directly on a cold cache)
+MP3_STREAM_RATES = (32000, 44100)
+
+
+class SharedRender:
+    """One upstream synthesis whose chunks are replayed to every subscriber"""
+    
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.task: Optional[asyncio.Task] = None  # Producer, referenced so it isn't garbage collected
+        self._changed = asyncio.Condition()
+    
+    async def publish(self, chunk: bytes) -> None:
+        async with self._changed:
+            self.chunks.append(chunk)
+            self._changed.notify_all()
+    
+    async def finish(self, error: Optional[BaseException] = None) -> None:
+        async with self._changed:
+            self.done = True
+            self.error = error
+            self._changed.notify_all()
+    
+    async def subscribe(self) -> AsyncIterator[bytes]:
+        """All chunks from the beginning, then new ones as they arrive"""
+        sent = 0
+        while True:
+            async with self._changed:
+                await self._changed.wait_for(lambda: len(self.chunks) > sent or self.done)
+                new_chunks = self.chunks[sent:]
+                finished, error = self.done, self.error
+            for chunk in new_chunks:
+                yield chunk
+            sent += len(new_chunks)
+            if finished and sent == len(self.chunks):
+                if error is not None:
+                    raise Exception(f"TTS generation failed: {error}")
+                return
 
 
 class TTSService:
     """Text-to-Speech service using Fish Audio SDK"""
     
-    def __init__(self, api_key: str, model: str = "fish-speech-1.5", reference_id: Optional[str] = None):
-        self.client = FishAudio(api_key=api_key)
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "fish-speech-1.5",
+        reference_id: Optional[str] = None,
+        cache: Optional[TTSCache] = None,
+        canonical_sample_rate: int = 44100,
+    ):
+        # Native async client - synthesis never blocks the event loop
+        self.client = AsyncFishAudio(api_key=api_key)
         self.model = model
         self.reference_id = reference_id
+        self.cache = cache
     
-    async def generate_speech(
+        # Every text is synthesized once, as raw PCM at this rate (or as MP3 for a cold MP3 request,
+        # decoded to PCM afterwards); other formats/rates are transcoded from that PCM
+        self.canonical_sample_rate = canonical_sample_rate
+        
+        # Single-flight: concurrent requests for the same rendering share one upstream call
+        self._inflight: Dict[str, SharedRender] = {}
+        self._fill_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        self.stats = {"renders": 0, "coalesced": 0}
+    
+    def resolve_sample_rate(self, format: str, sample_rate: Optional[int] = None) -> int:
+        """Requested rate, or the default for the format (canonical; 48 kHz for Opus if needed)"""
+        if sample_rate:
+            return sample_rate
+        if format == "opus" and self.canonical_sample_rate not in OPUS_SAMPLE_RATES:
+            return 48000
+        return self.canonical_sample_rate
+    
+    def is_canonical(self, format: str, sample_rate: Optional[int] = None) -> bool:
+        return format == "pcm" and self.resolve_sample_rate(format, sample_rate) == self.canonical_sample_rate
+    
+    def stream_source(self, format: str, sample_rate: Optional[int] = None) -> Optional[str]:
+        """
+        Upstream format a request can be relayed from while Fish Audio synthesizes it.
+        
+        WAV at the canonical rate is a header plus canonical PCM; MP3 at the
+        canonical rate comes straight from Fish Audio. Anything else needs
+        transcoding from the complete canonical PCM (None).
+        """
+        if self.resolve_sample_rate(format, sample_rate) != self.canonical_sample_rate:
+            return None
+        if format in ("pcm", "wav"):
+            return "pcm"
+        if format == "mp3" and self.canonical_sample_rate in MP3_STREAM_RATES:
+            return "mp3"
+        return None
+    
+    def cache_key(self, text: str, format: str, sample_rate: Optional[int] = None) -> str:
+        """Content address of a rendering with this service's voice and model"""
+        rate = self.resolve_sample_rate(format, sample_rate)
+        return TTSCache.key(text, self.reference_id, self.model, format, rate)
+    
+    def relay_source(self, text: str, format: str, sample_rate: Optional[int] = None) -> Optional[str]:
+        """
+        Upstream format to relay an uncached request from, or None to serve it from the cache.
+        
+        A text is only ever synthesized once. A request joins a relay of its
+        own upstream format already in flight, but never starts one while the
+        other upstream format is cached or being rendered: its audio is then
+        derived from that rendering instead.
+        """
+        source = self.stream_source(format, sample_rate)
+        if source is None:
+            return None
+        own = self.cache_key(text, source)
+        if own in self._inflight:
+            return source
+        if self.cache.get(own, source) is not None:
+            return None
+        other = "mp3" if source == "pcm" else "pcm"
+        other_key = self.cache_key(text, other)
+        if other_key in self._inflight or self.cache.get(other_key, other) is not None:
+            return None
+        return source
+    
+    def stream_shared(self, text: str, format: str = "pcm") -> AsyncIterator[bytes]:
+        """
+        Stream a rendering at the canonical rate, joining an identical synthesis already in flight.
+        
+        The first request for a (text, voice, format) starts the upstream call in
+        its own task; later ones replay the chunks produced so far and follow
+        along. A subscriber disconnecting never cancels the shared synthesis.
+        The finished rendering is stored in the cache under its own key.
+        
+        Args:
+            text: Text to convert to speech
+            format: Upstream format, "pcm" (canonical) or "mp3" (see stream_source)
+        """
+        key = self.cache_key(text, format)
+        render = self._inflight.get(key)
+        if render is None:
+            render = SharedRender()
+            self._inflight[key] = render
+            self.stats["renders"] += 1
+            render.task = asyncio.create_task(self._produce(key, render, text, format))
+        else:
+            self.stats["coalesced"] += 1
+        return render.subscribe()
+    
+    async def _produce(self, key: str, render: SharedRender, text: str, format: str) -> None:
+        try:
+            async for chunk in self.stream_speech(text=text, format=format, sample_rate=self.canonical_sample_rate):
+                await render.publish(chunk)
+            # Fill the cache before completing, so requests after this never re-render
+            if self.cache is not None:
+                path = await asyncio.to_thread(self.cache.put, key, format, b"".join(render.chunks))
+                print(f"[TTS Cache] Stored {path.name}")
+            await render.finish()
+        except Exception as e:
+            print(f"[Fish Audio] Error: {e}")
+            await render.finish(e)
+        finally:
+            self._inflight.pop(key, None)
+    
+    async def get_or_render(self, text: str, format: str = "mp3", sample_rate: Optional[int] = None) -> Path:
+        """
+        Path of the cached rendering, synthesizing or transcoding it on first use.
+        
+        Args:
+            text: Text to convert to speech
+            format: Audio format (mp3, wav, opus, flac, pcm)
+            sample_rate: Output sample rate in Hz (None = format default)
+        
+        Returns:
+            Path to the rendered audio file
+        """
+        key = self.cache_key(text, format, sample_rate)
+        path = self.cache.get(key, format)
+        if path is not None:
+            return path
+        
+        # Per-key lock: one task fills the cache, the rest wait and reuse the file
+        lock = self._fill_locks.get(key)
+        if lock is None:
+            lock = self._fill_locks[key] = asyncio.Lock()
+        async with lock:
+            path = self.cache.get(key, format)
+            if path is None and self.is_canonical(format, sample_rate):
+                mp3_path = await self._rendered_mp3(text)
+                if mp3_path is not None:
+                    # Synthesized as MP3 for a cold MP3 request: derive canonical PCM from that rendering
+                    mp3_bytes = await asyncio.to_thread(mp3_path.read_bytes)
+                    pcm_bytes = await decode_to_pcm_async(mp3_bytes, self.canonical_sample_rate)
+                    path = await asyncio.to_thread(self.cache.put, key, format, pcm_bytes)
+                    print(f"[TTS Cache] Stored canonical PCM {path.name} decoded from MP3")
+                else:
+                    async for _ in self.stream_shared(text):
+                        pass
+                    path = self.cache.path(key, format)
+            elif path is None:
+                # Variant: transcode the canonical rendering off the event loop, store it next to it
+                canonical = await self.get_or_render(text, "pcm")
+                # An MP3 relay the canonical PCM was decoded from already is this rendering
+                path = self.cache.get(key, format)
+                if path is None:
+                    pcm_bytes = await asyncio.to_thread(canonical.read_bytes)
+                    audio_bytes = await transcode_pcm_async(
+                        pcm_bytes, self.canonical_sample_rate, format, self.resolve_sample_rate(format, sample_rate),
+                    )
+                    path = await asyncio.to_thread(self.cache.put, key, format, audio_bytes)
+                    print(f"[TTS Cache] Stored {format} variant {path.name}")
+        return path
+    
+    async def _rendered_mp3(self, text: str) -> Optional[Path]:
+        """Cached MP3 rendering of the text at the canonical rate, waiting for a relay in flight"""
+        key = self.cache_key(text, "mp3")
+        render = self._inflight.get(key)
+        if render is not None:
+            async for _ in render.subscribe():
+                pass
+        return self.cache.get(key, "mp3")
+    
+    async def prerender(self, texts: Iterable[str], formats: Iterable[str]) -> int:
+        """
+        Render every (text, format) pair into the cache and prune stale files.
+        
+        Returns:
+            Number of newly synthesized renderings
+        """
+        texts, formats = list(texts), list(formats)
+        rendered = 0
+        for text in texts:
+            for format in formats:
+                if self.cache.get(self.cache_key(text, format), format) is None:
+                    await self.get_or_render(text, format)
+                    rendered += 1
+        return rendered
+    
+    def prune_cache(self, texts: Iterable[str], formats: Iterable[str]) -> int:
+        """
+        Drop renderings of script text or voice settings that no longer exist.
+        
+        Canonical PCM and the variants at every supported sample rate of the
+        given formats are kept.
+        """
+        formats = set(formats) | {"pcm"}
+        keep = set()
+        for text in texts:
+            for format in formats:
+                keep.add(self.cache_key(text, format))
+                for rate in OPUS_SAMPLE_RATES if format == "opus" else SUPPORTED_SAMPLE_RATES:
+                    keep.add(self.cache_key(text, format, rate))
+        return self.cache.prune(keep)
+    
+    async def stream_speech(
         self,
         text: str,
-        format: str = "mp3",
-        sample_rate: int = 16000,
+        format: str = "pcm",
+        sample_rate: Optional[int] = None,
         speed: float = 1.0,
         temperature: float = 0.7,
         top_p: float = 0.9,
-    ) -> bytes:
+    ) -> AsyncIterator[bytes]:
         """
-        Generate speech audio from text using Fish Audio SDK.
+        Relay audio chunks from Fish Audio as they are synthesized.
         
         Args:
             text: Text to convert to speech
-            format: Audio format (mp3, wav, opus, flac)
-            sample_rate: Audio sample rate in Hz
+            format: Upstream format (pcm, wav, mp3, opus)
+            sample_rate: Audio sample rate in Hz (None = Fish Audio default)
             speed: Speech speed multiplier (0.5 - 2.0)
             temperature: Sampling temperature for variation
             top_p: Nucleus sampling parameter
-            
-        Returns:
-            Audio bytes in specified format
-        """
-        print(f"[Fish Audio] Generating TTS for: {text[:50]}...")
-        print(f"[Fish Audio] Using reference_id: {self.reference_id}")
         
-        try:
-            # Use Fish Audio SDK to generate speech
-            audio = self.client.tts.convert(
-                text=text,
-                reference_id=self.reference_id,
-            )
-            
-            # Save to temporary file
-            with tempfile.NamedTemporaryFile(suffix=f'.{format}', delete=False) as tmp_file:
-                tmp_path = tmp_file.name
-            
-            # Use Fish Audio's save function
-            save(audio, tmp_path)
-            
-            # Read the file back as bytes
-            with open(tmp_path, 'rb') as f:
-                audio_bytes = f.read()
-            
-            # Clean up temp file
-            os.unlink(tmp_path)
-            
-            print(f"[Fish Audio] Success! Generated {len(audio_bytes)} bytes")
-            return audio_bytes
-            
-        except Exception as e:
-            print(f"[Fish Audio] Error: {e}")
-            import traceback
-            traceback.print_exc()
-            raise Exception(f"TTS generation failed: {str(e)}")
+        Yields:
+            Encoded audio chunks
+        """
+        print(f"[Fish Audio] Streaming TTS for: {text[:50]}...")
+        stream = await self.client.tts.stream(
+            text=text,
+            reference_id=self.reference_id,
+            format=format,
+            speed=speed,
+            config=TTSConfig(sample_rate=sample_rate, temperature=temperature, top_p=top_p),
+        )
+        async for chunk in stream:
+            yield chunk
+    
\ No newline at end of file
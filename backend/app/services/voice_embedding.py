@@ -2,7 +2,7 @@
 import torch
 import numpy as np
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional, Sequence, Tuple
 
 
 class VoiceEmbedding:
@@ -60,6 +60,58 @@ class VoiceEmbedding:
         
         return embedding
     
+    def compute_embeddings(self, segments: Sequence[torch.Tensor]) -> np.ndarray:
+        """
+        Compute embeddings for several segments in one padded forward pass.
+        
+        Args:
+            segments: 1D tensors of audio samples (mono, 16kHz), any lengths
+        
+        Returns:
+            (n_segments, 192) embeddings
+        """
+        self._load_model()
+        
+        # Zero-pad to the longest segment; wav_lens (relative lengths) masks the padding
+        longest = max(len(segment) for segment in segments)
+        batch = torch.zeros(len(segments), longest)
+        for i, segment in enumerate(segments):
+            batch[i, :len(segment)] = segment
+        wav_lens = torch.tensor([len(segment) / longest for segment in segments])
+        
+        with torch.no_grad():
+            embeddings = self.model.encode_batch(batch, wav_lens)
+            # embeddings shape: (batch, 1, embedding_dim)
+            embeddings = embeddings.squeeze(1).cpu().numpy()
+        
+        return embeddings
+    
+    def compute_enrollment_embedding(
+        self,
+        segments: Sequence[torch.Tensor],
+        weights: Sequence[float],
+    ) -> Tuple[np.ndarray, List[float]]:
+        """
+        Build an enrollment template from speech segments.
+        
+        Segments are embedded in one batch, length-normalized and averaged
+        with the given weights, so every segment counts by its quality rather
+        than its loudness.
+        
+        Args:
+            segments: 1D speech segments (mono, 16kHz)
+            weights: Per-segment weights (e.g. from SNR and length)
+        
+        Returns:
+            (template embedding, similarity of each segment to the template)
+        """
+        embeddings = self.compute_embeddings(segments)
+        normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+        template = np.average(normalized, axis=0, weights=np.asarray(weights, dtype=np.float64))
+        template = (template / np.linalg.norm(template)).astype(np.float32)
+        similarities = [self.cosine_similarity(template, embedding) for embedding in embeddings]
+        return template, similarities
+    
     def cosine_similarity(self, embedding1: np.ndarray, embedding2: np.ndarray) -> float:
         """
         Compute cosine similarity between two embeddings.
@@ -0,0 +1,57 @@
+"""Benchmark call archiving throughput: archived calls/s vs peak call-end rate"""
+import argparse
+import tempfile
+import time
+
+from app.services.call_archiver import CallArchiver
+from app.services.session_manager import SessionManager
+from bench_upload_codec import SAMPLE_RATE, load_speech, tile
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", default="../data/embeddings/demo_user_enrollment.wav",
+                        help="Speech WAV to use (falls back to a synthetic signal)")
+    parser.add_argument("--calls", type=int, default=100, help="Calls closed at once (call-end burst)")
+    parser.add_argument("--call-seconds", type=float, default=60.0, help="Caller audio per call")
+    parser.add_argument("--peak-ends-per-second", type=float, default=5.0, help="Peak call-end rate to keep up with")
+    args = parser.parse_args()
+    
+    print("=" * 78)
+    print(f"Call Archive Benchmark ({args.calls} calls x {args.call_seconds:g} s caller audio)")
+    print("=" * 78)
+    
+    pcm = tile(load_speech(args.input), args.call_seconds)
+    chunks = [pcm[i:i + 3200] for i in range(0, len(pcm), 3200)]
+    
+    print(f"{'workers':>8} {'close ms':>9} {'calls/s':>9} {'audio x RT':>11} {'KB/call':>8} {'ratio':>6} {'keeps pace':>11}")
+    for workers in (1, 2, 4):
+        with tempfile.TemporaryDirectory() as tmp:
+            archiver = CallArchiver(f"{tmp}/archive", SAMPLE_RATE, workers)
+            manager = SessionManager(max_sessions=args.calls * 2, audio_memory_bytes=1_048_576,
+                                     audio_horizon_bytes=320_000, spill_dir=f"{tmp}/spill", archiver=archiver)
+            sessions = [manager.create_session(f"user{i}") for i in range(args.calls)]
+            for session in sessions:
+                for chunk in chunks:
+                    manager.append_caller_audio(session.session_id, chunk)
+                manager.append_match_score(session.session_id, 0.9)
+            
+            start = time.perf_counter()
+            for session in sessions:
+                manager.close_session(session.session_id)
+            close_ms = (time.perf_counter() - start) / args.calls * 1000  # Request-path cost per close
+            archiver.shutdown()
+            elapsed = time.perf_counter() - start
+            
+            stats = archiver.get_stats()
+            assert stats["archived"] == args.calls
+            rate = args.calls / elapsed
+            per_call = stats["bytes_written"] / args.calls
+            print(f"{workers:>8} {close_ms:>9.3f} {rate:>9.1f} {stats['audio_seconds'] / elapsed:>10.0f}x "
+                  f"{per_call / 1024:>8.1f} {len(pcm) / per_call:>5.1f}x {'yes' if rate >= args.peak_ends_per_second else 'NO':>11}")
+    
+    print(f"\nclose ms = time close_session spends on the request path; keeps pace = calls/s >= {args.peak_ends_per_second:g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Latency benchmark for the local on-CPU synthetic speech detector"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+import numpy as np
+import torch
+
+from app.services.deepfake_detector import DeepfakeDetector
+from app.services.local_spoof_detector import LocalSpoofBackend, SpoofCNN
+
+
+def make_wav(detector: DeepfakeDetector, seconds: float, sample_rate: int = 16000) -> bytes:
+    """Speech-like test signal: harmonic tone with noise"""
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    signal = 0.3 * np.sin(2 * np.pi * 140 * t) + 0.1 * np.sin(2 * np.pi * 280 * t)
+    signal += 0.05 * np.random.randn(len(t))
+    pcm = (np.clip(signal, -1, 1) * 32767).astype(np.int16).tobytes()
+    return detector.bytes_to_wav(pcm, sample_rate)
+
+
+async def bench(weights_path: str, durations: list[float], iterations: int):
+    backend = LocalSpoofBackend(weights_path=weights_path)
+    backend.load_weights()
+    detector = DeepfakeDetector(backends=[backend])
+    
+    params = sum(p.numel() for p in backend.model.parameters())
+    print(f"Model parameters: {params:,} | torch threads: {torch.get_num_threads()}")
+    print(f"{'audio':>8} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9} {'x realtime':>11}")
+    
+    for seconds in durations:
+        wav = make_wav(detector, seconds)
+        await backend.predict(wav)  # Warm-up
+        
+        latencies = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            await backend.predict(wav)
+            latencies.append((time.perf_counter() - start) * 1000)
+        
+        latencies.sort()
+        p50 = statistics.median(latencies)
+        p95 = latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))]
+        scored = min(seconds, backend.max_seconds)
+        print(f"{seconds:>7.0f}s {p50:>9.1f} {p95:>9.1f} {latencies[-1]:>9.1f} {scored * 1000 / p50:>10.0f}x")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--weights", default="", help="state_dict path (default: untrained weights, latency only)")
+    parser.add_argument("--durations", default="5,10,20,30", help="Comma-separated clip lengths in seconds")
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    
+    print("=" * 60)
+    print("Local Spoof Detector - CPU Latency Benchmark")
+    print("=" * 60)
+    
+    weights_path = args.weights
+    temp_weights = None
+    if not weights_path:
+        # Untrained network has the same cost profile; scores are meaningless
+        with tempfile.NamedTemporaryFile(suffix=".pt", delete=False) as f:
+            temp_weights = weights_path = f.name
+        torch.save(SpoofCNN().state_dict(), weights_path)
+        print(f"⚠ No --weights given, benchmarking untrained weights ({weights_path})")
+    
+    durations = [float(d) for d in args.durations.split(",")]
+    try:
+        asyncio.run(bench(weights_path, durations, args.iterations))
+    finally:
+        if temp_weights:
+            os.unlink(temp_weights)
+
+
+if __name__ == "__main__":
+    main()
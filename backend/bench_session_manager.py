@@ -0,0 +1,121 @@
+"""Benchmark SessionManager contention: 500 simulated calls plus dashboard polls"""
+import argparse
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.services.session_manager import SessionManager
+
+CHUNK = bytes(3200)  # 100 ms of 16 kHz 16-bit mono
+
+
+class GlobalLockSessionManager(SessionManager):
+    """Previous design for comparison: every call takes one process-wide RLock"""
+    
+    def __init__(self, **kwargs):
+        super().__init__(num_shards=1, **kwargs)
+        self._global = threading.RLock()
+        for name in ("get_session", "update_elapsed_time", "append_raw_audio", "append_caller_audio",
+                     "append_match_score", "risk_snapshots"):
+            setattr(self, name, self._locked(getattr(self, name)))
+    
+    def _locked(self, method):
+        def call(*args, **kwargs):
+            with self._global:
+                return method(*args, **kwargs)
+        return call
+
+
+def process_chunk(manager: SessionManager, session_id: str, i: int) -> None:
+    """What audio_stream does for every 100 ms chunk"""
+    manager.get_session(session_id)
+    manager.update_elapsed_time(session_id)
+    manager.append_raw_audio(session_id, CHUNK)
+    manager.append_caller_audio(session_id, CHUNK)
+    if i % 10 == 0:
+        manager.append_match_score(session_id, 0.9)
+
+
+def run_threads(manager: SessionManager, session_ids, chunks: int, workers: int, pollers: int):
+    """Calls spread over worker threads, dashboards polling from their own threads"""
+    latencies = [[] for _ in range(workers)]
+    stop = threading.Event()
+    polls = [0] * pollers
+    
+    def worker(w: int):
+        mine = session_ids[w::workers]
+        out = latencies[w]
+        for i in range(chunks):
+            for sid in mine:
+                start = time.perf_counter()
+                process_chunk(manager, sid, i)
+                out.append(time.perf_counter() - start)
+    
+    def poller(p: int):
+        while not stop.is_set():
+            manager.risk_snapshots()
+            for sid in session_ids[p::pollers][:50]:
+                manager.get_session(sid)
+            polls[p] += 1
+    
+    poll_threads = [threading.Thread(target=poller, args=(p,)) for p in range(pollers)]
+    for t in poll_threads:
+        t.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(worker, range(workers)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for t in poll_threads:
+        t.join()
+    return elapsed, np.concatenate([np.array(l) for l in latencies]), sum(polls)
+
+
+async def run_asyncio(manager: SessionManager, session_ids, chunks: int):
+    """One task per call on the event loop, yielding between chunks like a websocket read"""
+    async def call(sid: str):
+        for i in range(chunks):
+            process_chunk(manager, sid, i)
+            await asyncio.sleep(0)
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(call(sid) for sid in session_ids))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=500)
+    parser.add_argument("--chunks", type=int, default=100, help="100 ms chunks per session")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--pollers", type=int, default=4)
+    args = parser.parse_args()
+    
+    print("=" * 78)
+    print(f"Session Manager Contention ({args.sessions} sessions x {args.chunks} chunks, "
+          f"{args.workers} worker threads, {args.pollers} poll threads)")
+    print("=" * 78)
+    print(f"{'manager':>12} {'mode':>8} {'chunks/s':>11} {'p50 µs':>8} {'p99 µs':>8} {'max µs':>9} {'polls':>7}")
+    
+    for label, factory in (("global-lock", GlobalLockSessionManager), ("sharded", SessionManager)):
+        manager = factory(max_sessions=args.sessions * 2)
+        session_ids = [manager.create_session(f"user{i}").session_id for i in range(args.sessions)]
+        total = args.sessions * args.chunks
+        
+        elapsed, lat, polls = run_threads(manager, session_ids, args.chunks, args.workers, args.pollers)
+        p50, p99, worst = np.percentile(lat, [50, 99, 100]) * 1e6
+        print(f"{label:>12} {'threads':>8} {total / elapsed:>11,.0f} {p50:>8.1f} {p99:>8.1f} {worst:>9.1f} {polls:>7}")
+        
+        manager = factory(max_sessions=args.sessions * 2)
+        session_ids = [manager.create_session(f"user{i}").session_id for i in range(args.sessions)]
+        elapsed = asyncio.run(run_asyncio(manager, session_ids, args.chunks))
+        print(f"{label:>12} {'asyncio':>8} {total / elapsed:>11,.0f}")
+    
+    print("\nchunks/s = simulated 100 ms chunks handled per second (one chunk = 5 manager calls)")
+
+
+if __name__ == "__main__":
+    main()
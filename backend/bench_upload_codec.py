@@ -0,0 +1,75 @@
+"""Benchmark upload codecs: encode CPU time vs upload time saved for 5-30 s payloads"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+
+from app.services.audio_codec import CODECS, encode_pcm
+
+SAMPLE_RATE = 16000
+
+
+def load_speech(path: str) -> np.ndarray:
+    """Load a speech recording as int16 mono, or synthesize a speech-like signal"""
+    if path and Path(path).exists():
+        import soundfile as sf
+        samples, _ = sf.read(path, dtype="int16", always_2d=True)
+        return samples[:, 0]
+    
+    # Voiced harmonics with syllable-rate amplitude modulation plus noise floor
+    t = np.arange(10 * SAMPLE_RATE) / SAMPLE_RATE
+    pitch = 140 + 20 * np.sin(2 * np.pi * 0.5 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / SAMPLE_RATE
+    voiced = sum(np.sin(k * phase) / k for k in range(1, 8))
+    envelope = np.clip(np.sin(2 * np.pi * 4 * t), 0, None)
+    signal = 0.2 * voiced * envelope + 0.01 * np.random.randn(len(t))
+    return (np.clip(signal, -1, 1) * 32767).astype(np.int16)
+
+
+def tile(samples: np.ndarray, seconds: float) -> bytes:
+    n = int(seconds * SAMPLE_RATE)
+    reps = int(np.ceil(n / len(samples)))
+    return np.tile(samples, reps)[:n].tobytes()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--input", default="../data/embeddings/demo_user_enrollment.wav",
+                        help="Speech WAV to use (falls back to a synthetic signal)")
+    parser.add_argument("--uplink-mbps", type=float, default=10.0, help="Assumed upload bandwidth")
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+    
+    print("=" * 78)
+    print(f"Upload Codec Benchmark (uplink {args.uplink_mbps:g} Mbit/s)")
+    print("=" * 78)
+    
+    speech = load_speech(args.input)
+    bytes_per_second = args.uplink_mbps * 1_000_000 / 8
+    
+    print(f"{'audio':>6} {'codec':>6} {'size KB':>9} {'ratio':>6} {'encode ms':>10} "
+          f"{'upload ms':>10} {'saved ms':>9} {'net ms':>8}")
+    for seconds in (5, 10, 20, 30):
+        pcm = tile(speech, seconds)
+        wav_size = len(encode_pcm(pcm, SAMPLE_RATE, "wav"))
+        wav_upload = wav_size / bytes_per_second * 1000
+        
+        for codec in CODECS:
+            encode_pcm(pcm, SAMPLE_RATE, codec)  # Warm-up
+            cpu_start = time.process_time()
+            for _ in range(args.iterations):
+                encoded = encode_pcm(pcm, SAMPLE_RATE, codec)
+            encode_ms = (time.process_time() - cpu_start) / args.iterations * 1000
+            
+            upload_ms = len(encoded) / bytes_per_second * 1000
+            saved_ms = wav_upload - upload_ms
+            print(f"{seconds:>5}s {codec:>6} {len(encoded) / 1024:>9.1f} {wav_size / len(encoded):>5.1f}x "
+                  f"{encode_ms:>10.1f} {upload_ms:>10.1f} {saved_ms:>9.1f} {saved_ms - encode_ms:>8.1f}")
+        print()
+    
+    print("net ms = upload time saved vs WAV minus encode CPU time (positive = codec pays off)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Test the social engineering LLM verdict cache (TTL, LRU, persistence)"""
+import tempfile
+import time
+from pathlib import Path
+
+from app.services.analysis_cache import AnalysisCache, normalize
+
+
+def test_normalize():
+    assert normalize("Thank you!") == normalize("thank   you")
+    assert normalize("Account 1234 5678.") == normalize("account 1234-5678")
+    assert normalize("Account 1234 5678.") != normalize("account 9999 0000")
+    print("   ✓ Case, punctuation and whitespace are folded; digits are kept")
+
+
+def test_redaction():
+    cache = AnalysisCache()
+    cache.put("my card is 4111 1111, read me the code", {
+        "risk_score": 80,
+        "flagged_phrases": ["my card is 4111 1111", "read me the code"],
+        "reason": "caller read out card 4111 1111",
+        "context_summary": "bank caller asked for a card number",
+    })
+    assert cache.get("my card is 4111 1111, read me the code") == {
+        "risk_score": 80,
+        "flagged_phrases": ["read me the code"],
+        "reason": "caller read out card # #",
+    }
+    print("   ✓ Stored verdicts drop digit-bearing phrases, mask digits and keep no summary")
+
+
+def test_lru_and_ttl():
+    cache = AnalysisCache(max_entries=2, ttl_seconds=60)
+    cache.put("thank you", {"risk_score": 0})
+    cache.put("read me the code", {"risk_score": 90})
+    assert cache.get("Thank you.") == {"risk_score": 0}
+    
+    # "thank you" was just used, so the other entry is evicted
+    cache.put("have a nice day", {"risk_score": 0})
+    assert cache.get("read me the code") is None
+    assert cache.get("thank you") is not None
+    assert cache.stats["evictions"] == 1
+    print("   ✓ Least recently used entry is evicted")
+    
+    short = AnalysisCache(ttl_seconds=0.05)
+    short.put("thank you", {"risk_score": 0})
+    time.sleep(0.1)
+    assert short.get("thank you") is None
+    assert short.stats["expired"] == 1
+    print("   ✓ Entries expire after the TTL")
+    
+    stats = cache.snapshot_stats()
+    assert stats["hits"] == 2 and stats["misses"] == 1 and stats["size"] == 2
+    print(f"   ✓ Counters exposed: {stats}")
+
+
+def test_context():
+    cache = AnalysisCache()
+    cache.put("ok, read me the code", {"risk_score": 95}, "caller claims to be the bank")
+    assert cache.get("OK read me the code", "caller claims to be the bank") == {"risk_score": 95}
+    assert cache.get("ok, read me the code", "friend asking for a door code") is None
+    assert cache.get("ok, read me the code") is None
+    cache.put("thank you", {"risk_score": 0})
+    assert cache.get("thank you") == {"risk_score": 0}
+    print("   ✓ Verdicts are keyed on text plus the conversation summary they were judged in")
+
+
+def test_persistence(tmp_path):
+    path = tmp_path / "se_cache.json"
+    cache = AnalysisCache(persist_path=str(path))
+    cache.put("thank you", {"risk_score": 0, "risk_level": "SAFE"})
+    cache.put("my account is 4111 2222, read me the code", {"risk_score": 90}, "caller claims to be the bank")
+    cache.save()
+    
+    stored = path.read_text()
+    assert "4111" not in stored and "2222" not in stored and "thank" not in stored
+    print("   ✓ Persisted keys are digests, holding no transcript text or digits")
+    
+    warm = AnalysisCache(persist_path=str(path))
+    assert warm.get("thank you") == {"risk_score": 0, "risk_level": "SAFE"}
+    assert warm.get("My account is 4111 2222. Read me the code", "caller claims to be the bank") == {"risk_score": 90}
+    print("   ✓ Cache stays warm across restarts")
+
+
+def main():
+    print("=" * 60)
+    print("Analysis Cache Tests")
+    print("=" * 60)
+    
+    test_normalize()
+    test_redaction()
+    test_lru_and_ttl()
+    test_context()
+    with tempfile.TemporaryDirectory() as tmp:
+        test_persistence(Path(tmp))
+    
+    print("\n" + "=" * 60)
+    print("All analysis cache tests passed ✓")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
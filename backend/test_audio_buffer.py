@@ -0,0 +1,114 @@
+"""Test memory-capped session audio buffers with spill-to-disk segments"""
+import os
+import tempfile
+from pathlib import Path
+
+from app.services.audio_buffer import AudioBuffer
+from app.services.session_manager import SessionManager
+
+CHUNK_BYTES = 3200  # 100 ms of 16 kHz 16-bit mono
+
+
+def chunk(i: int) -> bytes:
+    return bytes([i % 251]) * CHUNK_BYTES
+
+
+def test_spill_and_read_back(tmp_path: Path):
+    spill_dir = str(tmp_path)
+    buffer = AudioBuffer(spill_dir, "caller", memory_budget=64_000, horizon_bytes=32_000, segment_bytes=100_000)
+    expected = b""
+    for i in range(600):  # 60 s of audio
+        buffer.append(chunk(i))
+        expected += chunk(i)
+        # Reads stay complete while a background spill is in progress
+        if i % 50 == 7:
+            assert buffer.read() == expected
+        buffer.flush()
+        assert buffer.memory_bytes <= 64_000 + CHUNK_BYTES
+    
+    assert buffer.num_bytes == len(expected) and buffer.chunk_count == 600
+    assert buffer.spilled_bytes + buffer.memory_bytes == len(expected)
+    assert buffer.memory_bytes >= 32_000  # Analysis horizon never spills
+    segments = sorted(Path(spill_dir).glob("caller-*.pcm"))
+    assert len(segments) > 1 and sum(p.stat().st_size for p in segments) == buffer.spilled_bytes
+    
+    assert buffer.read() == expected
+    assert buffer.tail(16_000) == expected[-16_000:]
+    assert buffer.read(150_001, 420_007) == expected[150_001:420_007]
+    assert b"".join(buffer.iter_range(99_000, 301_000, piece_bytes=4096)) == expected[99_000:301_000]
+    assert max(len(p) for p in buffer.iter_range(piece_bytes=4096)) <= 4096
+    print(f"   ✓ 60 s call: {buffer.memory_bytes / 1024:.0f} KiB in memory, "
+          f"{buffer.spilled_bytes / 1024:.0f} KiB in {len(segments)} segments, reads match")
+    
+    buffer.release()
+    assert not list(Path(spill_dir).glob("caller-*.pcm"))
+    print("   ✓ release() deletes the segments")
+
+
+def test_background_spill(tmp_path: Path):
+    spill_dir = str(tmp_path)
+    import time
+    from app.services import audio_buffer
+    
+    # Hold up the spill worker: appends must not wait for disk writes
+    gate = audio_buffer._spill_executor.submit(time.sleep, 0.2)
+    buffer = AudioBuffer(spill_dir, "slow", memory_budget=16_000, horizon_bytes=8_000)
+    start = time.perf_counter()
+    for i in range(100):
+        buffer.append(chunk(i))
+    elapsed = time.perf_counter() - start
+    assert elapsed < 0.1 and buffer.spilled_bytes == 0
+    assert buffer.read() == b"".join(chunk(i) for i in range(100))
+    
+    # Released while its spill is still queued: the worker cleans up after itself
+    buffer.release()
+    gate.result()
+    buffer.flush()
+    assert not list(Path(spill_dir).glob("slow-*.pcm"))
+    print(f"   ✓ 100 appends with the spill worker busy took {elapsed * 1000:.1f} ms; release mid-spill cleans up")
+
+
+def test_memory_only():
+    buffer = AudioBuffer()
+    for i in range(50):
+        buffer.append(chunk(i))
+    assert buffer.spilled_bytes == 0 and buffer.read() == b"".join(chunk(i) for i in range(50))
+    print("   ✓ No spill directory: everything stays in memory")
+
+
+def test_session_manager(tmp_path: Path):
+    spill_dir = str(tmp_path)
+    manager = SessionManager(store_raw_audio=False, audio_memory_bytes=64_000,
+                             audio_horizon_bytes=32_000, spill_dir=spill_dir)
+    session = manager.create_session("user")
+    for i in range(200):
+        manager.append_raw_audio(session.session_id, chunk(i))
+        manager.append_caller_audio(session.session_id, chunk(i))
+    session.caller_audio.flush()
+    assert session.raw_audio.num_bytes == 0
+    assert session.caller_audio.spilled_bytes > 0
+    assert os.path.isdir(os.path.join(spill_dir, session.session_id))
+    
+    manager.delete_session(session.session_id)
+    assert not os.path.exists(os.path.join(spill_dir, session.session_id))
+    print("   ✓ store_raw_audio=False skips raw audio; deleting a session removes its spill directory")
+
+
+def main():
+    print("=" * 60)
+    print("Audio Buffer Tests")
+    print("=" * 60)
+    
+    with tempfile.TemporaryDirectory() as spill_dir:
+        test_spill_and_read_back(Path(spill_dir))
+        test_background_spill(Path(spill_dir))
+        test_memory_only()
+        test_session_manager(Path(spill_dir))
+    
+    print("\n" + "=" * 60)
+    print("All audio buffer tests passed ✓")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
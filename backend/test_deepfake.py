@@ -2,7 +2,7 @@
 import asyncio
 import time
 from pathlib import Path
-from app.services.deepfake_detector import DeepfakeDetector
+from app.services.deepfake_detector import get_deepfake_detector
 from app.config import get_settings
 
 async def test_deepfake():
@@ -16,17 +16,14 @@ async def test_deepfake():
     if not settings.aurigin_api_key:
         print("\n⚠ No API credentials found in .env")
         print("  Add AURIGIN_API_KEY to test real detection")
-        print("\n  Will use stub mode (returns fake_score=0.0)")
+        print("\n  Will use stub mode (no backend: fake_score is unknown)")
         return
     else:
         print(f"\n✓ API URL: {settings.aurigin_api_url}")
         print(f"✓ API Key: {settings.aurigin_api_key[:8]}...")
     
     # Initialize detector
-    detector = DeepfakeDetector(
-        api_url=settings.aurigin_api_url,
-        api_key=settings.aurigin_api_key
-    )
+    detector = get_deepfake_detector()
     
     # Find test audio
     test_audio = Path("./test.mp3")
@@ -57,6 +54,11 @@ async def test_deepfake():
     print("\n" + "=" * 60)
     print(f"✓ COMPLETED IN {total_time:.1f} SECONDS")
     print("=" * 60)
+    
+    if fake_score is None:
+        print("\n✗ UNKNOWN - No detection backend returned a usable score")
+        return
+    
     print(f"\nDeepfake Score: {fake_score:.3f} ({fake_score*100:.1f}% AI probability)")
     
     # Interpret result
@@ -0,0 +1,302 @@
+"""Test deepfake failover, hedging and circuit breaking against local stub vendor servers"""
+import asyncio
+import socket
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request, HTTPException
+
+from app.services.deepfake_detector import (
+    DeepfakeDetector,
+    DetectorBackend,
+    AuriginBackend,
+    UndetectableBackend,
+)
+from app.services.risk_engine import RiskEngine
+from app.models.schemas import RiskStatus
+
+
+# Behaviour knobs for the stub vendors - tests flip these between scenarios
+AURIGIN = {"latency": 0.0, "fail": False, "score": 0.9, "hits": 0}
+UNDETECTABLE = {"latency": 0.0, "fail": False, "score": 0.1, "hits": 0}
+
+
+def make_aurigin_stub() -> FastAPI:
+    app = FastAPI()
+    
+    @app.post("/predict")
+    async def predict(request: Request):
+        AURIGIN["hits"] += 1
+        await request.body()
+        await asyncio.sleep(AURIGIN["latency"])
+        if AURIGIN["fail"]:
+            raise HTTPException(status_code=503, detail="injected failure")
+        return {"predictions": ["fake"], "global_probability": [AURIGIN["score"]]}
+    
+    return app
+
+
+def make_undetectable_stub(base_url_holder: dict) -> FastAPI:
+    app = FastAPI()
+    jobs = {}
+    
+    @app.get("/get-presigned-url")
+    async def presign(file_name: str):
+        UNDETECTABLE["hits"] += 1
+        if UNDETECTABLE["fail"]:
+            raise HTTPException(status_code=500, detail="injected failure")
+        return {
+            "presigned_url": f"{base_url_holder['url']}/upload/{file_name}",
+            "file_path": f"uploads/{file_name}",
+        }
+    
+    @app.put("/upload/{file_name}")
+    async def upload(file_name: str, request: Request):
+        await request.body()
+        return {}
+    
+    @app.post("/detect")
+    async def detect(payload: dict):
+        job_id = f"job-{len(jobs)}"
+        jobs[job_id] = time.monotonic() + UNDETECTABLE["latency"]
+        return {"id": job_id, "status": "pending"}
+    
+    @app.post("/query")
+    async def query(payload: dict):
+        if time.monotonic() < jobs[payload["id"]]:
+            return {"id": payload["id"], "status": "pending"}
+        return {"id": payload["id"], "status": "done", "result": UNDETECTABLE["score"] * 100}
+    
+    return app
+
+
+def start_server(app: FastAPI) -> str:
+    """Run a stub app on a free local port in a background thread"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+def reset_stubs():
+    AURIGIN.update(latency=0.0, fail=False, hits=0)
+    UNDETECTABLE.update(latency=0.0, fail=False, hits=0)
+
+
+class FixedScoreBackend(DetectorBackend):
+    """In-process stand-in for the local CPU model"""
+    
+    name = "Fixed"
+    
+    def __init__(self, score: float):
+        super().__init__()
+        self.score = score
+    
+    async def predict(self, audio_bytes: bytes) -> float:
+        return self.score
+
+
+class SlowScoreBackend(FixedScoreBackend):
+    """Pre-screen that is still running when its detect() is cancelled"""
+    
+    async def predict(self, audio_bytes: bytes) -> float:
+        await asyncio.sleep(10)
+        return self.score
+
+
+def make_detector(aurigin_url: str, undetectable_url: str) -> DeepfakeDetector:
+    options = dict(timeout=2.0, failure_threshold=2, reset_timeout=1.0)
+    return DeepfakeDetector(
+        backends=[
+            AuriginBackend(aurigin_url, "test-key", **options),
+            UndetectableBackend(undetectable_url, "test-key", "user", poll_interval=0.05, **options),
+        ],
+        hedge_default_delay=0.3,
+    )
+
+
+async def check_primary_healthy(detector):
+    reset_stubs()
+    score = await detector.detect(b"RIFF")
+    assert score == 0.9, score
+    assert UNDETECTABLE["hits"] == 0
+    print("   ✓ Healthy primary answers, backup untouched")
+
+
+async def check_failover_on_error(detector):
+    reset_stubs()
+    AURIGIN["fail"] = True
+    score = await detector.detect(b"RIFF")
+    assert score == 0.1, score
+    assert UNDETECTABLE["hits"] == 1
+    print("   ✓ Primary error fails over to backup")
+
+
+async def check_hedge_on_slow_primary(detector):
+    reset_stubs()
+    detector.backends[0].breaker.record_success()
+    AURIGIN["latency"] = 1.5
+    start = time.monotonic()
+    score = await detector.detect(b"RIFF")
+    elapsed = time.monotonic() - start
+    assert score == 0.1, score
+    assert elapsed < 1.0, elapsed
+    print(f"   ✓ Slow primary hedged to backup ({elapsed:.2f}s < primary 1.5s)")
+
+
+async def check_hedge_uses_percentile(detector):
+    reset_stubs()
+    primary = detector.backends[0]
+    primary.latency.samples.clear()
+    for _ in range(20):
+        primary.latency.record(0.05)
+    assert abs(detector.hedge_delay(primary) - 0.05) < 1e-9
+    AURIGIN["latency"] = 0.4
+    score = await detector.detect(b"RIFF")
+    assert score == 0.1, score
+    primary.latency.samples.clear()
+    print("   ✓ Hedge delay follows primary p95 once samples exist")
+
+
+async def check_circuit_opens(detector):
+    reset_stubs()
+    AURIGIN["fail"] = True
+    for _ in range(2):
+        await detector.detect(b"RIFF")
+    assert detector.backends[0].breaker.state == "open"
+    hits_before = AURIGIN["hits"]
+    score = await detector.detect(b"RIFF")
+    assert score == 0.1
+    assert AURIGIN["hits"] == hits_before, "open circuit must skip the primary"
+    print("   ✓ Repeated failures open the primary circuit")
+    
+    # After the cool-down a single probe closes it again
+    AURIGIN["fail"] = False
+    await asyncio.sleep(1.1)
+    assert detector.backends[0].breaker.state == "half_open"
+    score = await detector.detect(b"RIFF")
+    assert score == 0.9
+    assert detector.backends[0].breaker.state == "closed"
+    print("   ✓ Half-open probe success closes the circuit")
+
+
+async def check_all_backends_down(detector):
+    reset_stubs()
+    AURIGIN["fail"] = True
+    UNDETECTABLE["fail"] = True
+    score = await detector.detect(b"RIFF")
+    assert score is None, score
+    
+    _, _, status, reason = RiskEngine().compute_risk([0.9, 0.92], [0.05, score])
+    assert status == RiskStatus.UNCERTAIN, status
+    print(f"   ✓ All backends down -> unknown -> {status.value}: {reason}")
+
+
+async def check_no_backend():
+    score = await DeepfakeDetector(backends=[]).detect(b"RIFF")
+    assert score is None, score
+    print("   ✓ No backend configured -> unknown, not a 0.0 \"real\" score")
+
+
+async def check_prescreen(aurigin_url, undetectable_url):
+    reset_stubs()
+    confident = make_detector(aurigin_url, undetectable_url)
+    confident.prescreen = FixedScoreBackend(0.02)
+    assert await confident.detect(b"RIFF") == 0.02
+    assert AURIGIN["hits"] == 0
+    print("   ✓ Confident pre-screen skips the vendors")
+    
+    inconclusive = make_detector(aurigin_url, undetectable_url)
+    inconclusive.prescreen = FixedScoreBackend(0.5)
+    assert await inconclusive.detect(b"RIFF") == 0.9
+    assert AURIGIN["hits"] == 1
+    print("   ✓ Inconclusive pre-screen escalates to the vendors")
+    
+    # A detect() cancelled mid pre-screen (superseded, session closed) gives the probe back
+    slow = make_detector(aurigin_url, undetectable_url)
+    slow.prescreen = SlowScoreBackend(0.02)
+    breaker = slow.prescreen.breaker
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout
+    task = asyncio.create_task(slow.detect(b"RIFF"))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    await asyncio.sleep(0)
+    assert breaker.state == "half_open"
+    assert breaker.allow_request() is not None, "cancelled pre-screen leaked the probe slot"
+    print("   ✓ Cancelled pre-screen releases its half-open probe")
+
+
+async def check_cancelled_probe_released(aurigin_url, undetectable_url):
+    reset_stubs()
+    detector = make_detector(aurigin_url, undetectable_url)
+    breaker = detector.backends[1].breaker
+    breaker.opened_at = time.monotonic() - breaker.reset_timeout
+    ticket = breaker.allow_request()
+    assert ticket is not None, "half-open breaker should hand out the probe"
+    
+    # A hedge cancelled before it ever runs (primary answered first) must give the probe back
+    task = detector._start_backend(detector.backends[1], b"RIFF", ticket)
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    assert UNDETECTABLE["hits"] == 0
+    assert breaker.state == "half_open"
+    probe = breaker.allow_request()
+    assert probe is not None, "probe slot leaked by a never-started hedge"
+    print("   ✓ Hedge cancelled before its first step releases the half-open probe")
+    
+    # Requests that are not the probe (started before the circuit opened) leave its slot alone
+    breaker.record_cancelled(ticket)
+    breaker.record_cancelled(object())
+    assert breaker.allow_request() is None, "a second probe was admitted while the first runs"
+    breaker.record_cancelled(probe)
+    assert breaker.allow_request() is not None
+    print("   ✓ Only the probe's own request releases the half-open slot")
+
+
+async def main():
+    print("=" * 60)
+    print("Deepfake Failover / Hedging / Circuit Breaker Tests")
+    print("=" * 60)
+    
+    aurigin_url = start_server(make_aurigin_stub())
+    holder = {}
+    undetectable_url = start_server(make_undetectable_stub(holder))
+    holder["url"] = undetectable_url
+    detector = make_detector(aurigin_url, undetectable_url)
+    
+    await check_primary_healthy(detector)
+    await check_failover_on_error(detector)
+    await check_hedge_on_slow_primary(detector)
+    await check_hedge_uses_percentile(detector)
+    await check_circuit_opens(detector)
+    await check_all_backends_down(detector)
+    await check_no_backend()
+    await check_prescreen(aurigin_url, undetectable_url)
+    await check_cancelled_probe_released(aurigin_url, undetectable_url)
+    
+    print("\n" + "=" * 60)
+    print("All failover tests passed ✓")
+    print("=" * 60)
+
+
+def test_failover():
+    # The scenarios share the stub servers and one detector's breaker state, so they run in order
+    asyncio.run(main())
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
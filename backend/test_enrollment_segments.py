@@ -0,0 +1,117 @@
+"""Test speech-selective, multi-segment enrollment embedding"""
+import time
+
+import numpy as np
+import torch
+
+from app.services.speech_segments import select_speech_segments
+from app.services.voice_embedding import VoiceEmbedding
+
+SAMPLE_RATE = 16000
+rng = np.random.default_rng(0)
+
+
+def speech(seconds: float, pitch: float = 180.0, gain: float = 0.3) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    envelope = 0.05 + 0.95 * np.abs(np.sin(2 * np.pi * 2.5 * t))  # Syllable-rate modulation
+    return (gain * np.sin(2 * np.pi * pitch * t) * envelope).astype(np.float32)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return (0.001 * rng.standard_normal(int(seconds * SAMPLE_RATE))).astype(np.float32)
+
+
+def test_speech_selection():
+    clipped = np.clip(speech(2, gain=1.5), -1, 1)
+    recording = np.concatenate([silence(2), speech(7), silence(1), clipped, speech(4), silence(3)])
+    segments, summary = select_speech_segments(recording, SAMPLE_RATE, segment_seconds=3.0, min_segment_seconds=1.5)
+    
+    # The quiet troughs inside the clipped stretch are dropped along with it
+    assert abs(summary["speech_seconds"] - 11) < 0.3, summary
+    assert abs(summary["clipped_seconds"] - 2) < 0.3, summary
+    assert summary["silence_seconds"] > 5.5
+    assert [round(s.duration, 1) for s in segments][:3] == [3.0, 3.0, 3.0]
+    assert abs(segments[0].start - 2.0) < 0.1  # Leading silence skipped
+    assert all(s.clipped_ratio == 0 for s in segments)
+    assert all(len(s.samples) <= 3 * SAMPLE_RATE for s in segments)
+    print(f"   ✓ Silence and clipped audio dropped: {summary}")
+    print(f"   ✓ Segments: {[s.quality() for s in segments]}")
+    
+    _, summary = select_speech_segments(silence(10), SAMPLE_RATE)
+    assert summary["speech_seconds"] < 1, summary
+    print("   ✓ A silent recording yields (almost) no speech")
+    
+    # Steady -40 dBFS white noise is loud enough to clear the absolute floor but has no
+    # speech/silence contrast; it must not become a noise template
+    noise = (0.01 * rng.standard_normal(20 * SAMPLE_RATE)).astype(np.float32)
+    segments, summary = select_speech_segments(noise, SAMPLE_RATE)
+    assert segments == [] and summary["speech_seconds"] == 0, summary
+    t = np.arange(20 * SAMPLE_RATE) / SAMPLE_RATE
+    hum = (0.2 * np.sin(2 * np.pi * 60 * t)).astype(np.float32)
+    assert select_speech_segments(hum, SAMPLE_RATE)[1]["speech_seconds"] == 0
+    print("   ✓ Stationary noise and hum yield no speech (enrollment answers 400)")
+
+
+def test_bounded_segments():
+    # 120 s recording, 108 s of it speech: only the best max_segments are embedded
+    recording = np.concatenate([np.concatenate([speech(4.5), silence(0.5)]) for _ in range(24)])
+    start = time.perf_counter()
+    segments, summary = select_speech_segments(recording, SAMPLE_RATE, max_segments=20)
+    elapsed = (time.perf_counter() - start) * 1000
+    assert summary["speech_seconds"] > 100 and len(segments) == 20
+    assert [s.start for s in segments] == sorted(s.start for s in segments)
+    assert all(len(s.samples) == 3 * SAMPLE_RATE for s in segments)
+    print(f"   ✓ 120 s recording: best 20 of {summary['speech_seconds'] / 3:.0f} segments in {elapsed:.1f} ms")
+
+
+class SpectralEncoder:
+    """Deterministic stand-in for the ECAPA encoder: band energies of the unpadded samples"""
+    
+    def __init__(self):
+        self.calls = []
+    
+    def encode_batch(self, wavs: torch.Tensor, wav_lens: torch.Tensor) -> torch.Tensor:
+        self.calls.append((tuple(wavs.shape), wav_lens.tolist()))
+        out = []
+        for wav, rel in zip(wavs, wav_lens):
+            wav = wav[:int(round(float(rel) * wavs.shape[1]))]
+            spectrum = torch.fft.rfft(wav).abs()
+            bands = torch.stack([band.mean() for band in torch.tensor_split(spectrum, 8)])
+            out.append(bands / bands.norm())
+        return torch.stack(out).unsqueeze(1)
+
+
+def test_batched_template():
+    voice = VoiceEmbedding(embeddings_dir="/tmp/callshield-test-embeddings")
+    voice.model = SpectralEncoder()
+    segments = [torch.from_numpy(speech(3)), torch.from_numpy(speech(3)), torch.from_numpy(speech(1.5))]
+    template, similarities = voice.compute_enrollment_embedding(segments, [1.0, 1.0, 0.5])
+    
+    assert len(voice.model.calls) == 1  # One forward pass for all segments
+    shape, wav_lens = voice.model.calls[0]
+    assert shape == (3, 3 * SAMPLE_RATE) and wav_lens == [1.0, 1.0, 0.5]
+    assert abs(np.linalg.norm(template) - 1) < 1e-5
+    assert min(similarities) > 0.99, similarities  # Same voice: padding didn't distort the short segment
+    
+    outlier = torch.from_numpy(speech(3, pitch=2500))
+    _, similarities = voice.compute_enrollment_embedding(segments + [outlier], [1.0, 1.0, 0.5, 0.25])
+    assert similarities[3] < min(similarities[:3]), similarities
+    print(f"   ✓ One padded batch, weighted template; per-segment similarity {[round(s, 3) for s in similarities]}")
+
+
+def main():
+    print("=" * 60)
+    print("Enrollment Segment Tests")
+    print("=" * 60)
+    
+    test_speech_selection()
+    test_bounded_segments()
+    test_batched_template()
+    
+    print("\n" + "=" * 60)
+    print("All enrollment segment tests passed ✓")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
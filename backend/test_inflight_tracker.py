@@ -0,0 +1,87 @@
+"""Test per-session in-flight tracking: coalescing, superseding, cancellation and stale results"""
+import asyncio
+
+import pytest
+
+from app.services.inflight_tracker import InFlightTracker
+from app.services.session_manager import SessionManager
+
+
+@pytest.mark.asyncio
+async def test_coalesce():
+    tracker = InFlightTracker()
+    calls = []
+    
+    def make_job(tag):
+        async def job():
+            calls.append(tag)
+            await asyncio.sleep(0.05)
+        return job
+    
+    assert tracker.submit("s1", "se", make_job(1)) == "started"
+    assert tracker.submit("s1", "se", make_job(2)) == "coalesced"
+    assert tracker.submit("s1", "se", make_job(3)) == "coalesced"
+    assert tracker.submit("s2", "se", make_job("other")) == "started"
+    await asyncio.sleep(0.2)
+    
+    # Trigger 2 was replaced by 3 and never sent
+    assert calls == [1, "other", 3], calls
+    print("   ✓ Triggers coalesce while a request is running")
+
+
+@pytest.mark.asyncio
+async def test_supersede_and_close():
+    tracker = InFlightTracker()
+    finished = []
+    
+    def make_job(tag):
+        async def job():
+            await asyncio.sleep(0.05)
+            finished.append(tag)
+        return job
+    
+    tracker.submit("s1", "deepfake", make_job("window-1"), window_id=1, supersede=True)
+    await asyncio.sleep(0.01)
+    assert tracker.submit("s1", "deepfake", make_job("window-2"), window_id=2, supersede=True) == "superseded"
+    await asyncio.sleep(0.1)
+    assert finished == ["window-2"], finished
+    print("   ✓ Newer window cancels the obsolete request")
+    
+    tracker.submit("s1", "deepfake", make_job("closed"), window_id=3)
+    tracker.submit("s1", "deepfake", make_job("pending"), window_id=3)
+    assert tracker.cancel_session("s1") == 1
+    await asyncio.sleep(0.1)
+    assert finished == ["window-2"], finished
+    assert not tracker.is_running("s1", "deepfake")
+    print("   ✓ Session close cancels running and pending requests")
+
+
+def test_stale_results_dropped():
+    manager = SessionManager()
+    session = manager.create_session("user")
+    assert manager.append_fake_score(session.session_id, 0.1, (0.0, 10.0))
+    assert not manager.append_fake_score(session.session_id, 0.9, (0.0, 5.0))
+    assert session.risk.fake_last == 0.1 and session.risk.fake_count == 1
+    
+    assert manager.append_se_result(session.session_id, {"risk_score": 10}, (0.0, 8.0))
+    assert not manager.append_se_result(session.session_id, {"risk_score": 90}, (0.0, 4.0))
+    assert session.risk.se_last["audio_end"] == 8.0
+    print("   ✓ Out-of-order results are dropped and results carry their audio range")
+
+
+async def main():
+    print("=" * 60)
+    print("In-flight Tracker Tests")
+    print("=" * 60)
+    
+    await test_coalesce()
+    await test_supersede_and_close()
+    test_stale_results_dropped()
+    
+    print("\n" + "=" * 60)
+    print("All in-flight tests passed ✓")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
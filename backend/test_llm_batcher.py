@@ -0,0 +1,160 @@
+"""Test cross-session batching of social engineering LLM requests"""
+import asyncio
+import json
+
+import pytest
+
+from app.services.llm_batcher import LLMBatcher
+
+
+def single_prompt(summary: str, delta: str) -> str:
+    return f"SINGLE {delta}"
+
+
+class FakeLLM:
+    """Scores each item by its text; batch replies can be broken on purpose"""
+    
+    def __init__(self, batch_mode: str = "ok"):
+        self.batch_mode = batch_mode
+        self.prompts = []
+    
+    async def generate(self, prompt: str) -> str:
+        self.prompts.append(prompt)
+        await asyncio.sleep(0.01)
+        if prompt.startswith("SINGLE "):
+            return json.dumps({"risk_score": len(prompt) - 7})
+        if self.batch_mode == "garbage":
+            return "Sorry, here are the results: ..."
+        if self.batch_mode == "single":
+            # Model answered with one analysis object instead of the multi-item shape
+            return json.dumps({"risk_score": 0, "risk_level": "SAFE"})
+        items = json.loads(prompt.split("Items:\n", 1)[1])
+        if self.batch_mode == "partial":
+            items = items[:-1]
+        results = [{"id": item["id"], "risk_score": len(item["new_transcript_text"])} for item in items]
+        return "```json\n" + json.dumps({"results": results}) + "\n```"
+
+
+TEXTS = ["a" * n for n in range(1, 6)]
+
+
+async def run(llm: FakeLLM, texts):
+    batcher = LLMBatcher(llm.generate, single_prompt, window_seconds=0.05, max_items=8)
+    results = await asyncio.gather(*(batcher.submit("", text) for text in texts))
+    return batcher, results
+
+
+@pytest.mark.asyncio
+async def test_shared_request():
+    llm = FakeLLM()
+    batcher, results = await run(llm, TEXTS)
+    assert [r["risk_score"] for r in results] == [1, 2, 3, 4, 5]
+    assert len(llm.prompts) == 1 and batcher.stats["batched_items"] == 5
+    print("   ✓ Five concurrent sessions share one request and get their own results")
+
+
+@pytest.mark.asyncio
+async def test_fallbacks():
+    llm = FakeLLM("garbage")
+    batcher, results = await run(llm, TEXTS)
+    assert [r["risk_score"] for r in results] == [1, 2, 3, 4, 5]
+    assert len(llm.prompts) == 6 and batcher.stats["fallbacks"] == 5
+    print("   ✓ Unparseable batch reply falls back to single requests")
+    
+    llm = FakeLLM("partial")
+    batcher, results = await run(llm, TEXTS)
+    assert [r["risk_score"] for r in results] == [1, 2, 3, 4, 5]
+    assert len(llm.prompts) == 2 and batcher.stats["fallbacks"] == 1
+    print("   ✓ Only items missing from the reply are retried")
+    
+    llm = FakeLLM("single")
+    batcher, results = await run(llm, TEXTS)
+    assert [r["risk_score"] for r in results] == [1, 2, 3, 4, 5]
+    assert len(llm.prompts) == 6 and batcher.stats["fallbacks"] == 5
+    print("   ✓ A reply without \"results\" falls back to single requests")
+
+
+@pytest.mark.asyncio
+async def test_generate_batch():
+    llm = FakeLLM()
+    prompts = []
+    
+    async def generate_batch(prompt: str) -> str:
+        prompts.append(prompt)
+        return await llm.generate(prompt)
+    
+    batcher = LLMBatcher(llm.generate, single_prompt, window_seconds=0.05, generate_batch=generate_batch)
+    results = await asyncio.gather(*(batcher.submit("", text) for text in TEXTS))
+    assert [r["risk_score"] for r in results] == [1, 2, 3, 4, 5]
+    assert len(prompts) == 1 and len(llm.prompts) == 1
+    print("   ✓ Batch prompts go through generate_batch when one is given")
+
+
+@pytest.mark.asyncio
+async def test_batch_sizes():
+    llm = FakeLLM()
+    batcher, results = await run(llm, ["only one"])
+    assert results[0]["risk_score"] == 8 and llm.prompts[0].startswith("SINGLE ")
+    print("   ✓ A lone item is sent as a normal single prompt")
+    
+    llm = FakeLLM()
+    batcher, results = await run(llm, ["x"] * 12)
+    assert len(llm.prompts) == 2
+    print("   ✓ Full batches are sent without waiting for the window")
+    assert not batcher._tasks
+    print("   ✓ Batch tasks are referenced while running and released when done")
+
+
+class SlowFallbackLLM(FakeLLM):
+    """Batch replies are garbage and single requests hang, counting cancellations"""
+    
+    def __init__(self):
+        super().__init__("garbage")
+        self.cancelled = 0
+    
+    async def generate(self, prompt: str) -> str:
+        if not prompt.startswith("SINGLE "):
+            return await super().generate(prompt)
+        self.prompts.append(prompt)
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return "{}"
+
+
+@pytest.mark.asyncio
+async def test_fallback_cancellation():
+    # A caller that times out cancels its single request instead of leaving it running
+    llm = SlowFallbackLLM()
+    batcher = LLMBatcher(llm.generate, single_prompt, window_seconds=0.01, max_items=8, timeout_seconds=0.3)
+    outcomes = await asyncio.gather(
+        asyncio.wait_for(batcher.submit("", "first"), timeout=0.1),
+        batcher.submit("", "second"),
+        return_exceptions=True,
+    )
+    await asyncio.sleep(0.05)
+    assert all(isinstance(o, asyncio.TimeoutError) for o in outcomes), outcomes
+    assert llm.cancelled == 2 and not batcher._tasks
+    print("   ✓ Fallback requests stop when the caller gives up or the batcher timeout passes")
+
+
+async def main():
+    print("=" * 60)
+    print("LLM Batcher Tests")
+    print("=" * 60)
+    
+    await test_shared_request()
+    await test_fallbacks()
+    await test_generate_batch()
+    await test_batch_sizes()
+    await test_fallback_cancellation()
+    
+    print("\n" + "=" * 60)
+    print("All LLM batcher tests passed ✓")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,137 @@
+"""Test the offline local ASR backend: worker-pool decoding and chunked streaming
+
+Uses the torchaudio wav2vec2 engine. Pass a state dict path (argument, or
+LOCAL_ASR_WEIGHTS under pytest) to decode with real weights; otherwise randomly
+initialized weights exercise the pipeline only. The pretrained-model tests
+download weights and are skipped when they can't be loaded.
+"""
+import asyncio
+import importlib.util
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from app.services.audio_codec import encode_pcm
+from app.services.transcriber import LocalTranscriber
+
+SAMPLE_RATE = 16000
+WEIGHTS_PATH = os.environ.get("LOCAL_ASR_WEIGHTS", "")
+
+
+def random_weights(path: Path) -> str:
+    import torch
+    import torchaudio
+    labels = torchaudio.pipelines.WAV2VEC2_ASR_BASE_960H.get_labels()
+    torch.save(torchaudio.models.wav2vec2_base(aux_num_out=len(labels)).state_dict(), path)
+    return str(path)
+
+
+def speech_like(seconds: float) -> bytes:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    signal = 0.3 * np.sin(2 * np.pi * 150 * t) * np.clip(np.sin(2 * np.pi * 3 * t), 0, None)
+    return (signal * 32767).astype(np.int16).tobytes()
+
+
+def make_transcriber(tmp_path: Path) -> LocalTranscriber:
+    pytest.importorskip("torchaudio")
+    weights = WEIGHTS_PATH or random_weights(tmp_path / "wav2vec2.pt")
+    asr = LocalTranscriber(engine="torchaudio", weights_path=weights, chunk_seconds=2.0, workers=2)
+    asr._load_model()  # Load up front so the streaming timings measure decoding only
+    return asr
+
+
+@pytest.mark.asyncio
+async def test_payload(tmp_path):
+    # Whole-payload transcription through the worker pool
+    asr = make_transcriber(tmp_path)
+    text = await asr.transcribe(encode_pcm(speech_like(3.0), SAMPLE_RATE))
+    assert isinstance(text, str)
+    print(f"   ✓ Payload transcribed: {text[:40]!r}")
+
+
+@pytest.mark.asyncio
+async def test_streaming(tmp_path):
+    # Streaming: feed 100 ms chunks, chunks decode while audio keeps arriving
+    asr = make_transcriber(tmp_path)
+    chunk = SAMPLE_RATE // 10 * 2
+    audio = speech_like(8.0)
+    for i in range(0, len(audio), chunk):
+        asr.feed("s1", audio[i:i + chunk])
+        await asyncio.sleep(0.01)
+    assert len(asr._streams["s1"].chunks) >= 3
+    await asyncio.sleep(1.0)
+    decoded = sum(future.done() for _, future in asr._streams["s1"].chunks)
+    assert decoded >= 1
+    print(f"   ✓ {decoded} chunks decoded before the window ends")
+    
+    start = time.perf_counter()
+    first = await asr.finish("s1", 5.0)
+    second = await asr.finish("s1", 8.0)
+    print(f"   ✓ Window finished {1000 * (time.perf_counter() - start):.0f} ms after its end")
+    assert isinstance(first, str) and isinstance(second, str)
+    assert asr._streams["s1"].chunks == [] and len(asr._streams["s1"].buffer) == 0
+    print("   ✓ Consecutive windows consume the stream in order")
+    
+    asr.end_session("s1")
+    assert "s1" not in asr._streams
+    print("   ✓ Session state dropped at call end")
+
+
+@pytest.mark.asyncio
+async def test_reconnect_offsets(tmp_path):
+    # Reconnect: the new stream starts at the caller-audio offset, so finish() only
+    # flushes up to the window end instead of everything buffered
+    asr = make_transcriber(tmp_path)
+    chunk = SAMPLE_RATE // 10 * 2
+    audio = speech_like(2.0)
+    for i in range(0, SAMPLE_RATE * 2, chunk):
+        asr.feed("s2", audio[i:i + chunk], start_seconds=30.0 + i / (SAMPLE_RATE * 2))
+    assert asr._streams["s2"].buffer_start == 30 * SAMPLE_RATE
+    await asr.finish("s2", 30.5)
+    stream = asr._streams["s2"]
+    assert stream.buffer_start == int(30.5 * SAMPLE_RATE), stream.buffer_start
+    assert len(stream.buffer) == SAMPLE_RATE // 2, len(stream.buffer)
+    asr.end_session("s2")
+    print("   ✓ Recreated stream keeps absolute caller-audio offsets")
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("engine", ["speechbrain", "torchaudio"])
+async def test_pretrained(engine):
+    # Default model loading downloads pretrained weights (SpeechBrain hub / torchaudio bundle)
+    if importlib.util.find_spec(engine) is None:
+        pytest.skip(f"{engine} is not installed")
+    asr = LocalTranscriber(engine=engine, workers=1)
+    try:
+        asr._load_model()
+    except Exception as e:
+        pytest.skip(f"{engine} pretrained weights unavailable: {e}")
+    text = await asr.transcribe(encode_pcm(speech_like(3.0), SAMPLE_RATE))
+    assert isinstance(text, str)
+    print(f"   ✓ Pretrained {engine} model transcribed: {text[:40]!r}")
+
+
+async def main():
+    print("=" * 60)
+    print("Local ASR Tests")
+    print("=" * 60)
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        await test_payload(Path(tmp))
+        await test_streaming(Path(tmp))
+        await test_reconnect_offsets(Path(tmp))
+    
+    print("\n" + "=" * 60)
+    print("All local ASR tests passed ✓")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        WEIGHTS_PATH = sys.argv[1]
+    asyncio.run(main())
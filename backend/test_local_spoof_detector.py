@@ -0,0 +1,104 @@
+"""Test the local synthetic speech detector: weight loading and predict round-trips"""
+import asyncio
+import os
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from app.services.audio_codec import encode_pcm
+from app.services.deepfake_detector import BackendError
+from app.services.local_spoof_detector import LocalSpoofBackend, SpoofCNN
+
+SAMPLE_RATE = 16000
+
+
+def make_pcm(seconds: float, sample_rate: int = SAMPLE_RATE) -> bytes:
+    t = np.arange(int(seconds * sample_rate)) / sample_rate
+    signal = 0.3 * np.sin(2 * np.pi * 140 * t) + 0.05 * np.random.default_rng(0).standard_normal(len(t))
+    return (np.clip(signal, -1, 1) * 32767).astype(np.int16).tobytes()
+
+
+def save_reference(weights_dir: str):
+    """Save one seeded model as a plain and a {'state_dict': ...} checkpoint"""
+    torch.manual_seed(0)
+    reference = SpoofCNN()
+    plain_path = os.path.join(weights_dir, "plain.pt")
+    wrapped_path = os.path.join(weights_dir, "wrapped.pt")
+    torch.save(reference.state_dict(), plain_path)
+    torch.save({"state_dict": reference.state_dict()}, wrapped_path)
+    return plain_path, wrapped_path, reference
+
+
+def test_load_weights(tmp_path: Path):
+    weights_dir = str(tmp_path)
+    plain_path, wrapped_path, reference = save_reference(weights_dir)
+    
+    for path in (plain_path, wrapped_path):
+        backend = LocalSpoofBackend(weights_path=path)
+        model = backend.load_weights()
+        assert not model.training
+        for name, tensor in reference.state_dict().items():
+            assert torch.equal(model.state_dict()[name], tensor), name
+    print("   ✓ Plain and {'state_dict': ...} checkpoints load into an eval-mode model")
+    
+    try:
+        LocalSpoofBackend(weights_path=os.path.join(weights_dir, "missing.pt")).load_weights()
+        raise AssertionError("expected BackendError")
+    except BackendError as e:
+        assert "not found" in str(e)
+    print("   ✓ Missing weights raise BackendError")
+
+
+def test_predict(tmp_path: Path):
+    weights_path, _, reference = save_reference(str(tmp_path))
+    asyncio.run(check_predict(weights_path, reference))
+
+
+async def check_predict(weights_path: str, reference: SpoofCNN):
+    backend = LocalSpoofBackend(weights_path=weights_path, segment_seconds=2.0, max_seconds=6.0)
+    pcm = make_pcm(10)
+    
+    # Direct computation: the last 6 s in three 2 s segments, mean probability
+    audio = torch.from_numpy(np.frombuffer(pcm, dtype=np.int16).astype(np.float32) / 32768.0)[-6 * SAMPLE_RATE:]
+    reference.eval()
+    with torch.inference_mode():
+        expected = float(reference(audio.reshape(3, 2 * SAMPLE_RATE)).mean())
+    
+    for codec in ("wav", "flac"):
+        score = await backend.predict(encode_pcm(pcm, SAMPLE_RATE, codec))
+        assert 0.0 <= score <= 1.0
+        assert abs(score - expected) < 1e-4, (codec, score, expected)
+    print(f"   ✓ WAV and FLAC payloads score {expected:.4f}, matching a direct forward pass")
+    
+    short = await backend.predict(encode_pcm(make_pcm(0.5), SAMPLE_RATE, "wav"))
+    assert 0.0 <= short <= 1.0
+    print("   ✓ Clips shorter than one segment are padded and scored")
+    
+    for payload, needle in ((encode_pcm(make_pcm(1, 8000), 8000, "wav"), "expects 16000 Hz"),
+                            (b"not audio at all", "Unsupported audio payload")):
+        try:
+            await backend.predict(payload)
+            raise AssertionError("expected BackendError")
+        except BackendError as e:
+            assert needle in str(e), e
+    print("   ✓ Wrong-rate and undecodable payloads raise BackendError")
+
+
+def main():
+    print("=" * 60)
+    print("Local Spoof Detector Tests")
+    print("=" * 60)
+    
+    with tempfile.TemporaryDirectory() as weights_dir:
+        test_load_weights(Path(weights_dir))
+        test_predict(Path(weights_dir))
+    
+    print("\n" + "=" * 60)
+    print("All local spoof detector tests passed ✓")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
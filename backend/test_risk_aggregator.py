@@ -0,0 +1,251 @@
+"""Test the incremental per-session risk aggregator against the list-based RiskEngine"""
+import json
+import random
+import time
+
+from app.models.schemas import RiskStatus
+from app.services.risk_aggregator import RiskAggregator
+from app.services.risk_engine import RiskEngine
+
+
+def test_matches_risk_engine():
+    engine = RiskEngine()
+    rng = random.Random(7)
+    
+    for _ in range(200):
+        aggregator = RiskAggregator(engine)
+        match_scores, fake_scores = [], []
+        assert aggregator.status == RiskStatus.INITIAL
+        
+        for _ in range(rng.randint(1, 40)):
+            if rng.random() < 0.6:
+                score = rng.random()
+                match_scores.append(score)
+                aggregator.add_match(score)
+            else:
+                score = None if rng.random() < 0.15 else rng.random()
+                fake_scores.append(score)
+                aggregator.add_fake(score)
+            
+            mean_match, mean_fake, status, reason = engine.compute_risk(match_scores, fake_scores)
+            assert abs(aggregator.mean_match - mean_match) < 1e-9
+            assert aggregator.mean_fake == mean_fake
+            assert (aggregator.status, aggregator.reason) == (status, reason)
+            assert aggregator.fake_unknown == engine.is_fake_unknown(fake_scores)
+        
+        if match_scores:
+            assert aggregator.match_min == min(match_scores) and aggregator.match_max == max(match_scores)
+            assert aggregator.match_count == len(match_scores)
+    print("   ✓ Status, reason and means match RiskEngine.compute_risk on 200 random calls")
+
+
+def test_stale_results():
+    aggregator = RiskAggregator()
+    assert aggregator.add_fake(0.1, (0.0, 10.0))
+    assert not aggregator.add_fake(0.9, (0.0, 5.0))
+    assert aggregator.fake_last == 0.1
+    assert aggregator.add_se({"risk_score": 10}, (0.0, 8.0))
+    assert not aggregator.add_se({"risk_score": 90}, (0.0, 4.0))
+    assert aggregator.se_last["risk_score"] == 10
+    print("   ✓ Out-of-order results are dropped")
+
+
+def test_constant_cost():
+    aggregator = RiskAggregator()
+    timings = []
+    for n in (1_000, 100_000):
+        start = time.perf_counter()
+        for i in range(n):
+            aggregator.add_match(0.9)
+        timings.append((time.perf_counter() - start) / n * 1e6)
+    assert len(aggregator.match_window) == 5
+    assert len(aggregator.match_history) <= aggregator.history_limit
+    assert aggregator.history_dropped["match"] + len(aggregator.match_history) == 101_000
+    print(f"   ✓ Update cost flat ({timings[0]:.2f} µs vs {timings[1]:.2f} µs), window stays at 5 scores, "
+          f"history capped at {len(aggregator.match_history)}")
+
+
+def test_history():
+    aggregator = RiskAggregator(history_limit=8)
+    for i in range(6):
+        aggregator.add_match(0.5 + i / 20)
+    aggregator.add_fake(0.2, (0.0, 5.0))
+    aggregator.add_fake(None, (0.0, 10.0))
+    aggregator.add_se({"risk_score": 30, "risk_level": "LOW", "flagged_phrases": ["code"], "reason": "r",
+                       "transcript": "long text"}, (0.0, 8.0))
+    history = aggregator.history()
+    assert history["match"] == [0.5, 0.55, 0.6, 0.65, 0.7, 0.75]
+    assert history["fake"] == [[5.0, 0.2], [10.0, None]]
+    assert history["social_engineering"] == [{"audio_start": 0.0, "audio_end": 8.0, "risk_score": 30,
+                                              "risk_level": "LOW", "flagged_phrases": ["code"], "reason": "r"}]
+    
+    # Snapshots: the state stays small, history goes out as records appended per tick
+    records, cursor = aggregator.history_records()
+    for _ in range(5):
+        aggregator.add_match(0.9)
+    assert len(aggregator.match_history) == 7 and aggregator.history()["dropped"]["match"] == 4
+    new_records, cursor = aggregator.history_records(cursor)
+    assert new_records == [["match", 0.9]] * 5
+    assert aggregator.history_records(cursor)[0] == []
+    
+    state = aggregator.to_state()
+    assert not any(key.endswith("history") for key in state)
+    restored = RiskAggregator.from_state(json.loads(json.dumps(state)))
+    restored.load_history(json.loads(json.dumps(records + new_records)))
+    assert restored.history() == aggregator.history()
+    compacted = RiskAggregator.from_state(state)
+    compacted.load_history(aggregator.history_records()[0])
+    assert compacted.history() == aggregator.history()
+    print("   ✓ Per-window match/deepfake series and SE verdicts kept (capped) and rebuilt from incremental records")
+
+
+def test_snapshot_versions():
+    aggregator = RiskAggregator()
+    created = aggregator.snapshot[0]
+    assert json.loads(aggregator.snapshot[1])["status"] == "INITIAL"
+    
+    aggregator.add_match(0.9)
+    aggregator.add_fake(0.1, (0.0, 4.0))
+    assert not aggregator.add_fake(0.1, (0.0, 2.0))  # Stale, no new version
+    aggregator.add_se({"risk_score": 70, "risk_level": "HIGH_RISK", "flagged_phrases": ["gift card"], "reason": "r"})
+    version, body = aggregator.snapshot
+    assert version == aggregator.version and version >= created + 3
+    other = RiskAggregator()
+    other.add_match(0.5)
+    assert other.version > version  # Versions are ordered across sessions
+    payload = json.loads(body)
+    assert payload["match_score"] == 90 and payload["se_risk_level"] == "HIGH_RISK"
+    print("   ✓ Snapshot re-encoded once per accepted update")
+
+
+def test_risk_endpoint_etag():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.api.sessions import router
+    from app.services import get_session_manager
+    
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    manager = get_session_manager()
+    session = manager.create_session(user_id="etag-test")
+    
+    first = client.get(f"/sessions/{session.session_id}/risk")
+    assert first.status_code == 200 and first.json()["status"] == "INITIAL"
+    etag = first.headers["etag"]
+    
+    assert client.get(f"/sessions/{session.session_id}/risk", headers={"If-None-Match": etag}).status_code == 304
+    # Weak validators from proxies and tag lists match too (RFC 9110 weak comparison)
+    for header in (f"W/{etag}", f'"other", W/{etag}', "*"):
+        assert client.get(f"/sessions/{session.session_id}/risk", headers={"If-None-Match": header}).status_code == 304
+    
+    manager.append_match_score(session.session_id, 0.95)
+    changed = client.get(f"/sessions/{session.session_id}/risk", headers={"If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert changed.json()["match_score"] == 95
+    manager.delete_session(session.session_id)
+    print("   ✓ GET /risk answers 304 (also for W/ tags, lists and *) until the scores change")
+
+
+def test_bulk_risk_endpoint():
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from app.api.sessions import router
+    from app.dependencies import verify_token
+    from app.services.session_manager import SessionManager
+    import app.services.session_manager as session_manager_module
+    
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[verify_token] = lambda: "supervisor"
+    client = TestClient(app)
+    manager = session_manager_module._session_manager = SessionManager(max_sessions=1000)
+    
+    sessions = [manager.create_session(user_id=f"user{i}") for i in range(250)]
+    for i, session in enumerate(sessions):
+        manager.append_match_score(session.session_id, 0.2 if i % 5 == 0 else 0.95)
+        manager.append_fake_score(session.session_id, 0.05)
+    manager.close_session(sessions[1].session_id)
+    
+    full = client.get("/sessions/risk", params={"limit": 1000}).json()
+    assert full["total"] == 249 and full["next_offset"] is None
+    assert full["sessions"][0]["risk"]["status"] == "HIGH_RISK"
+    
+    seen = []
+    offset = 0
+    while offset is not None:
+        page = client.get("/sessions/risk", params={"status": "HIGH_RISK", "limit": 20, "offset": offset}).json()
+        seen += [item["session_id"] for item in page["sessions"]]
+        offset = page["next_offset"]
+    assert seen == [s.session_id for i, s in enumerate(sessions) if i % 5 == 0]
+    
+    # Delta: only sessions changed since the last poll; changed ones outside the filter are listed as dropped
+    manager.append_match_score(sessions[2].session_id, 0.95)
+    manager.append_match_score(sessions[5].session_id, 0.95)  # Window mean 0.575 -> leaves HIGH_RISK
+    for _ in range(10):
+        manager.append_match_score(sessions[10].session_id, 0.95)
+    delta = client.get("/sessions/risk", params={"status": "HIGH_RISK", "since_version": full["version"]}).json()
+    assert [item["session_id"] for item in delta["sessions"]] == []
+    assert delta["dropped"] == [sessions[2].session_id, sessions[5].session_id, sessions[10].session_id]
+    assert delta["version"] > full["version"]
+    
+    unchanged = client.get("/sessions/risk", params={"since_version": delta["version"]}).json()
+    assert unchanged["sessions"] == [] and unchanged["version"] == delta["version"]
+    assert unchanged["ended"] == [] and full["ended"] == []
+    print("   ✓ Bulk /sessions/risk: filter, pagination and since_version deltas")
+    
+    # A call ending is a change too: the next delta poll lists it in ended
+    manager.close_session(sessions[3].session_id)
+    ended = client.get("/sessions/risk", params={"since_version": unchanged["version"]}).json()
+    assert ended["ended"] == [sessions[3].session_id] and ended["sessions"] == []
+    assert ended["version"] > unchanged["version"]
+    assert client.get("/sessions/risk", params={"since_version": ended["version"]}).json()["ended"] == []
+    
+    # Reconnecting brings it back as an update, not as ended
+    manager.reopen_session(sessions[3].session_id)
+    back = client.get("/sessions/risk", params={"since_version": unchanged["version"]}).json()
+    assert back["ended"] == [] and [item["session_id"] for item in back["sessions"]] == [sessions[3].session_id]
+    session_manager_module._session_manager = None
+    print("   ✓ Closed sessions are reported in ended; reopened ones come back as updates")
+
+
+def test_snapshots_report_evictions():
+    from app.services.session_manager import SessionManager
+    
+    manager = SessionManager(timeout_seconds=300)
+    idle, streaming, deleted = (manager.create_session() for _ in range(3))
+    version, rows, ended = manager.risk_snapshots()
+    assert len(rows) == 3 and ended == []
+    
+    # Deleted directly, then the reaper evicts the idle call; the streaming one is pushed forward
+    manager.delete_session(deleted.session_id)
+    now = time.time() + 301
+    streaming.last_activity = now
+    assert manager.reap(now) == 1
+    newest, rows, ended = manager.risk_snapshots(version)
+    assert ended == [deleted.session_id, idle.session_id], ended
+    assert rows == [] and newest > version
+    print("   ✓ Timed-out and deleted sessions reach delta readers as ended")
+
+
+def main():
+    print("=" * 60)
+    print("Risk Aggregator Tests")
+    print("=" * 60)
+    
+    test_matches_risk_engine()
+    test_stale_results()
+    test_constant_cost()
+    test_history()
+    test_snapshot_versions()
+    test_risk_endpoint_etag()
+    test_bulk_risk_endpoint()
+    test_snapshots_report_evictions()
+    
+    print("\n" + "=" * 60)
+    print("All risk aggregator tests passed ✓")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
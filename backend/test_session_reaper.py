@@ -0,0 +1,112 @@
+"""Test the expiry-heap session reaper"""
+import asyncio
+import time
+
+import pytest
+
+from app.services.session_manager import SessionManager
+
+
+def test_expiry_order():
+    manager = SessionManager(max_sessions=10_000, timeout_seconds=300, closed_grace_seconds=60, reap_batch=100)
+    sessions = [manager.create_session(f"user{i}") for i in range(1000)]
+    now = time.time()
+    
+    # Nothing is due yet
+    assert manager.reap(now) == 0 and len(manager) == 1000
+    
+    # Closed sessions go after the grace period, open ones stay until the timeout
+    for session in sessions[:250]:
+        manager.close_session(session.session_id)
+    assert manager.reap(now + 30) == 0
+    assert manager.reap(now + 61) == 100  # Bounded work per tick
+    while manager.reap(now + 61):
+        pass
+    assert len(manager) == 750 and manager.stats["evicted_closed"] == 250
+    assert manager.get_session(sessions[0].session_id) is None
+    assert manager.get_session(sessions[250].session_id) is not None
+    print("   ✓ Closed sessions evicted after the grace period, at most reap_batch per tick")
+    
+    # Open sessions time out when idle: half of them were still streaming at t+200
+    for session in sessions[500:]:
+        session.last_activity = now + 200
+    
+    # Deleted and closed sessions leave stale heap entries that are skipped (a tick of
+    # only stale entries evicts nothing, so run enough ticks to pop every due entry)
+    manager.delete_session(sessions[250].session_id)
+    for _ in range(20):
+        manager.reap(now + 301)
+    assert manager.get_stats()["expiry_heap"] == 500
+    assert len(manager) == 500 and manager.stats["evicted_timeout"] == 249
+    assert all(manager.get_session(s.session_id) is not None for s in sessions[500:])
+    assert abs(sessions[500].expires_at - (now + 500)) < 1e-6
+    print("   ✓ Idle sessions evicted; active ones pushed to last activity + timeout; stale entries skipped")
+    
+    while manager.get_stats()["expiry_heap"]:
+        manager.reap(now + 501)
+    assert len(manager) == 0 and manager.stats["evicted_timeout"] == 749
+    print("   ✓ Sessions evicted once they go idle")
+
+
+@pytest.mark.asyncio
+async def test_background_reaper():
+    manager = SessionManager(closed_grace_seconds=0.05)
+    session = manager.create_session("user")
+    task = asyncio.create_task(manager.run_reaper(0.02))
+    manager.close_session(session.session_id)
+    await asyncio.sleep(0.2)
+    task.cancel()
+    assert manager.get_session(session.session_id) is None
+    assert manager.stats["reap_ticks"] > 2
+    print(f"   ✓ Background reaper evicted the closed session ({manager.get_stats()})")
+
+
+@pytest.mark.asyncio
+async def test_streaming_call_outlives_timeout():
+    manager = SessionManager(timeout_seconds=0.2)
+    session = manager.create_session("user")
+    task = asyncio.create_task(manager.run_reaper(0.02))
+    
+    # Streams for three times the timeout
+    for _ in range(30):
+        manager.append_caller_audio(session.session_id, b"\x00" * 3200)
+        await asyncio.sleep(0.02)
+    assert manager.get_session(session.session_id) is session
+    
+    # Then goes quiet
+    await asyncio.sleep(0.35)
+    task.cancel()
+    assert manager.get_session(session.session_id) is None
+    assert manager.stats["evicted_timeout"] == 1
+    print("   ✓ A call streaming past the timeout is kept, and evicted once idle")
+
+
+def test_reap_cost():
+    manager = SessionManager(max_sessions=100_000, timeout_seconds=300)
+    for i in range(20_000):
+        manager.create_session(f"user{i}")
+    start = time.perf_counter()
+    for _ in range(1000):
+        manager.reap()
+    per_tick = (time.perf_counter() - start) / 1000 * 1e6
+    assert per_tick < 200  # No scan of the table when nothing is due
+    print(f"   ✓ Idle reap tick with 20,000 sessions: {per_tick:.1f} µs")
+
+
+def main():
+    print("=" * 60)
+    print("Session Reaper Tests")
+    print("=" * 60)
+    
+    test_expiry_order()
+    asyncio.run(test_background_reaper())
+    asyncio.run(test_streaming_call_outlives_timeout())
+    test_reap_cost()
+    
+    print("\n" + "=" * 60)
+    print("All session reaper tests passed ✓")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
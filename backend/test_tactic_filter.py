@@ -0,0 +1,87 @@
+"""Test the local social engineering tactic pre-filter"""
+import time
+
+from app.services.tactic_filter import TacticFilter, stem
+
+
+def test_matches():
+    tactic_filter = TacticFilter()
+    
+    assert tactic_filter.tactics("Yes, that's right.") == []
+    assert tactic_filter.tactics("Sure, I can do Tuesday afternoon") == []
+    print("   ✓ Benign text does not trip the filter")
+    
+    assert tactic_filter.tactics("You need to do this RIGHT NOW") == ["urgency"]
+    assert tactic_filter.tactics("Please read me the verification codes") == ["credential_request"]
+    assert tactic_filter.tactics("Don't tell your wife about this") == ["secrecy"]
+    assert tactic_filter.tactics("You will be arrested, this is Officer Smith") == ["authority", "fear"]
+    print("   ✓ Phrases match across case, punctuation and inflection")
+    
+    # Overlapping phrases sharing a prefix are all reported
+    phrases = [m.phrase for m in tactic_filter.scan("what is your social security number")]
+    assert "your social security number" in phrases, phrases
+    assert tactic_filter.tactics("give me the o t p") == ["credential_request"]
+    print("   ✓ Multi-token and spelled-out patterns match")
+
+
+def test_benign_banking():
+    tactic_filter = TacticFilter()
+    
+    # What a genuine customer says to the bank agent - none of it may escalate to the LLM
+    benign = [
+        "I want to check my bank balance",
+        "my account number is 1234 5678",
+        "I am calling from home",
+        "I think I forgot my pin, can I reset my pins",
+        "my login stopped working after the update",
+        "I need to pay my tax bill from this account",
+        "the agent I spoke to yesterday said it was sorted",
+        "my date of birth is the fourth of June",
+    ]
+    for text in benign:
+        assert tactic_filter.tactics(text) == [], (text, tactic_filter.scan(text))
+    print(f"   ✓ {len(benign)} benign banking utterances stay local")
+    
+    # The same words in a request or claim still match
+    assert tactic_filter.tactics("tell me your pin") == ["credential_request"]
+    assert tactic_filter.tactics("read me the code on your screen") == ["credential_request"]
+    assert tactic_filter.tactics("can you confirm your account number") == ["credential_request"]
+    assert tactic_filter.tactics("hello, this is your bank calling") == ["authority"]
+    print("   ✓ Banking words in request context still match")
+
+
+def test_stemming():
+    assert stem("arrested") == stem("arrest") == "arrest"
+    assert stem("passwords") == stem("password")
+    assert stem("pin") == "pin"
+    print("   ✓ Stemmer is consistent and keeps short tokens")
+
+
+def test_speed():
+    tactic_filter = TacticFilter()
+    delta = "okay so I just wanted to check on the appointment for next week and see if that still works " * 2
+    iterations = 2000
+    start = time.perf_counter()
+    for _ in range(iterations):
+        tactic_filter.scan(delta)
+    per_scan_us = (time.perf_counter() - start) / iterations * 1e6
+    print(f"   ✓ {per_scan_us:.1f} µs per {len(delta.split())}-word delta")
+
+
+def main():
+    print("=" * 60)
+    print("Tactic Pre-filter Tests")
+    print("=" * 60)
+    
+    test_matches()
+    test_benign_banking()
+    test_stemming()
+    test_speed()
+    
+    print("\n" + "=" * 60)
+    print("All tactic filter tests passed ✓")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Test the agent TTS cache: content addressing, ETag / 304, single-flight and format variants"""
+import asyncio
+import io
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pytest
+import soundfile as sf
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import agent
+from app.services.audio_codec import transcode_pcm
+from app.services.tts_cache import TTSCache
+from app.services.tts_service import TTSService
+
+RATE = 44100
+
+
+def fake_pcm(text: str, reference_id: str) -> bytes:
+    """Deterministic 16-bit PCM standing in for synthesized speech (0.5 s per 10 characters)"""
+    n = int(len(text) / 10 * 0.5 * RATE)
+    pitch = 120 + 40 * (hash(reference_id) % 5)
+    return (8000 * np.sin(2 * np.pi * pitch * np.arange(n) / RATE)).astype(np.int16).tobytes()
+
+
+def fake_mp3(text: str, reference_id: str) -> bytes:
+    """MP3 of the same stand-in speech, as Fish Audio would stream it"""
+    return transcode_pcm(fake_pcm(text, reference_id), RATE, "mp3", RATE)
+
+
+class FakeTTS(TTSService):
+    """Counts synthesis calls instead of calling Fish Audio"""
+    
+    def __init__(self, cache: TTSCache, reference_id: str = "voice-a"):
+        super().__init__(api_key="test", reference_id=reference_id, cache=cache, canonical_sample_rate=RATE)
+        self.calls = 0
+    
+    async def stream_speech(self, text: str, format: str = "pcm", sample_rate=None, **kwargs):
+        assert format in ("pcm", "mp3") and sample_rate == RATE
+        self.calls += 1
+        audio = fake_pcm(text, self.reference_id) if format == "pcm" else fake_mp3(text, self.reference_id)
+        half = len(audio) // 4 * 2
+        yield audio[:half]
+        await asyncio.sleep(0.05)
+        yield audio[half:]
+
+
+def serve(tts: FakeTTS) -> TestClient:
+    """Client for the agent routes, backed by the given TTS service"""
+    agent.tts_service = tts
+    app = FastAPI()
+    app.include_router(agent.router)
+    return TestClient(app)
+
+
+def prerendered(cache_dir: Path, reference_id: str = "voice-a") -> FakeTTS:
+    """TTS service whose cache already holds the script as MP3"""
+    tts = FakeTTS(TTSCache(str(cache_dir)), reference_id=reference_id)
+    asyncio.run(tts.prerender(agent.script_texts(), ["mp3"]))
+    return tts
+
+
+def test_prerender(tmp_path):
+    tts = FakeTTS(TTSCache(str(tmp_path)))
+    texts = agent.script_texts()
+    rendered = asyncio.run(tts.prerender(texts, ["mp3"]))
+    assert rendered == len(texts) and tts.calls == len(texts)
+    assert asyncio.run(tts.prerender(texts, ["mp3"])) == 0
+    print(f"   ✓ Script pre-rendered once ({rendered} segments), second run is a no-op")
+
+
+def test_cached_audio(tmp_path):
+    tts = prerendered(tmp_path)
+    calls = tts.calls
+    client = serve(tts)
+    
+    response = client.get("/agent/audio/0?format=mp3")
+    assert response.status_code == 200 and response.headers["content-type"] == "audio/mpeg"
+    samples, rate = sf.read(io.BytesIO(response.content))
+    assert rate == RATE and samples.size > 0
+    etag = response.headers["etag"]
+    assert tts.calls == calls
+    print("   ✓ Segment served as real MP3 from the cache without synthesis")
+    
+    response = client.get("/agent/audio/0?format=mp3", headers={"If-None-Match": etag})
+    assert response.status_code == 304 and response.content == b""
+    response = client.get("/agent/audio/0?format=mp3", headers={"If-None-Match": f'"stale", W/{etag}'})
+    assert response.status_code == 304
+    print("   ✓ Conditional GET returns 304 Not Modified, including weak tags in a list")
+    
+    canonical = fake_pcm(agent.AGENT_SCRIPT[0]["text"], "voice-a")
+    response = client.get("/agent/audio/0?format=pcm&sample_rate=8000")
+    assert response.status_code == 200
+    assert abs(len(response.content) - len(canonical) * 8000 // RATE) <= 4
+    for format, rate, magic in (("opus", 16000, b"OggS"), ("flac", None, b"fLaC"), ("wav", 8000, b"RIFF")):
+        query = f"format={format}" + (f"&sample_rate={rate}" if rate else "")
+        response = client.get(f"/agent/audio/0?{query}")
+        assert response.status_code == 200 and response.content.startswith(magic), format
+        if format != "opus":
+            assert sf.info(io.BytesIO(response.content)).samplerate == (rate or RATE)
+    assert tts.calls == calls
+    print("   ✓ 8 kHz PCM, Opus, FLAC and WAV variants transcoded from one synthesis")
+    
+    assert client.get("/agent/audio/0?format=opus&sample_rate=44100").status_code == 400
+    assert client.get("/agent/audio/0?format=../../etc").status_code == 400
+    print("   ✓ Unsupported formats and sample rates are rejected")
+    agent.tts_service = None
+
+
+def test_wav_relay(tmp_path):
+    # Uncached canonical audio streams straight through and fills the cache
+    tts = FakeTTS(TTSCache(str(tmp_path)))
+    client = serve(tts)
+    text = agent.AGENT_SCRIPT[1]["text"]
+    response = client.get("/agent/audio/1?format=wav")
+    assert response.status_code == 200 and response.content.startswith(b"RIFF")
+    assert response.content[44:] == fake_pcm(text, "voice-a")
+    relay_etag = response.headers["etag"]
+    assert relay_etag.startswith('W/"')
+    assert tts.cache.get(tts.cache_key(text, "pcm"), "pcm") is not None
+    print("   ✓ Uncached canonical audio streams through and fills the cache")
+    
+    for _ in range(3):
+        response = client.get("/agent/audio/1?format=wav")
+        assert response.status_code == 200
+        assert sf.info(io.BytesIO(response.content)).frames * 2 == len(fake_pcm(text, "voice-a"))
+    assert tts.calls == 1
+    assert response.headers["etag"] == relay_etag[2:]
+    assert client.get("/agent/audio/1?format=wav", headers={"If-None-Match": relay_etag}).status_code == 304
+    print("   ✓ Once canonical PCM is cached, WAV requests never go upstream again")
+    print("   ✓ A relayed WAV's unknown-length header gets a weak ETag; the cached file a strong one")
+    
+    # MP3 for a segment whose canonical PCM is cached is transcoded locally, not re-synthesized
+    response = client.get("/agent/audio/1?format=mp3")
+    assert response.status_code == 200 and sf.info(io.BytesIO(response.content)).samplerate == RATE
+    assert tts.calls == 1
+    print("   ✓ MP3 with cached canonical PCM is transcoded, not synthesized again")
+    agent.tts_service = None
+
+
+def test_mp3_relay(tmp_path):
+    # The frontend asks for MP3: a cold segment is relayed from Fish Audio's MP3 stream
+    tts = FakeTTS(TTSCache(str(tmp_path)))
+    client = serve(tts)
+    text = agent.AGENT_SCRIPT[2]["text"]
+    response = client.get("/agent/audio/2?format=mp3")
+    assert response.status_code == 200 and response.headers["content-type"] == "audio/mpeg"
+    assert response.content == fake_mp3(text, "voice-a")
+    assert tts.cache.get(tts.cache_key(text, "mp3"), "mp3") is not None
+    assert tts.calls == 1
+    for _ in range(3):
+        assert client.get("/agent/audio/2?format=mp3").content == fake_mp3(text, "voice-a")
+    assert tts.calls == 1
+    print("   ✓ Uncached MP3 streams through from Fish Audio and is then served from the cache")
+    
+    # Other formats of that segment come from the relayed MP3, not a second (different) synthesis
+    for query in ("format=wav", "format=pcm", "format=flac&sample_rate=16000"):
+        assert client.get(f"/agent/audio/2?{query}").status_code == 200
+    decoded, _ = sf.read(io.BytesIO(fake_mp3(text, "voice-a")), dtype="int16")
+    derived = tts.cache.get(tts.cache_key(text, "pcm"), "pcm").read_bytes()
+    assert derived == decoded.tobytes()
+    assert client.get("/agent/audio/2?format=mp3").content == fake_mp3(text, "voice-a")
+    assert tts.calls == 1
+    print("   ✓ Variants of a relayed MP3 are decoded from it, so each text is synthesized once")
+    agent.tts_service = None
+
+
+def test_voice_change(tmp_path):
+    texts = agent.script_texts()
+    client = serve(prerendered(tmp_path))
+    etag = client.get("/agent/audio/0?format=mp3").headers["etag"]
+    for query in ("format=pcm&sample_rate=8000", "format=opus&sample_rate=16000", "format=flac", "format=wav&sample_rate=8000"):
+        assert client.get(f"/agent/audio/0?{query}").status_code == 200
+    
+    # Changing the voice changes every key; old renderings are pruned
+    new_voice = FakeTTS(TTSCache(str(tmp_path)), reference_id="voice-b")
+    client = serve(new_voice)
+    assert client.get("/agent/audio/0?format=mp3", headers={"If-None-Match": etag}).status_code == 200
+    removed = new_voice.prune_cache(texts, agent.MEDIA_TYPES)
+    assert removed == 2 * len(texts) + 4, removed
+    print(f"   ✓ Voice change invalidates the cache ({removed} stale files removed)")
+    
+    assert client.get("/agent/audio/0?format=wav&sample_rate=8000").status_code == 200
+    assert client.get("/agent/audio/0?format=opus&sample_rate=16000").status_code == 200
+    assert new_voice.prune_cache(texts, agent.MEDIA_TYPES) == 0
+    assert client.get("/agent/audio/0?format=wav&sample_rate=8000").status_code == 200
+    assert new_voice.calls == 1  # Cold MP3 relayed from Fish Audio; the variants are decoded from it
+    print("   ✓ Pruning keeps variants at non-default sample rates")
+    agent.tts_service = None
+
+
+@pytest.mark.asyncio
+async def test_single_flight(tmp_path):
+    tts = FakeTTS(TTSCache(str(tmp_path)), reference_id="voice-flight")
+    text = agent.AGENT_SCRIPT[2]["text"]
+    
+    async def listen():
+        return b"".join([chunk async for chunk in tts.stream_shared(text)])
+    
+    results = await asyncio.gather(*(listen() for _ in range(20)))
+    assert tts.calls == 1 and tts.stats["coalesced"] == 19
+    assert set(results) == {fake_pcm(text, "voice-flight")}
+    print("   ✓ 20 concurrent streams share one synthesis")
+    
+    paths = await asyncio.gather(*(tts.get_or_render(text, "flac", 16000) for _ in range(20)))
+    assert tts.calls == 1 and len(set(paths)) == 1
+    print("   ✓ Concurrent variant fills transcode once from the cached canonical PCM")
+    
+    # Variants requested while a cold MP3 relay is still running wait for it instead of synthesizing
+    text = agent.AGENT_SCRIPT[3]["text"]
+    relay = tts.stream_shared(text, "mp3")
+    assert tts.relay_source(text, "mp3") == "mp3" and tts.relay_source(text, "wav") is None
+    variants = await asyncio.gather(tts.get_or_render(text, "mp3"), tts.get_or_render(text, "opus", 16000))
+    relayed = b"".join([chunk async for chunk in relay])
+    assert tts.calls == 2 and relayed == fake_mp3(text, "voice-flight")
+    assert variants[0].read_bytes() == relayed
+    print("   ✓ Variant fills during an MP3 relay wait for it; the relayed MP3 is never re-encoded")
+
+
+def main():
+    print("=" * 60)
+    print("Agent TTS Cache Tests")
+    print("=" * 60)
+    
+    for test in (test_prerender, test_cached_audio, test_wav_relay, test_mp3_relay, test_voice_change):
+        with tempfile.TemporaryDirectory() as tmp:
+            test(Path(tmp))
+    with tempfile.TemporaryDirectory() as tmp:
+        asyncio.run(test_single_flight(Path(tmp)))
+    
+    print("\n" + "=" * 60)
+    print("All TTS cache tests passed ✓")
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()